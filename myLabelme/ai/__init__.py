@@ -1,8 +1,15 @@
 import gdown     ## Used to efficiently download large models from github.        
 
 from .efficient_sam import EfficientSam
+from .embedding_cache import EmbeddingCache
+from .embedding_precompute import EmbeddingPrecomputer
+from .preview_decoder import PreviewDecoder
 from .segment_anything_model import SegmentAnythingModel
 
+from .prediction_store import PredictionStore
+
+from .yolo_model import ModelRegistry
+from .yolo_model import ModelWorker
 from .yolo_model import YoloModel
 
 ## This file initialize models classes.
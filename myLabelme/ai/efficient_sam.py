@@ -1,4 +1,4 @@
-import collections
+import os.path as osp
 import threading          
 
 import imgviz
@@ -8,6 +8,7 @@ import skimage
 
 from ..logger import logger
 from . import _utils
+from .embedding_cache import EmbeddingCache
 
 ## collections: Provide special data types.
 ## threading: Provide ability to use threads in the program.
@@ -21,20 +22,27 @@ from . import _utils
 
 class EfficientSam:
     def __init__(self, encoder_path, decoder_path):
+        self.encoder_path = encoder_path
         self._encoder_session = onnxruntime.InferenceSession(encoder_path)
         self._decoder_session = onnxruntime.InferenceSession(decoder_path)
 
         self._lock = threading.Lock()
-        self._image_embedding_cache = collections.OrderedDict()
+        self._model_id = osp.splitext(osp.basename(encoder_path))[0]
+        self._image_embedding_cache = EmbeddingCache()
 
         self._thread = None
 
+    def set_embedding_cache(self, cache):
+        """Share embedding cache, e.g. one persisted on disk, with the model."""
+        self._image_embedding_cache = cache
+
     ## get image embeddings if cached. else, compute embeddings.
-    def set_image(self, image: np.ndarray):
+    def set_image(self, image: np.ndarray, filename=None):
         with self._lock:
             self._image = image
+            self._image_key = EmbeddingCache.key(self._model_id, image, filename)
             self._image_embedding = self._image_embedding_cache.get(
-                self._image.tobytes()
+                self._image_key
             )
 
         if self._image_embedding is None:
@@ -48,17 +56,23 @@ class EfficientSam:
     def _compute_and_cache_image_embedding(self):
         with self._lock:
             logger.debug("Computing image embedding...")
-            image = imgviz.rgba2rgb(self._image)
-            batched_images = image.transpose(2, 0, 1)[None].astype(np.float32) / 255.0
-            (self._image_embedding,) = self._encoder_session.run(
-                output_names=None,
-                input_feed={"batched_images": batched_images},
+            self._image_embedding = _compute_image_embedding(
+                encoder_session=self._encoder_session, image=self._image
             )
-            if len(self._image_embedding_cache) > 10:
-                self._image_embedding_cache.popitem(last=False)
-            self._image_embedding_cache[self._image.tobytes()] = self._image_embedding
+            self._image_embedding_cache.put(self._image_key, self._image_embedding)
             logger.debug("Done computing image embedding.")
 
+    ## Compute and cache embedding of image without changing current image.
+    ## Used to precompute embeddings of next images.
+    def precompute_image_embedding(self, image, encoder_session=None, filename=None):
+        key = EmbeddingCache.key(self._model_id, image, filename)
+        if key in self._image_embedding_cache:
+            return
+        image_embedding = _compute_image_embedding(
+            encoder_session=encoder_session or self._encoder_session, image=image
+        )
+        self._image_embedding_cache.put(key, image_embedding)
+
     def _get_image_embedding(self):
         if self._thread is not None:
             self._thread.join() ## Block execution until finish embedding computing.
@@ -80,6 +94,16 @@ class EfficientSam:
         return _utils.compute_polygon_from_mask(mask=mask)
 
 
+def _compute_image_embedding(encoder_session, image):
+    image = imgviz.asrgb(image)
+    batched_images = image.transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+    (image_embedding,) = encoder_session.run(
+        output_names=None,
+        input_feed={"batched_images": batched_images},
+    )
+    return image_embedding
+
+
 def _compute_mask_from_points(
     decoder_session, image, image_embedding, points, point_labels
 ):
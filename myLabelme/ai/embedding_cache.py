@@ -0,0 +1,161 @@
+import collections
+import hashlib
+import os
+import os.path as osp
+import tempfile
+import threading
+
+import numpy as np
+
+from ..logger import logger
+
+
+def image_digest(image, max_samples=512):
+    """Return hex digest of image shape, dtype and a strided pixel sample.
+
+    At most max_samples x max_samples pixels are hashed, so the cost does
+    not grow with the image size.
+    """
+    image = np.asarray(image)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str((image.shape, image.dtype.str)).encode())
+    if image.ndim >= 2:
+        step_y = max(1, image.shape[0] // max_samples)
+        step_x = max(1, image.shape[1] // max_samples)
+        image = image[::step_y, ::step_x]
+    h.update(memoryview(np.ascontiguousarray(image)).cast("B"))
+    return h.hexdigest()
+
+
+def file_digest(filename):
+    """Return hex digest of image file path, mtime and size, or None."""
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    h = hashlib.blake2b(digest_size=16)
+    key = (osp.abspath(filename), stat.st_mtime_ns, stat.st_size)
+    h.update(str(key).encode())
+    return h.hexdigest()
+
+
+class EmbeddingCache(object):
+    """Image embeddings kept in memory and as .npy files on disk.
+
+    Keys are built from the model identity and the image file, so
+    embeddings are shared by every way the file is decoded (e.g. from a
+    label file or after brightness/contrast), or the image digest for
+    images without a file. The last
+    `ram_entries` embeddings stay in memory; all are written to `cache_dir`
+    and loaded back memory-mapped. The least recently used files are
+    removed once they take more than `max_bytes`, after dropping their
+    memory maps. Files which cannot be removed yet (still mapped elsewhere
+    on Windows) are retried on later evictions. Without `cache_dir` only
+    the memory tier is used.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=2 * 1024**3, ram_entries=10):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ram_entries = ram_entries
+        self._lock = threading.Lock()
+        self._ram = collections.OrderedDict()  # key=key, value=embedding
+        self._disk = collections.OrderedDict()  # key=key, value=nbytes
+        self._disk_bytes = 0
+        self._removing = []  # evicted files not removed yet
+        if self.cache_dir and self.max_bytes > 0:
+            self._scanDir()
+        else:
+            self.cache_dir = None
+
+    @staticmethod
+    def key(model_id, image, filename=None):
+        digest = file_digest(filename) if filename else None
+        if digest is None:
+            digest = image_digest(image)
+        return "%s-%s" % (model_id, digest)
+
+    def _file(self, key):
+        return osp.join(self.cache_dir, key + ".npy")
+
+    def _scanDir(self):
+        if not osp.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".npy") and entry.is_file():
+                stat = entry.stat()
+                key = entry.name[: -len(".npy")]
+                entries.append((stat.st_mtime, key, stat.st_size))
+        for _, key, nbytes in sorted(entries):
+            self._disk[key] = nbytes
+            self._disk_bytes += nbytes
+
+    def _putRam(self, key, embedding):
+        self._ram[key] = embedding
+        self._ram.move_to_end(key)
+        while len(self._ram) > self.ram_entries:
+            self._ram.popitem(last=False)
+
+    def get(self, key):
+        """Return cached embedding of key or None."""
+        with self._lock:
+            if key in self._ram:
+                self._ram.move_to_end(key)
+                return self._ram[key]
+            if key not in self._disk:
+                return None
+            try:
+                embedding = np.load(self._file(key), mmap_mode="r")
+                os.utime(self._file(key))   ## mtime orders entries on next start.
+            except (OSError, ValueError) as e:
+                logger.warning("Failed loading embedding {}: {}".format(key, e))
+                self._disk_bytes -= self._disk.pop(key)
+                return None
+            self._disk.move_to_end(key)
+            self._putRam(key, embedding)
+            return embedding
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._ram or key in self._disk
+
+    def put(self, key, embedding):
+        with self._lock:
+            self._putRam(key, embedding)
+            if self.cache_dir is None or key in self._disk:
+                return
+            if self._file(key) in self._removing:
+                self._removing.remove(self._file(key))
+            ## Write to temp file first so readers never see partial files.
+            fd, tmp = tempfile.mkstemp(suffix=".npy.tmp", dir=self.cache_dir)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.save(f, np.asarray(embedding))
+                os.replace(tmp, self._file(key))
+            except OSError as e:
+                logger.warning("Failed caching embedding {}: {}".format(key, e))
+                if osp.exists(tmp):
+                    os.remove(tmp)
+                return
+            nbytes = osp.getsize(self._file(key))
+            self._disk[key] = nbytes
+            self._disk_bytes += nbytes
+            self._evict()
+
+    def _evict(self):
+        while self._disk_bytes > self.max_bytes and len(self._disk) > 1:
+            key, nbytes = self._disk.popitem(last=False)
+            self._disk_bytes -= nbytes
+            # Map is closed when its last reference is dropped.
+            self._ram.pop(key, None)
+            self._removing.append(self._file(key))
+        removing = []
+        for filename in self._removing:
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                removing.append(filename)
+        self._removing = removing
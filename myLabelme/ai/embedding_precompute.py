@@ -0,0 +1,71 @@
+import concurrent.futures
+import threading
+
+import onnxruntime
+
+from ..label_file import LabelFile
+from ..logger import logger
+
+
+class EmbeddingPrecomputer(object):
+    """Compute image embeddings of files ahead of time in a thread pool.
+
+    Runs a dedicated encoder session with `num_threads` intra-op threads
+    (0 lets onnxruntime decide), so it does not share the session used for
+    the image being annotated. Results go to the model's embedding cache.
+    """
+
+    def __init__(self, model, num_workers=1, num_threads=0):
+        self.model = model
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        self._encoder_session = onnxruntime.InferenceSession(
+            model.encoder_path, sess_options=options
+        )
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, num_workers),
+            thread_name_prefix="embedding",
+        )
+        self._lock = threading.Lock()
+        self._futures = {}  # key=filename, value=Future
+
+    def _compute(self, filename):
+        loaded = LabelFile.load_image_arr(filename)
+        if loaded is None:
+            return
+        imageArr, _ = loaded
+        try:
+            self.model.precompute_image_embedding(
+                imageArr, encoder_session=self._encoder_session, filename=filename
+            )
+        except Exception as e:
+            logger.warning("Failed computing embedding {}: {}".format(filename, e))
+
+    def precompute(self, filenames):
+        """Schedule filenames, ordered by priority.
+
+        Pending files which are not in filenames are cancelled.
+        """
+        with self._lock:
+            wanted = set(filenames)
+            for filename in list(self._futures):
+                if filename not in wanted:
+                    self._futures.pop(filename).cancel()
+            for filename in filenames:
+                if filename not in self._futures:
+                    self._futures[filename] = self._executor.submit(
+                        self._compute, filename
+                    )
+
+    def wait(self):
+        """Block until scheduled files are done."""
+        with self._lock:
+            futures = list(self._futures.values())
+        concurrent.futures.wait(futures)
+
+    def shutdown(self):
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
+            self._futures = {}
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,209 @@
+import io
+import json
+import os
+import os.path as osp
+import tempfile
+
+import numpy as np
+
+from ..logger import logger
+
+
+class PredictionStore(object):
+    """Detections of one model kept on disk in columnar files.
+
+    Boxes (xyxy float32), class ids (int16) and track ids (int32, -1 when
+    not tracked) of all frames are appended to one binary file per column.
+    index.jsonl maps image path to the (offset, count) of its rows; the last
+    entry of a path wins, so frames can be predicted again. Columns are
+    read through np.memmap, so looking up a frame does not load the store.
+
+    Index lines are written by `flush`, every `flush_every` entries and on
+    close, only after the column files are synced to disk. A crash can so
+    leave rows without index lines but not the reverse; those rows and any
+    unusable index lines are removed on the next open.
+    """
+
+    COLUMNS = {
+        "boxes": (np.float32, 4),
+        "classes": (np.int16, 1),
+        "track_ids": (np.int32, 1),
+    }
+
+    def __init__(self, root, names=None, flush_every=256):
+        self.root = root
+        self.flush_every = flush_every
+        if not osp.exists(root):
+            os.makedirs(root)
+
+        names_file = osp.join(root, "names.json")
+        if names is not None:
+            self.names = {int(k): v for k, v in dict(names).items()}
+            with io.open(names_file, "w") as f:
+                json.dump(self.names, f)
+        elif osp.exists(names_file):
+            with io.open(names_file) as f:
+                self.names = {int(k): v for k, v in json.load(f).items()}
+        else:
+            self.names = {}
+
+        self._index = {}  # key=image path, value=(offset, count)
+        self._maps = {}  # key=column, value=np.memmap
+        self._writers = {}  # key=column, value=file opened for append
+        self._pending = []  # index lines of rows not synced yet
+        self._size = self._loadIndex()
+        self._mapped = 0
+
+    def _columnFile(self, column):
+        return osp.join(self.root, column + ".bin")
+
+    def _columnRows(self, column):
+        dtype, width = self.COLUMNS[column]
+        path = self._columnFile(column)
+        if not osp.exists(path):
+            return 0
+        return osp.getsize(path) // (np.dtype(dtype).itemsize * width)
+
+    def _columnShape(self, column, rows):
+        _, width = self.COLUMNS[column]
+        return (rows, width) if width > 1 else (rows,)
+
+    def _loadIndex(self):
+        size = min(self._columnRows(column) for column in self.COLUMNS)
+        index_file = osp.join(self.root, "index.jsonl")
+        end = 0
+        dropped = 0
+        if osp.exists(index_file):
+            with io.open(index_file) as f:
+                for line in f:
+                    try:
+                        path, offset, count = json.loads(line)
+                    except ValueError:
+                        logger.warning(
+                            "Skipping corrupted line of {}".format(index_file)
+                        )
+                        dropped += 1
+                        continue
+                    if offset + count > size or not line.endswith("\n"):
+                        dropped += 1
+                        continue
+                    self._index[path] = (offset, count)
+                    end = max(end, offset + count)
+
+        ## Stale lines would point to rows of other images once new rows
+        ## are appended, so the index is written again without them.
+        if dropped:
+            self._writeIndex(index_file)
+
+        ## Drop rows written after the last complete index entry,
+        ## e.g. when the app was killed while appending.
+        for column, (dtype, width) in self.COLUMNS.items():
+            path = self._columnFile(column)
+            if osp.exists(path):
+                os.truncate(path, end * np.dtype(dtype).itemsize * width)
+        return end
+
+    def _writeIndex(self, index_file):
+        fd, tmp = tempfile.mkstemp(suffix=".jsonl.tmp", dir=self.root)
+        with io.open(fd, "w") as f:
+            for path, (offset, count) in self._index.items():
+                f.write(json.dumps([path, offset, count]) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, index_file)
+
+    @staticmethod
+    def _key(path):
+        return osp.normcase(osp.abspath(path))
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, path):
+        return self._key(path) in self._index
+
+    def append(self, path, boxes, classes, track_ids=None):
+        """Store detections of image path."""
+        count = len(boxes)
+        if track_ids is None:
+            track_ids = np.full((count,), -1, dtype=np.int32)
+        columns = {
+            "boxes": boxes,
+            "classes": classes,
+            "track_ids": track_ids,
+        }
+        if not self._writers:
+            for column in self.COLUMNS:
+                self._writers[column] = io.open(self._columnFile(column), "ab")
+            self._writers["index"] = io.open(
+                osp.join(self.root, "index.jsonl"), "a"
+            )
+
+        for column, (dtype, _) in self.COLUMNS.items():
+            arr = np.asarray(columns[column], dtype=dtype)
+            arr = arr.reshape(self._columnShape(column, count))
+            self._writers[column].write(arr.tobytes())
+        key = self._key(path)
+        self._pending.append(json.dumps([key, self._size, count]) + "\n")
+        self._index[key] = (self._size, count)
+        self._size += count
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """Sync written rows to disk, then write their index lines."""
+        if not self._writers:
+            return
+        for column in self.COLUMNS:
+            self._writers[column].flush()
+            os.fsync(self._writers[column].fileno())
+        self._writers["index"].writelines(self._pending)
+        self._writers["index"].flush()
+        self._pending = []
+
+    def get(self, path):
+        """Return (boxes, classes, track_ids) of image path or None."""
+        entry = self._index.get(self._key(path))
+        if entry is None:
+            return None
+        offset, count = entry
+        if not self._maps or offset + count > self._mapped:
+            self._remap()
+        return tuple(
+            np.array(self._maps[column][offset : offset + count])
+            for column in self.COLUMNS
+        )
+
+    def _remap(self):
+        self.flush()
+        self._maps = {}
+        for column, (dtype, _) in self.COLUMNS.items():
+            shape = self._columnShape(column, self._columnRows(column))
+            if shape[0] == 0:
+                self._maps[column] = np.zeros(shape, dtype=dtype)
+                continue
+            self._maps[column] = np.memmap(
+                self._columnFile(column), dtype=dtype, mode="r", shape=shape
+            )
+        self._mapped = self._size
+
+    def clear(self):
+        """Remove all stored predictions."""
+        self._pending = []
+        self.close()
+        for column in self.COLUMNS:
+            if osp.exists(self._columnFile(column)):
+                os.remove(self._columnFile(column))
+        index_file = osp.join(self.root, "index.jsonl")
+        if osp.exists(index_file):
+            os.remove(index_file)
+        self._index = {}
+        self._size = 0
+
+    def close(self):
+        self.flush()
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+        self._maps = {}
+        self._mapped = 0
@@ -0,0 +1,104 @@
+import collections
+import threading
+
+import imgviz
+from qtpy.QtCore import QObject, Signal
+
+from ..logger import logger
+
+
+class PreviewDecoder(QObject):
+    """Decode AI previews of prompt points on a background thread.
+
+    Only the latest request is kept; requests made while the decoder is busy
+    replace each other, so stale cursor positions are never decoded. Results
+    are cached by (mode, points, labels) and `resultReady` is emitted when
+    one is available. Call `reset()` when the model or its image changes.
+    """
+
+    resultReady = Signal()
+
+    def __init__(self, max_entries=32):
+        super().__init__()
+        self.max_entries = max_entries
+        self._cond = threading.Condition()
+        self._cache = collections.OrderedDict()  # key=request key, value=result
+        self._pending = None  # (generation, model, key)
+        self._generation = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def key(mode, points, point_labels):
+        return (
+            mode,
+            tuple((float(x), float(y)) for x, y in points),
+            tuple(int(label) for label in point_labels),
+        )
+
+    @staticmethod
+    def decode(model, key):
+        """Return polygon points, or ((x1, y1, x2, y2), cropped mask)."""
+        mode, points, point_labels = key
+        if mode == "ai_polygon":
+            return model.predict_polygon_from_points(
+                points=[list(point) for point in points],
+                point_labels=list(point_labels),
+            )
+        mask = model.predict_mask_from_points(
+            points=[list(point) for point in points],
+            point_labels=list(point_labels),
+        )
+        y1, x1, y2, x2 = imgviz.instances.masks_to_bboxes([mask])[0].astype(int)
+        return (x1, y1, x2, y2), mask[y1 : y2 + 1, x1 : x2 + 1]
+
+    def get(self, key):
+        """Return cached result of key or None."""
+        with self._cond:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        return None
+
+    def put(self, key, result):
+        with self._cond:
+            self._put(key, result)
+
+    def _put(self, key, result):
+        self._cache[key] = result
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def request(self, model, key):
+        """Decode key with model unless cached, replacing any pending request."""
+        with self._cond:
+            if key in self._cache:
+                return
+            self._pending = (self._generation, model, key)
+            self._cond.notify()
+
+    def reset(self):
+        """Drop cached results and pending requests of the previous image."""
+        with self._cond:
+            self._generation += 1
+            self._pending = None
+            self._cache.clear()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                generation, model, key = self._pending
+                self._pending = None
+            try:
+                result = self.decode(model, key)
+            except Exception as e:
+                logger.warning("Failed decoding AI preview: {}".format(e))
+                continue
+            with self._cond:
+                if generation != self._generation:
+                    continue
+                self._put(key, result)
+            self.resultReady.emit()
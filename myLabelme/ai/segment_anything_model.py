@@ -1,4 +1,4 @@
-import collections
+import os.path as osp
 import threading
 
 import imgviz
@@ -8,25 +8,33 @@ import skimage
 
 from ..logger import logger
 from . import _utils
+from .embedding_cache import EmbeddingCache
 
 
 class SegmentAnythingModel:
     def __init__(self, encoder_path, decoder_path):
         self._image_size = 1024
+        self.encoder_path = encoder_path
 
         self._encoder_session = onnxruntime.InferenceSession(encoder_path)
         self._decoder_session = onnxruntime.InferenceSession(decoder_path)
 
         self._lock = threading.Lock()
-        self._image_embedding_cache = collections.OrderedDict()
+        self._model_id = osp.splitext(osp.basename(encoder_path))[0]
+        self._image_embedding_cache = EmbeddingCache()
 
         self._thread = None
 
-    def set_image(self, image: np.ndarray):
+    def set_embedding_cache(self, cache):
+        """Share embedding cache, e.g. one persisted on disk, with the model."""
+        self._image_embedding_cache = cache
+
+    def set_image(self, image: np.ndarray, filename=None):
         with self._lock:
             self._image = image
+            self._image_key = EmbeddingCache.key(self._model_id, image, filename)
             self._image_embedding = self._image_embedding_cache.get(
-                self._image.tobytes()
+                self._image_key
             )
 
         if self._image_embedding is None:
@@ -43,11 +51,21 @@ class SegmentAnythingModel:
                 encoder_session=self._encoder_session,
                 image=self._image,
             )
-            if len(self._image_embedding_cache) > 10:
-                self._image_embedding_cache.popitem(last=False)
-            self._image_embedding_cache[self._image.tobytes()] = self._image_embedding
+            self._image_embedding_cache.put(self._image_key, self._image_embedding)
             logger.debug("Done computing image embedding.")
 
+    def precompute_image_embedding(self, image, encoder_session=None, filename=None):
+        """Compute and cache embedding of image without changing current image."""
+        key = EmbeddingCache.key(self._model_id, image, filename)
+        if key in self._image_embedding_cache:
+            return
+        image_embedding = _compute_image_embedding(
+            image_size=self._image_size,
+            encoder_session=encoder_session or self._encoder_session,
+            image=image,
+        )
+        self._image_embedding_cache.put(key, image_embedding)
+
     def _get_image_embedding(self):
         if self._thread is not None:
             self._thread.join()
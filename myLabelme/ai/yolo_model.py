@@ -1,27 +1,119 @@
 #import importlib
+import collections
+import hashlib
+import html
+import os
+import queue
+import threading
 import ultralytics
 import os.path as osp
+import cv2
+import numpy as np
 from qtpy.QtWidgets import QMessageBox
-#from qtpy.QtCore import QThread, Signal
+from qtpy.QtCore import QThread, Signal
 
+from ..logger import logger
+from .prediction_store import PredictionStore
+
+
+class ModelRegistry(object):
+    """Loaded YOLO models keyed by (path, mtime).
+
+    Models stay loaded between runs and are shared by all detection modes.
+    The least recently used ones are evicted when there are more than
+    `max_models` or their weights take more than `max_bytes`.
+    """
+
+    def __init__(self, max_models=2, max_bytes=1024 * 1024 * 1024):
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        # key=(path, mtime), value=(model, nbytes)
+        self._models = collections.OrderedDict()
+
+    @staticmethod
+    def _key(path):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:     ## e.g. model names downloaded by ultralytics.
+            mtime = None
+        return path, mtime
+
+    @staticmethod
+    def _modelSize(model):
+        try:
+            params = model.model.parameters()
+            return sum(p.numel() * p.element_size() for p in params)
+        except Exception:
+            return 0
+
+    def _cached(self, key):
+        with self._lock:
+            if key not in self._models:
+                return None
+            self._models.move_to_end(key)
+            return self._models[key][0]
+
+    def get(self, path):
+        """Return loaded model of path, loading it if not cached."""
+        key = self._key(path)
+        model = self._cached(key)
+        if model is not None:
+            return model
+
+        ## Only one load at a time, a warmup in progress is waited for.
+        with self._load_lock:
+            model = self._cached(key)
+            if model is not None:
+                return model
+            #ultralytics = importlib.import_module("ultralytics")
+            YOLO = getattr(ultralytics, 'YOLO')
+            model = YOLO(path)
+            ## Build predictor now, first call is slow otherwise.
+            model.predict(np.zeros((64, 64, 3), dtype=np.uint8), verbose=False)
+            with self._lock:
+                for cached in [k for k in self._models if k[0] == path]:
+                    del self._models[cached]    ## file changed on disk.
+                self._models[key] = (model, self._modelSize(model))
+                self._evict()
+        return model
+
+    def _evict(self):
+        while len(self._models) > 1 and (
+            len(self._models) > self.max_models
+            or sum(nbytes for _, nbytes in self._models.values()) > self.max_bytes
+        ):
+            key, _ = self._models.popitem(last=False)
+            logger.debug("Unloaded YOLO model: {}".format(key[0]))
+
+    def warmup(self, path):
+        """Load model of path in a background thread."""
+
+        def load():
+            try:
+                self.get(path)
+                logger.debug("Loaded YOLO model: {}".format(path))
+            except Exception as e:
+                logger.warning("Failed loading YOLO model {}: {}".format(path, e))
+
+        threading.Thread(target=load, daemon=True).start()
 
 
 class YoloModel():
-    def __init__(self):
+    def __init__(self, registry=None):
         self.modelPath=None
         self.model=None
-        self.predictions = []
+        self.predictions = None     ## PredictionStore of current run.
+        self.registry = registry or ModelRegistry()
+        self._hashes = {}   # key=(path, mtime), value=hash
 
     def resetState(self):
         self.model = None
     
     def loadModel(self):
-        # if self.model is not None:
-        #     return True
         try:
-            #ultralytics = importlib.import_module("ultralytics")
-            YOLO = getattr(ultralytics, 'YOLO')
-            self.model = YOLO(self.modelPath)
+            self.model = self.registry.get(self.modelPath)
         except AttributeError as e:
             QMessageBox.critical(
                 None,
@@ -49,6 +141,16 @@ class YoloModel():
     def setModelPath(self, path):
         self.modelPath=path
 
+    def warmup(self):
+        if self.modelPath:
+            self.registry.warmup(self.modelPath)
+
+    def resetTracker(self):
+        """Drop tracker state of the model so tracking starts from scratch."""
+        predictor = getattr(self.model, "predictor", None)
+        for tracker in getattr(predictor, "trackers", None) or []:
+            tracker.reset()
+
     def getUniqueName(self):
         parent_folder = osp.basename(osp.dirname(self.modelPath))
         file_name = osp.basename(self.modelPath)
@@ -58,169 +160,205 @@ class YoloModel():
         return osp.basename(self.modelPath)
     
 
-    def getCurrentImagePrediction(self, index:int):
-        if self.predictions and len(self.predictions)>index:
-            return self.predictions[index]
-        else:
+    def modelHash(self):
+        """Hash of model file content, used to key stored predictions."""
+        key = ModelRegistry._key(self.modelPath)
+        if key not in self._hashes:
+            h = hashlib.blake2b(digest_size=16)
+            if key[1] is None:
+                h.update(self.modelPath.encode())
+            else:
+                with open(self.modelPath, "rb") as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        h.update(chunk)
+            self._hashes[key] = h.hexdigest()
+        return self._hashes[key]
+
+    def openPredictions(self, root, track=False):
+        """Open the on-disk predictions of loaded model as current run."""
+        self.resetPredictions()
+        name = "%s-%s" % (self.modelHash(), "track" if track else "detect")
+        self.predictions = PredictionStore(
+            osp.join(root, name), names=self.model.names
+        )
+        return self.predictions
+
+    def getImagePrediction(self, imagePath):
+        if self.predictions is None:
             return None
-    
+        arrays = self.predictions.get(imagePath)
+        if arrays is None:
+            return None
+        return self.arraysToShapes(self.predictions.names, *arrays)
+
     def resetPredictions(self):
-        self.predictions = []
+        if self.predictions is not None:
+            self.predictions.close()
+        self.predictions = None
 
-    def runModel(self, imagePath:str):
-        canContinue = True
+    @staticmethod
+    def resultToArrays(pred, track=False):
+        """Return (boxes, classes, track_ids) arrays of one ultralytics result."""
+        boxes = pred.boxes
+        xyxy = boxes.xyxy.cpu().numpy().astype(np.float32)
+        classes = boxes.cls.cpu().numpy().astype(np.int16)
+        if track and boxes.id is not None:
+            trackIds = boxes.id.cpu().numpy().astype(np.int32)
+        else:
+            trackIds = np.full((len(xyxy),), -1, dtype=np.int32)
+        return xyxy, classes, trackIds
 
-        try:
-            pred = self.model.predict(imagePath, verbose=False)[0]
-        except Exception:
-            print("Error happened when running model for image: '%s'." %imagePath)
-            canContinue = False
-        
-        try:        ## Catch attribute exceptions when processing results.
-            imgShapes = []
-            if canContinue and len(pred.boxes)>0:
-                for box in pred.boxes:
-                    shape = {}
-                    shape["group_id"] = None
-                    shape["label"] = pred.names[int(box.cls[0])]
-                    shape["description"] = None
-                    shape["shape_type"] = "rectangle"
-                    shape["flags"] = {}
-                    shape["mask"] = None
-                    shape["points"] = []
-                    shape["other_data"] = {}
-                        
-                    x1, y1, x2, y2 = box.xyxy[0].tolist()
-                    shape["points"].append([x1,y1])
-                    shape["points"].append([x2,y2])
-
-                    imgShapes.append(shape)
-            ## store predictions.       
-            #self.predictions.append(imgShapes)
-        except AttributeError as e:
-            QMessageBox.critical(
-                None,
-                "Error",
-                "<p>Error happened when processing model results.<br>Make sure you loaded a valid yolo model from ultralytics.</p>",
-                )
-            return None
-        
-        return imgShapes
-    
-    def runModelOnVideo(self, imagePath:str):
-        canContinue = True
+    @staticmethod
+    def arraysToShapes(names, boxes, classes, trackIds):
+        """Convert detections of one image to shape dicts."""
+        imgShapes = []
+        for (x1, y1, x2, y2), cls, trackId in zip(
+            boxes.tolist(), classes.tolist(), trackIds.tolist()
+        ):
+            shape = {}
+            shape["group_id"] = trackId if trackId >= 0 else None
+            shape["label"] = names[cls]
+            shape["description"] = None
+            shape["shape_type"] = "rectangle"
+            shape["flags"] = {}
+            shape["mask"] = None
+            shape["points"] = [[x1,y1], [x2,y2]]
+            shape["other_data"] = {}
 
-        try:
-            pred = self.model.predict(imagePath, verbose=False)[0]
-        except Exception:
-            print("Error happened when running model for image: '%s'." %imagePath)
-            canContinue = False
-        
-        try:        ## Catch attribute exceptions when processing results.
-            imgShapes = []
-            if canContinue and len(pred.boxes)>0:
-                for box in pred.boxes:
-                    shape = {}
-                    shape["group_id"] = None
-                    shape["label"] = pred.names[int(box.cls[0])]
-                    shape["description"] = None
-                    shape["shape_type"] = "rectangle"
-                    shape["flags"] = {}
-                    shape["mask"] = None
-                    shape["points"] = []
-                    shape["other_data"] = {}
-                        
-                    x1, y1, x2, y2 = box.xyxy[0].tolist()
-                    shape["points"].append([x1,y1])
-                    shape["points"].append([x2,y2])
-
-                    imgShapes.append(shape)
-            ## store predictions.       
-            self.predictions.append(imgShapes)
-        except AttributeError as e:
-            QMessageBox.critical(
-                None,
-                "Error",
-                "<p>Error happened when processing model results.<br>Make sure you loaded a valid yolo model from ultralytics.</p>",
-                )
-            return False
-        
-        return True
+            imgShapes.append(shape)
+        return imgShapes
 
-    def runModelWithTrack(self, imagePath:str):
-        canContinue = True
+    @staticmethod
+    def resultToShapes(pred, track=False):
+        """Convert ultralytics result of one image to shape dicts."""
+        return YoloModel.arraysToShapes(
+            pred.names, *YoloModel.resultToArrays(pred, track)
+        )
 
+    def runModel(self, imagePath:str):
         try:
-            pred = self.model.track(imagePath, verbose= False, persist=True)[0]
+            pred = self.model.predict(imagePath, verbose=False)[0]
         except Exception:
             print("Error happened when running model for image: '%s'." %imagePath)
-            canContinue = False
+            return []
         
         try:        ## Catch attribute exceptions when processing results.
-            imgShapes = []
-            if canContinue and len(pred.boxes)>0:
-                i=0
-                for box in pred.boxes:
-                    shape = {}
-                    shape["group_id"] = int(pred.boxes.id[i])
-                    shape["label"] = pred.names[int(box.cls[0])]
-                    shape["description"] = None
-                    shape["shape_type"] = "rectangle"
-                    shape["flags"] = {}
-                    shape["mask"] = None
-                    shape["points"] = []
-                    shape["other_data"] = {}
-                        
-                    x1, y1, x2, y2 = box.xyxy[0].tolist()
-                    shape["points"].append([x1,y1])
-                    shape["points"].append([x2,y2])
-
-                    imgShapes.append(shape)
-                    i+=1
-            ## store predictions.       
-            self.predictions.append(imgShapes)
+            return self.resultToShapes(pred)
         except AttributeError as e:
             QMessageBox.critical(
                 None,
                 "Error",
                 "<p>Error happened when processing model results.<br>Make sure you loaded a valid yolo model from ultralytics.</p>",
                 )
-            return False
-        
-        return True
+            return None
 
 
-# class ModelWorker(QThread):
-#     progress = Signal(int)
-#     finished = Signal()
-#     error = Signal(str)
+class ModelWorker(QThread):
+    """Run YOLO model over images in a background thread.
 
-#     def __init__(self):
-#         super().__init__()
-#         self._is_canceled = False
+    Frames are decoded by a reader thread while the model runs on the
+    previous batch. (boxes, classes, track_ids) arrays of each frame are sent
+    through `frameProcessed`. Tracking runs frame by frame since the tracker
+    needs frames in order.
+    """
 
-#     def cancel(self):
-#         self._is_canceled = True
+    frameProcessed = Signal(str, object)   ## image path, arrays
+    progress = Signal(int)     ## number of processed frames
+    error = Signal(str)
 
-#     def run(self, model, images):
-#         for i, image in enumerate(images):
-#             if self._is_canceled:
-#                 break
+    def __init__(self, model, images, track=False, batch_size=16, parent=None):
+        super().__init__(parent)
+        self.model = model
+        self.images = list(images)
+        self.track = track
+        self.batch_size = max(1, batch_size)
+        self._is_canceled = False
+        self._done = False
 
-#             success = self.model.runModel(image)  # Run the model
-#             if not success:
-#                 self.error.emit(f"Error processing image {i + 1}")
-#                 break
+    def cancel(self):
+        self._is_canceled = True
 
-#             self.progress.emit(i + 1)  # Emit progress
+    def isCanceled(self):
+        return self._is_canceled
 
-#         self.finished.emit()  # Signal that the work is complete
-    
-            
-
-        
+    @staticmethod
+    def readImage(path):
+        ## np.fromfile supports non ascii paths unlike cv2.imread.
+        return cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
 
-        
+    def _readBatches(self, batches):
+        try:
+            batch = []
+            for path in self.images:
+                if self._is_canceled or self._done:
+                    break
+                try:
+                    frame = self.readImage(path)
+                except Exception:
+                    frame = None
+                batch.append((path, frame))
+                if len(batch) >= self.batch_size:
+                    batches.put(batch)
+                    batch = []
+            if batch:
+                batches.put(batch)
+        finally:
+            batches.put(None)
 
+    def _predict(self, frames):
+        if self.track:
+            return [
+                self.model.track(frame, verbose=False, persist=True)[0]
+                for frame in frames
+            ]
+        return self.model.predict(frames, verbose=False)
 
-        
\ No newline at end of file
+    def run(self):
+        batches = queue.Queue(maxsize=2)
+        reader = threading.Thread(
+            target=self._readBatches, args=(batches,), daemon=True
+        )
+        reader.start()
+        processed = 0
+        unreadable = []
+        try:
+            while True:
+                batch = batches.get()
+                if batch is None or self._is_canceled:
+                    break
+                valid = [(path, frame) for path, frame in batch if frame is not None]
+                results = self._predict([frame for _, frame in valid]) if valid else []
+                for (path, _), pred in zip(valid, results):
+                    self.frameProcessed.emit(
+                        path, YoloModel.resultToArrays(pred, self.track)
+                    )
+                for path, frame in batch:
+                    if frame is None:
+                        logger.warning("Failed reading image: {}".format(path))
+                        unreadable.append(path)
+                processed += len(batch)
+                self.progress.emit(processed)
+            ## Report unreadable images once instead of a dialog per image.
+            if unreadable:
+                self.error.emit(
+                    "<p>Error happened when reading %d image(s):<br>%s</p>"
+                    % (
+                        len(unreadable),
+                        "<br>".join(html.escape(path) for path in unreadable[:10])
+                        + ("<br>..." if len(unreadable) > 10 else ""),
+                    )
+                )
+        except AttributeError:
+            self.error.emit(
+                "<p>Error happened when processing model results.<br>Make sure you loaded a valid yolo model from ultralytics.</p>"
+            )
+        except Exception as e:
+            self.error.emit("<p>Error happened when running model:<br>%s</p>" % e)
+        finally:
+            self._done = True
+            ## Unblock reader if it waits on a full queue.
+            while reader.is_alive():
+                try:
+                    batches.get(timeout=0.1)
+                except queue.Empty:
+                    pass
@@ -1,4 +1,5 @@
 import functools
+import gc
 import html
 import math
 import os
@@ -8,18 +9,23 @@ import webbrowser
 from qtpy.QtCore import QTimer
 import cv2
 import imgviz
-import natsort
+import PIL.Image
 from qtpy import QtCore, QtGui, QtWidgets
 from qtpy.QtCore import Qt
 
 from . import PY2, __appname__
-from .ai import MODELS, YoloModel
+from .ai import (MODELS, EmbeddingCache, EmbeddingPrecomputer, ModelRegistry,
+                 ModelWorker, YoloModel)
+from .autosave import AutoSaver
 from .config import get_config
 from .label_file import LabelFile, LabelFileError
 from .logger import logger
+from .dir_index import DirectoryIndex
+from .prefetch import ImagePrefetcher
 from .shape import Shape
+from .tiled_image import TiledImage
 from .widgets import (BrightnessContrastDialog, Canvas, FileDialogPreview,
-                             LabelDialog, LabelListWidget, LabelListWidgetItem, ToolBar,
+                             FileListWidget, LabelDialog, LabelListWidget, LabelListWidgetItem, ToolBar,
                              UniqueLabelQListWidget,
                              ZoomWidget, ExtractFramesDialog, 
                              OpenLabelFilesDialog,)
@@ -69,6 +75,21 @@ class MainWindow(QtWidgets.QMainWindow):
         self.videoLblFile = None
         self.fileListEditMode=False
 
+        ## Decode next/prev images in background.
+        self.imagePrefetcher = ImagePrefetcher(
+            num_workers=self._config["prefetch"]["num_workers"],
+            max_bytes=self._config["prefetch"]["max_memory"] * 1024 * 1024,
+        )
+        ## Write label files in background when auto save is on.
+        self.autoSaver = AutoSaver()
+        self.autoSaver.failed.connect(self.autoSaveFailed)
+        self._imageData = None
+        self.imageArr = None    ## decoded pixels shared by canvas, dialogs and AI.
+        self._decodedImage = None
+        self.dirIndexes = {}    ## key=dir path, value=DirectoryIndex
+        self._shapeColors = {}  ## key=(r, g, b), value=colors of shapes
+        self.embeddingPrecomputer = None
+
         self.lblFileLoaders = {
             0: lambda x,y,z=False: self.loadAppJsonFile(x,y,z),
             1: lambda x,y,z=False: self.loadTxtFile(x,y,z),
@@ -185,7 +206,8 @@ class MainWindow(QtWidgets.QMainWindow):
         
         self.fileSearch = QtWidgets.QLineEdit()
         self.fileSearch.setPlaceholderText(self.tr("Search Filename"))
-        self.fileListWidget = QtWidgets.QListWidget()
+        self.fileListWidget = FileListWidget()
+        self.fileListWidget.setLabelFileGetter(self.findLabelFileOf)
         fileListLayout = QtWidgets.QVBoxLayout()
         fileListLayout.setContentsMargins(0, 0, 0, 0)
         fileListLayout.setSpacing(0)
@@ -215,15 +237,27 @@ class MainWindow(QtWidgets.QMainWindow):
         self.setCentralWidget(scrollArea)
 
         ## Canvas Widget
+        ## Image embeddings of AI models, kept on disk across sessions.
+        embeddingCacheConfig = self._config["ai"]["embedding_cache"]
+        embeddingCache = EmbeddingCache(
+            cache_dir=embeddingCacheConfig["dir"] or osp.join(
+                osp.expanduser("~"), ".cache", "myLabelme", "embeddings"
+            ),
+            max_bytes=embeddingCacheConfig["max_disk"] * 1024 * 1024,
+            ram_entries=embeddingCacheConfig["ram_entries"],
+        )
         self.canvas = self.labelList.canvas = Canvas(
             epsilon=self._config["epsilon"],
             double_click=self._config["canvas"]["double_click"],
             num_backups=self._config["canvas"]["num_backups"],
+            max_backup_bytes=self._config["canvas"]["max_backup_memory"] * 1024 * 1024,
             crosshair=self._config["canvas"]["crosshair"],
+            embedding_cache=embeddingCache,
         )
         scrollArea.setWidget(self.canvas)
         
         self.canvas.zoomRequest.connect(self.zoomRequest)
+        self.canvas.aiModelChanged.connect(self.precomputeEmbeddings)
         self.canvas.scrollRequest.connect(self.scrollRequest)
         self.canvas.selectionChanged.connect(self.shapeSelectionChanged)
         self.canvas.newShape.connect(self.newShape)
@@ -276,7 +310,17 @@ class MainWindow(QtWidgets.QMainWindow):
         )
 
         self.model_path = None
-        self.yoloModel = YoloModel()
+        self.yoloModel = YoloModel(
+            registry=ModelRegistry(
+                max_models=self._config["yolo"]["max_models"],
+                max_bytes=self._config["yolo"]["max_memory"] * 1024 * 1024,
+            )
+        )
+        self.yoloWorker = None
+        self.predictionFile = None  ## File whose shapes include its prediction.
+        self.predictionsDir = self._config["yolo"]["predictions_dir"] or osp.join(
+            osp.expanduser("~"), ".cache", "myLabelme", "predictions"
+        )
 
         yoloMainWidget = QtWidgets.QWidget()
         yoloMainWidgetLayout = QtWidgets.QVBoxLayout()
@@ -1029,9 +1073,12 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.lastOpenDir = dirpath
         self.filename = None
+        self.cancelYoloWorker()
         self.fileListWidget.clear()
+        self.imagePrefetcher.clear()
 
-        filenames = self.scanAllImages(dirpath)
+        ### Searching uses the cached index, only opening a dir rescans it.
+        filenames = self.scanAllImages(dirpath, refresh=pattern is None)
         if not filenames:   ## FIXED
             return
 
@@ -1039,42 +1086,24 @@ class MainWindow(QtWidgets.QMainWindow):
         ### For search in list.
         ### Filter files for pattern to select specific one.
         if pattern:
-            try:
-                filenames = [f for f in filenames if re.search(f,pattern)]
-            except re.error:
-                pass
-        ### Mark file item if already has label file
-        for filename in filenames:
-            labelfile = osp.splitext(filename)[0] + ".json"
-            if self.output_dir:
-                label_file_without_path = osp.basename(labelfile)
-                labelfile = osp.join(self.output_dir, label_file_without_path)
-            item = QtWidgets.QListWidgetItem(filename)
-            item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable)
-            if osp.exists(labelfile) and (LabelFile.is_label_file(labelfile) or osp.splitext(labelfile)[1]==".txt"):
-                item.setCheckState(Qt.Checked)
-            else:
-                item.setCheckState(Qt.Unchecked)
-            self.fileListWidget.addItem(item)
+            filenames = self.dirIndexes[dirpath].search(pattern)
+        ### Label files are checked lazily when items are shown.
+        self.fileListWidget.setFiles(filenames)
 
         self.openNextImg(load=load)
 
-    ## Get All images from given dir path.    
-    def scanAllImages(self, folderPath):
-        extensions = tuple([
-            ".%s" % fmt.data().decode().lower()
-            for fmt in QtGui.QImageReader.supportedImageFormats()
-        ])
-
-        images = []
-        for root, dirs, files in os.walk(folderPath):
-            for file in files:
-                if file.lower().endswith(extensions):
-                    relativePath = osp.normpath(osp.join(root,file))
-                    images.append(relativePath)
+    ## Get All images from given dir path.
+    ## Directory listings are cached per root and only changed dirs are rescanned.
+    def scanAllImages(self, folderPath, refresh=True):
+        if folderPath not in self.dirIndexes:
+            extensions = tuple([
+                ".%s" % fmt.data().decode().lower()
+                for fmt in QtGui.QImageReader.supportedImageFormats()
+            ])
+            self.dirIndexes[folderPath] = DirectoryIndex(folderPath, extensions)
 
-        images = natsort.os_sorted(images)
-        return images
+        index = self.dirIndexes[folderPath]
+        return index.refresh() if refresh else index.files()
     
     ## open dropped images.
     def importDroppedImageFiles(self, imageFiles):
@@ -1085,20 +1114,11 @@ class MainWindow(QtWidgets.QMainWindow):
         
         self.filename = None
         self.resetFileListWidget(load=False)
+        self.imagePrefetcher.clear()
         for file in imageFiles:
-            if file in self.imageList or not file.lower().endswith(extensions):
+            if self.fileListWidget.rowOf(file) >= 0 or not file.lower().endswith(extensions):
                 continue
-            label_file = osp.splitext(file)[0] + ".json"
-            if self.output_dir:
-                label_file_without_path = osp.basename(label_file)
-                label_file = osp.join(self.output_dir, label_file_without_path)
-            item = QtWidgets.QListWidgetItem(file)
-            item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable)
-            if QtCore.QFile.exists(label_file) and LabelFile.is_label_file(label_file):
-                item.setCheckState(Qt.Checked)
-            else:
-                item.setCheckState(Qt.Unchecked)
-            self.fileListWidget.addItem(item)
+            self.fileListWidget.addFiles([file])
 
             if len(imageFiles) > 1:
                 self.actions.openNextImg.setEnabled(True)
@@ -1158,12 +1178,12 @@ class MainWindow(QtWidgets.QMainWindow):
             return
 
         label_file = self.getOutputFile()
+        self.autoSaver.discard(label_file)
         if osp.exists(label_file):
             os.remove(label_file)
             logger.info("Label file is removed: {}".format(label_file))
 
-            item = self.fileListWidget.currentItem()
-            item.setCheckState(Qt.Unchecked)
+            self.fileListWidget.setChecked(self.filename, False)
 
             self.resetState()
 
@@ -1187,7 +1207,9 @@ class MainWindow(QtWidgets.QMainWindow):
             filename = self.imageList[0]
         else:           ### open next one.
             try:    #### fixed
-                currIndex = self.imageList.index(self.filename)
+                currIndex = self.fileListWidget.rowOf(self.filename)
+                if currIndex < 0:
+                    raise ValueError
             except ValueError:
                 self.errorMessage("Error Opening Image","Current image not found in file list")
                 self._config["keep_prev"] = keep_prev
@@ -1218,7 +1240,9 @@ class MainWindow(QtWidgets.QMainWindow):
             return
         
         try:    #### fixed
-            currIndex = self.imageList.index(self.filename)
+            currIndex = self.fileListWidget.rowOf(self.filename)
+            if currIndex < 0:
+                raise ValueError
         except ValueError:
             self.errorMessage("Error Opening Image","Current image not found in files list")
             self._config["keep_prev"] = keep_prev
@@ -1234,10 +1258,9 @@ class MainWindow(QtWidgets.QMainWindow):
     def loadFile(self, filename=None):
         """Load the specified file, or the last opened file if None."""
         ### Mark the new loaded file
-        if filename in self.imageList and (
-            self.fileListWidget.currentRow() != self.imageList.index(filename)
-        ):
-            self.fileListWidget.setCurrentRow(self.imageList.index(filename))
+        row = self.fileListWidget.rowOf(filename)
+        if row >= 0 and self.fileListWidget.currentRow() != row:
+            self.fileListWidget.setCurrentRow(row)
             self.fileListWidget.repaint()
             return
 
@@ -1271,9 +1294,18 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.lblFileLoaders.get(self.labelFileType)(filename,label_file)
 
-        image = QtGui.QImage.fromData(self.imageData)
+        ## Decode only if image was not already decoded from image file.
+        image = self._decodedImage
+        if image is None and self._imageData:
+            try:
+                self.imageArr = utils.img_pil_to_arr(
+                    utils.img_data_to_pil(self._imageData)
+                )
+                image = utils.img_arr_to_qimage(self.imageArr)
+            except (IOError, OSError):
+                image = None
 
-        if image.isNull():
+        if image is None or image.isNull():
             formats = [
                 "*.{}".format(fmt.data().decode())
                 for fmt in QtGui.QImageReader.supportedImageFormats()
@@ -1291,10 +1323,16 @@ class MainWindow(QtWidgets.QMainWindow):
         self.filename = filename
         if self._config["keep_prev"]: ## Previous image shapes.
             prev_shapes = self.canvas.shapes
-        self.canvas.loadPixmap(QtGui.QPixmap.fromImage(image))
+        if not isinstance(image, TiledImage):
+            image = QtGui.QPixmap.fromImage(image)
+        self.canvas.loadPixmap(
+            image, image_arr=self.imageArr, image_file=self.imagePath
+        )
         flags = {k: False for k in self._config["flags"] or []}
-        if self.yoloModel.predictions and self.fileListWidget.count()>0:
-            self.loadLabels(self.yoloModel.getCurrentImagePrediction(self.fileListWidget.currentRow()))
+        prediction = self.yoloModel.getImagePrediction(filename)
+        if prediction is not None:
+            self.loadLabels(prediction)
+            self.predictionFile = filename
             self.actions.editMode.setEnabled(True)
             self.actions.undo.setEnabled(True)
             self.setDirty()
@@ -1329,42 +1367,143 @@ class MainWindow(QtWidgets.QMainWindow):
                     orientation, self.scroll_values[orientation][self.filename]
                 )
         # set brightness contrast values
-        dialog = BrightnessContrastDialog(
-            utils.img_data_to_pil(self.imageData),
-            self.onNewBrightnessContrast,
-            parent=self,
-        )
-        brightness, contrast = self.brightnessContrast_values.get(
-            self.filename, (None, None)
-        )
-        if self._config["keep_prev_brightness"] and self.recentFiles:
-            brightness, _ = self.brightnessContrast_values.get(
-                self.recentFiles[0], (None, None)
+        # (tiled images are not decoded, so they cannot be adjusted)
+        if self.imageArr is not None:
+            dialog = BrightnessContrastDialog(
+                PIL.Image.fromarray(self.imageArr),
+                self.onNewBrightnessContrast,
+                parent=self,
             )
-        if self._config["keep_prev_contrast"] and self.recentFiles:
-            _, contrast = self.brightnessContrast_values.get(
-                self.recentFiles[0], (None, None)
+            brightness, contrast = self.brightnessContrast_values.get(
+                self.filename, (None, None)
             )
-        if brightness is not None:
-            dialog.slider_brightness.setValue(brightness)
-        if contrast is not None:
-            dialog.slider_contrast.setValue(contrast)
-        self.brightnessContrast_values[self.filename] = (brightness, contrast)
-        if brightness is not None or contrast is not None:
-            dialog.onNewValue(None)
+            if self._config["keep_prev_brightness"] and self.recentFiles:
+                brightness, _ = self.brightnessContrast_values.get(
+                    self.recentFiles[0], (None, None)
+                )
+            if self._config["keep_prev_contrast"] and self.recentFiles:
+                _, contrast = self.brightnessContrast_values.get(
+                    self.recentFiles[0], (None, None)
+                )
+            if brightness is not None:
+                dialog.slider_brightness.setValue(brightness)
+            if contrast is not None:
+                dialog.slider_contrast.setValue(contrast)
+            self.brightnessContrast_values[self.filename] = (brightness, contrast)
+            if brightness is not None or contrast is not None:
+                dialog.onNewValue(None)
         self.paintCanvas()
         self.addRecentFile(self.filename)
         self.toggleActions(True)
         self.toggleRunYoloBtns()
+        self.prefetchImages()
+        self.precomputeEmbeddings()
         #self.canvas.setFocus()
         self.status(str(self.tr("Loaded %s")) % osp.basename(str(filename)))
         return True
+
+    ## Encoded image bytes. Created from imageArr only when needed
+    ## (e.g. saving with image data), so images are not re-encoded on load.
+    @property
+    def imageData(self):
+        if self._imageData is None and self.imageArr is not None:
+            self._imageData = utils.img_arr_to_data(self.imageArr)
+        return self._imageData
+
+    @imageData.setter
+    def imageData(self, value):
+        self._imageData = value
+        self.imageArr = None
+        self._decodedImage = None
+
+    ## Decode image file once. Prefetched image is used if found.
+    def loadImageFile(self, filename):
+        if self.isTiledImage(filename):
+            self.imageArr, self._imageData = None, None
+            self._decodedImage = TiledImage(
+                filename,
+                tile_size=self._config["tiled_image"]["tile_size"],
+                cache_dir=self._config["tiled_image"]["cache_dir"],
+                num_workers=self._config["tiled_image"]["num_workers"],
+            )
+            return True
+        entry = self.imagePrefetcher.take(filename)
+        if entry is None:
+            entry = ImagePrefetcher.decode(filename)
+        if entry is None:
+            self.imageData = None
+            return False
+        self.imageArr, self._imageData, self._decodedImage = entry
+        return True
+
+    ## Images too large to decode at once are shown from a tile pyramid.
+    def isTiledImage(self, filename):
+        min_pixels = self._config["tiled_image"]["min_pixels"]
+        return bool(min_pixels) and TiledImage.isLarge(filename, min_pixels)
+
+    ## Decode images around current file in background.
+    def prefetchImages(self):
+        images = self.imageList
+        currIndex = self.fileListWidget.rowOf(self.filename)
+        if currIndex < 0:
+            return
+        nNext = self._config["prefetch"]["next"]
+        nPrev = self._config["prefetch"]["prev"]
+        filenames = [self.filename]
+        for i in range(1, max(nNext, nPrev) + 1):
+            if i <= nNext and currIndex + i < len(images):
+                filenames.append(images[currIndex + i])
+            if i <= nPrev and currIndex - i >= 0:
+                filenames.append(images[currIndex - i])
+        self.imagePrefetcher.prefetch(
+            [f for f in filenames if not self.isTiledImage(f)]
+        )
     
+    ## Compute AI model embeddings of next images in background,
+    ## so the first click on them does not wait for the encoder.
+    def precomputeEmbeddings(self):
+        model = self.canvas.aiModel
+        nNext = self._config["ai"]["precompute"]["next"]
+        if (
+            model is None
+            or nNext <= 0
+            or self.canvas.createMode not in ["ai_polygon", "ai_mask"]
+        ):
+            return
+        currIndex = self.fileListWidget.rowOf(self.filename)
+        if currIndex < 0:
+            return
+        if self.embeddingPrecomputer is None or self.embeddingPrecomputer.model is not model:
+            if self.embeddingPrecomputer is not None:
+                self.embeddingPrecomputer.shutdown()
+            self.embeddingPrecomputer = EmbeddingPrecomputer(
+                model,
+                num_workers=self._config["ai"]["precompute"]["num_workers"],
+                num_threads=self._config["ai"]["precompute"]["num_threads"],
+            )
+        self.embeddingPrecomputer.precompute(
+            [
+                f
+                for f in self.imageList[currIndex + 1 : currIndex + 1 + nNext]
+                if not self.isTiledImage(f)
+            ]
+        )
+
     def loadAppJsonFile(self, filename:str, label_file:str, load=False):
+        self.autoSaver.flush(label_file)
          ## Checks if .json label file found first in the same img path.
         if QtCore.QFile.exists(label_file) and LabelFile.is_label_file(label_file):
             try:
-                self.labelFile = LabelFile(label_file)
+                ## Image is read only after checking it is not shown from tiles.
+                self.labelFile = LabelFile(label_file, load_image=False)
+                imagePath = osp.join(
+                    osp.dirname(label_file),
+                    self.labelFile.imagePath,
+                )
+                if self.isTiledImage(imagePath):
+                    self.loadImageFile(imagePath)
+                else:
+                    self.imageData = self.labelFile.imageData
             except LabelFileError as e:
                 self.errorMessage(
                     self.tr("Error opening file"),
@@ -1376,25 +1515,19 @@ class MainWindow(QtWidgets.QMainWindow):
                 )
                 self.status(self.tr("Error reading %s") % label_file)
                 return False
-            self.imageData = self.labelFile.imageData
-            self.imagePath = osp.join(
-                osp.dirname(label_file),
-                self.labelFile.imagePath,
-            )
+            self.imagePath = imagePath
             self.otherData = self.labelFile.otherData
             if load:
                 self.loadLabels(self.labelFile.shapes,load)
                 self.loadFlags(self.labelFile.flags)
         else:
-            self.imageData = LabelFile.load_image_file(filename)
-            if self.imageData:
+            if self.loadImageFile(filename):
                 self.imagePath = filename
             self.labelFile = None
     
     def loadTxtFile(self, filename:str=None, label_file:str=None, loadAnnOnly=False):
         if not loadAnnOnly:
-            self.imageData = LabelFile.load_image_file(filename)
-            if not self.imageData:
+            if not self.loadImageFile(filename):
                 return
             self.imagePath = filename
 
@@ -1410,8 +1543,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def loadVideoFile(self, filename:str, loadAnnOnly= False):
         ## check for list
-        self.imageData = LabelFile.load_image_file(filename)
-        if not self.imageData:
+        if not self.loadImageFile(filename):
             return
         
         self.imagePath = filename
@@ -1554,6 +1686,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.imageData = None
         self.labelFile = None
         self.otherData = None
+        self.predictionFile = None
         self.canvas.resetState()
 
     def toggleActions(self, value=True):
@@ -1572,21 +1705,36 @@ class MainWindow(QtWidgets.QMainWindow):
     ## Add labels to lists and draw on canvas.
     def loadShapes(self, shapes, replace=True):
         self._noSelectionSlot = True
-        for shape in shapes:
-            self.addLabel(shape)
+        self.addLabels(shapes)
         self.labelList.clearSelection()
         self._noSelectionSlot = False
         self.canvas.loadShapes(shapes, replace=replace)  ## draw on canvas
 
     ## Update drawn shape color.
+    ## Colors are shared by shapes of the same color, shapes replace
+    ## them instead of modifying.
     def _update_shape_color(self, shape):
-        r, g, b = self._get_rgb_by_label(shape.label)
-        shape.line_color = QtGui.QColor(r, g, b)
-        shape.vertex_fill_color = QtGui.QColor(r, g, b)
-        shape.hvertex_fill_color = QtGui.QColor(255, 255, 255)
-        shape.fill_color = QtGui.QColor(r, g, b, 128)
-        shape.select_line_color = QtGui.QColor(255, 255, 255)
-        shape.select_fill_color = QtGui.QColor(r, g, b, 155)
+        rgb = self._get_rgb_by_label(shape.label)
+        colors = self._shapeColors.get(tuple(rgb))
+        if colors is None:
+            r, g, b = rgb
+            colors = self._shapeColors[tuple(rgb)] = (
+                QtGui.QColor(r, g, b),
+                QtGui.QColor(r, g, b),
+                QtGui.QColor(255, 255, 255),
+                QtGui.QColor(r, g, b, 128),
+                QtGui.QColor(255, 255, 255),
+                QtGui.QColor(r, g, b, 155),
+            )
+        (
+            shape.line_color,
+            shape.vertex_fill_color,
+            shape.hvertex_fill_color,
+            shape.fill_color,
+            shape.select_line_color,
+            shape.select_fill_color,
+        ) = colors
+        self.canvas.invalidateLayer()
 
     ## Copy multiple selected shapes.
     def copyShape(self):
@@ -1666,6 +1814,27 @@ class MainWindow(QtWidgets.QMainWindow):
     
     ## Setting shape objects to load it
     def loadLabels(self, shapes, annsOnly=False):
+        # Shapes have no reference cycles, so garbage collection is paused
+        # instead of running full collections while thousands are created.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            s = self.createShapes(shapes)
+            if annsOnly and not self.noShapes():
+                self.replaceShapes(s)   ## When loading annotation file separately.
+            else:
+                self.loadShapes(s)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    ## Create Shapes from label file shape dicts.
+    def createShapes(self, shapes):
+        label_flags = [
+            (re.compile(pattern), keys)
+            for pattern, keys in (self._config["label_flags"] or {}).items()
+        ]
+        default_flags_of_label = {}
         s = []
         for shape in shapes:
             label = shape["label"]
@@ -1688,25 +1857,21 @@ class MainWindow(QtWidgets.QMainWindow):
                 mask = shape["mask"],
             )
 
-            for x, y in points:
-                shape.addPoint(QtCore.QPointF(x, y))
+            shape.addPoints(points)
             shape.close()
 
-            default_flags = {}
-            if self._config["label_flags"]:
-                for pattern, keys in self._config["label_flags"].items():
-                    if re.match(pattern, label):
+            if label not in default_flags_of_label:
+                default_flags = {}
+                for pattern, keys in label_flags:
+                    if pattern.match(label):
                         for key in keys:
                             default_flags[key] = False
-            shape.flags = default_flags
+                default_flags_of_label[label] = default_flags
+            shape.flags = dict(default_flags_of_label[label])
             shape.flags.update(flags)
             shape.other_data = other_data
             s.append(shape)
-        
-        if annsOnly and not self.noShapes():
-            self.replaceShapes(s)   ## When loading annotation file separately.
-        else:
-            self.loadShapes(s)
+        return s
     
     ## Ask user to replace current shapes or not
     def replaceShapes(self, shapes):
@@ -1728,29 +1893,42 @@ class MainWindow(QtWidgets.QMainWindow):
 
     ## add labels to label and uniqLabel list.
     def addLabel(self, shape):
-        if shape.group_id is None:
-            text = shape.label
-        else:
-            text = "{} ({})".format(shape.label, shape.group_id)
-        label_list_item = LabelListWidgetItem(text, shape)
-        self.labelList.addItem(label_list_item) ### add label to labelList.
-        if self.uniqLabelList.findItemByLabel(shape.label) is None:
-            item = self.uniqLabelList.createItemFromLabel(shape.label)
-            self.uniqLabelList.addItem(item) ### add label to uniqLabel list.
-            rgb = self._get_rgb_by_label(shape.label)
-            self.uniqLabelList.setItemLabel(item, shape.label, rgb)
-        self.labelDialog.addLabelHistory(shape.label)
-        
-        for action in self.actions.onShapesPresent:
-            action.setEnabled(True)
+        self.addLabels([shape])
 
-        ### Updating shape object's color of current label.
-        self._update_shape_color(shape)
-        label_list_item.setText(
-            '{} <font color="#{:02x}{:02x}{:02x}">●</font>'.format(
-                html.escape(text), *shape.fill_color.getRgb()[:3]
+    ## Add items of shapes to labelList at once, with their final text so
+    ## that no item signal is emitted per shape.
+    def addLabels(self, shapes):
+        label_list_items = []
+        labels = set()
+        for shape in shapes:
+            if shape.group_id is None:
+                text = shape.label
+            else:
+                text = "{} ({})".format(shape.label, shape.group_id)
+            if shape.label not in labels:
+                labels.add(shape.label)
+                if self.uniqLabelList.findItemByLabel(shape.label) is None:
+                    item = self.uniqLabelList.createItemFromLabel(shape.label)
+                    self.uniqLabelList.addItem(item) ### add label to uniqLabel list.
+                    rgb = self._get_rgb_by_label(shape.label)
+                    self.uniqLabelList.setItemLabel(item, shape.label, rgb)
+                self.labelDialog.addLabelHistory(shape.label)
+
+            ### Updating shape object's color of current label.
+            self._update_shape_color(shape)
+            label_list_items.append(
+                LabelListWidgetItem(
+                    '{} <font color="#{:02x}{:02x}{:02x}">●</font>'.format(
+                        html.escape(text), *shape.fill_color.getRgb()[:3]
+                    ),
+                    shape,
+                )
             )
-        )
+        self.labelList.addItems(label_list_items) ### add labels to labelList.
+
+        if shapes:
+            for action in self.actions.onShapesPresent:
+                action.setEnabled(True)
     
     def hasLabels(self):
         if self.noShapes():
@@ -1796,14 +1974,29 @@ class MainWindow(QtWidgets.QMainWindow):
         if self.filename.lower().endswith(".json"):
             return self.filename
 
+        return self.getLabelFileOf(self.filename)
+
+    ## Get label file path of given image path.
+    def getLabelFileOf(self, filename):
+        label_file = osp.splitext(filename)[0] + ".json"
         if self.output_dir:
-            label_file = osp.splitext(self.filename)[0] + ".json"
             label_file = osp.join(self.output_dir, osp.basename(label_file))
-        else:
-            label_file = osp.splitext(self.filename)[0] + ".json"
-
         return label_file
 
+    ## Get existing label file of given image path, to mark it annotated.
+    ## Looks up the label file loaded by loadFile (label file type and
+    ## label files dir) first, then the one saved by saveFile.
+    def findLabelFileOf(self, filename):
+        label_file = osp.splitext(filename)[0] + self.getlblFileExt
+        if self.labelFilesDir:
+            label_file = osp.join(self.labelFilesDir, osp.basename(label_file))
+        if osp.exists(label_file) and (
+            LabelFile.is_label_file(label_file)
+            or osp.splitext(label_file)[1] == ".txt"
+        ):
+            return label_file
+        return self.getLabelFileOf(filename)
+
     def hasLabelFile(self):
         if self.filename is None:
             return False
@@ -1915,11 +2108,8 @@ class MainWindow(QtWidgets.QMainWindow):
         if self._config["validate_label"] is None:
             return True
 
-        for i in range(self.uniqLabelList.count()):
-            label_i = self.uniqLabelList.item(i).data(Qt.UserRole)
-            if self._config["validate_label"] in ["exact"]:
-                if label_i == label:
-                    return True
+        if self._config["validate_label"] in ["exact"]:
+            return self.uniqLabelList.findItemByLabel(label) is not None
         return False
 
     ## PopUp label menu (on right click over label list item)
@@ -1937,37 +2127,30 @@ class MainWindow(QtWidgets.QMainWindow):
     def fileSearchChanged(self):
         self.importDirImages(
             self.lastOpenDir,
-            self.fileSearch.text,
+            self.fileSearch.text(),
             False,
         )
     ## triggered when selecting new file item
     ## to load it.
     def fileSelectionChanged(self):
         ## Enable and Disable File list widget buttons.
-        isEnable = len(self.fileListWidget.selectedItems())>0
+        isEnable = len(self.fileListWidget.selectedRows())>0
         self.fileListDeleteBtn.setEnabled(isEnable)
         self.fileListEditBtn.setEnabled(isEnable and not self.fileListEditMode)
 
         if not self.fileListEditMode:   ## Do not load image when editing file list.
-            items = self.fileListWidget.selectedItems()
-            if not items or not self.mayContinue():
+            rows = self.fileListWidget.selectedRows()
+            if not rows or not self.mayContinue():
                 return
             
-            item = items[0]
-            currIndex = self.imageList.index(str(item.text()))
-            if currIndex < len(self.imageList):
-                filename = self.imageList[currIndex]
-                if filename:
-                    self.loadFile(filename)
-
-    ## Adding all files from fileList to image list.    
+            filename = self.imageList[rows[0]]
+            if filename:
+                self.loadFile(filename)
+
+    ## All files of file list. Owned by the list model, do not modify.
     @property
     def imageList(self):
-        lst = []
-        for i in range(self.fileListWidget.count()):
-            item = self.fileListWidget.item(i)
-            lst.append(item.text())
-        return lst
+        return self.fileListWidget.paths()
     
     ## Toggle file list state to default.
     def resetFileListWidget(self, load=True):
@@ -1982,10 +2165,9 @@ class MainWindow(QtWidgets.QMainWindow):
                 self.actions.openPrevImg.setEnabled(False)
                 return
             ## If current file not removed >> just mark it as current row without reloading image.
-            items = self.fileListWidget.findItems(self.filename, Qt.MatchExactly)
-            if not items:
+            row = self.fileListWidget.rowOf(self.filename)
+            if row < 0:
                 return
-            row = self.fileListWidget.row(items[0])
             self.fileListWidget.itemSelectionChanged.disconnect(self.fileSelectionChanged)
             self.fileListDeleteBtn.setEnabled(True)
             self.fileListEditBtn.setEnabled(True)
@@ -2005,13 +2187,13 @@ class MainWindow(QtWidgets.QMainWindow):
 
     ## Remove selected item/s.
     def removeSelectedFiles(self):
-        items = self.fileListWidget.selectedItems()
+        files = [self.imageList[row] for row in self.fileListWidget.selectedRows()]
 
         mb = QtWidgets.QMessageBox
         replay = mb.question(
             self,
             "Remove Files",
-            "%s files will be removed from list. Are you sure?" % len(items),
+            "%s files will be removed from list. Are you sure?" % len(files),
             mb.Yes | mb.No | mb.Cancel,
             mb.Yes,
         )
@@ -2021,17 +2203,15 @@ class MainWindow(QtWidgets.QMainWindow):
         if replay == mb.No: ## Do no thing.
             return
         else:       ## Delete items.
-            currItemRow = None
-            for item in items:
-                row = self.fileListWidget.row(item)
-                if self.filename == item.text():
-                    currItemRow = row
-                else:
-                    self.fileListWidget.takeItem(row)
+            currFile = self.filename
+            self.fileListWidget.removeFiles(
+                [file for file in files if file != currFile]
+            )
             
-            if currItemRow is not None and self.closeFile():
-                self.fileListWidget.takeItem(currItemRow)
+            if currFile in files and self.closeFile():
+                self.fileListWidget.removeFiles([currFile])
 
+            self.imagePrefetcher.clear()
             self.resetFileListWidget()
 
     ##############  utils  #############
@@ -2045,7 +2225,7 @@ class MainWindow(QtWidgets.QMainWindow):
             if self.output_dir:
                 label_file_without_path = osp.basename(label_file)
                 label_file = osp.join(self.output_dir, label_file_without_path)
-            self.saveLabels(label_file)
+            self.autoSaveLabels(label_file)
             return
         self.dirty = True
         self.actions.save.setEnabled(True)
@@ -2111,9 +2291,10 @@ class MainWindow(QtWidgets.QMainWindow):
         current_file = self.filename
         self.importDirImages(self.lastOpenDir, load=False)
 
-        if current_file in self.imageList:
+        row = self.fileListWidget.rowOf(current_file)
+        if row >= 0:
             # retain currently selected file
-            self.fileListWidget.setCurrentRow(self.imageList.index(current_file))
+            self.fileListWidget.setCurrentRow(row)
             self.fileListWidget.repaint()
 
 
@@ -2217,6 +2398,10 @@ class MainWindow(QtWidgets.QMainWindow):
         self.settings.setValue("window/position", self.pos())
         self.settings.setValue("window/state", self.saveState())
         self.settings.setValue("recentFiles", self.recentFiles)
+        if event.isAccepted():
+            self.autoSaver.flush()
+            self.cancelYoloWorker(wait=True)
+            self.yoloModel.resetPredictions()
 
     ## Pop up dialog with error message.
     def errorMessage(self, title, message):
@@ -2276,9 +2461,9 @@ class MainWindow(QtWidgets.QMainWindow):
             self.addRecentFile(filename)
             self.setClean()
 
-    def saveLabels(self, filename):
-        lf = LabelFile()
-
+    ## Snapshot of labels as LabelFile.save arguments, safe to use from
+    ## another thread while editing continues.
+    def labelData(self, filename):
         def format_shape(s):
             data = s.other_data.copy()
             data.update(
@@ -2288,8 +2473,8 @@ class MainWindow(QtWidgets.QMainWindow):
                     group_id=s.group_id,
                     description=s.description,
                     shape_type=s.shape_type,
-                    flags=s.flags,
-                    mask=None if s.mask is None else utils.img_arr_to_b64(s.mask),
+                    flags=None if s.flags is None else dict(s.flags),
+                    mask=None if s.mask is None else s.mask.copy(),
                 )
             )
             return data
@@ -2301,27 +2486,39 @@ class MainWindow(QtWidgets.QMainWindow):
             key = item.text()
             flag = item.checkState() == Qt.Checked
             flags[key] = flag
+        return dict(
+            shapes=shapes,
+            imagePath=osp.relpath(self.imagePath, osp.dirname(filename)),
+            imageData=self.imageData if self._config["store_data"] else None,
+            imageHeight=self.image.height(),
+            imageWidth=self.image.width(),
+            otherData=dict(self.otherData or {}),
+            flags=flags,
+        )
+
+    def autoSaveLabels(self, filename):
+        self.autoSaver.schedule(filename, self.labelData(filename))
+        lf = LabelFile()
+        lf.filename = filename
+        self.labelFile = lf
+        self.fileListWidget.setChecked(self.imagePath, True)
+
+    def autoSaveFailed(self, filename, message):
+        self.errorMessage(
+            self.tr("Error saving label data"),
+            self.tr("<b>%s</b>") % "{}: {}".format(filename, message),
+        )
+
+    def saveLabels(self, filename):
+        lf = LabelFile()
         try:
-            imagePath = osp.relpath(self.imagePath, osp.dirname(filename))
-            imageData = self.imageData if self._config["store_data"] else None
+            self.autoSaver.discard(filename)
+            data = self.labelData(filename)
             if osp.dirname(filename) and not osp.exists(osp.dirname(filename)):
                 os.makedirs(osp.dirname(filename))
-            lf.save(
-                filename=filename,
-                shapes=shapes,
-                imagePath=imagePath,
-                imageData=imageData,
-                imageHeight=self.image.height(),
-                imageWidth=self.image.width(),
-                otherData=self.otherData,
-                flags=flags,
-            )
+            lf.save(filename=filename, **data)
             self.labelFile = lf
-            items = self.fileListWidget.findItems(self.imagePath, Qt.MatchExactly)
-            if len(items) > 0:
-                if len(items) != 1:
-                    raise RuntimeError("There are duplicate files.")
-                items[0].setCheckState(Qt.Checked)
+            self.fileListWidget.setChecked(self.imagePath, True)
             # disable allows next and previous image to proceed
             # self.filename = filename
             return True
@@ -2538,12 +2735,20 @@ class MainWindow(QtWidgets.QMainWindow):
     ##############  Brightness Functions  ############
 
     def onNewBrightnessContrast(self, qimage):
-        self.canvas.loadPixmap(QtGui.QPixmap.fromImage(qimage), clear_shapes=False)
+        ## AI models keep using the decoded image, so its embedding is reused.
+        self.canvas.loadPixmap(
+            QtGui.QPixmap.fromImage(qimage),
+            clear_shapes=False,
+            image_arr=self.imageArr,
+            image_file=self.imagePath,
+        )
 
     ## Open brightness/contrast dialog.
     def brightnessContrast(self, value):
+        if self.imageArr is None:
+            return
         dialog = BrightnessContrastDialog(
-            utils.img_data_to_pil(self.imageData),
+            PIL.Image.fromarray(self.imageArr),
             self.onNewBrightnessContrast,
             parent=self,
         )
@@ -2609,6 +2814,9 @@ class MainWindow(QtWidgets.QMainWindow):
     
     ## Object detection on single image
     def runYolo(self):
+        if self.yoloWorker is not None:
+            self.status("Wait for detection on files list to finish.")
+            return
         self._runYoloButton.setEnabled(False)
         self.status("Making predictions....")
 
@@ -2636,77 +2844,113 @@ class MainWindow(QtWidgets.QMainWindow):
         self.setDirty()
         self.yoloModel.resetPredictions()
 
-    def runYoloVid(self, track = False):
-        self._runYoloVidButton.setEnabled(False)
+    def runYoloVid(self):
+        self.runYoloOnFiles(track=False)
+
+    def runYoloTrack(self):
+        self.runYoloOnFiles(track=True)
+
+    ## Run detection/tracking on all files in background worker.
+    ## Predictions are stored on disk per model, so unfinished or
+    ## previous runs can be reused.
+    def runYoloOnFiles(self, track=False):
+        button = self._runYoloTrackButton if track else self._runYoloVidButton
+        if self.yoloWorker is not None:
+            return
 
         if self.fileListWidget.count()<=0:
             self.errorMessage("Error","<p>Files list is empty.</p>")
-            self._runYoloVidButton.setEnabled(True)
             return
-        
-        progress = QtWidgets.QProgressDialog("Running Model on Frames", "Cancel", 0, self.fileListWidget.count(), self)
-        progress.setWindowModality(Qt.WindowModal)
-        progress.setMinimumDuration(0)
+        button.setEnabled(False)
 
         if not self.yoloModel.loadModel():
-            self._runYoloVidButton.setEnabled(True)
-            progress.hide()
+            button.setEnabled(True)
             return
 
         images = self.imageList
+        store = self.yoloModel.openPredictions(self.predictionsDir, track)
+        done = [image in store for image in images]
+        if any(done):
+            mb = QtWidgets.QMessageBox
+            answer = mb.question(
+                self,
+                self.tr("Reuse Predictions"),
+                self.tr("%d of %d frames already have predictions of this model. Reuse them?")
+                % (sum(done), len(images)),
+                mb.Yes | mb.No,
+                mb.Yes,
+            )
+            if answer != mb.Yes:
+                store.clear()
+                done = [False] * len(images)
+
+        if track:
+            ## Tracker needs consecutive frames from the first missing one.
+            start = done.index(False) if False in done else len(images)
+            images = images[start:]
+            if start == 0:
+                ## Cached model keeps tracker state of previous runs.
+                self.yoloModel.resetTracker()
+        else:
+            images = [image for image, isDone in zip(images, done) if not isDone]
 
-        self.yoloModel.resetPredictions()
-
-        for i in range(0,self.fileListWidget.count()):
-            progress.setValue(i)
-
-            if not progress.wasCanceled():
-                self.yoloModel.runModelOnVideo(images[i])
-        
-        print(len(self.yoloModel.predictions))
-        self.loadLabels(self.yoloModel.getCurrentImagePrediction(self.fileListWidget.currentRow()))
-        progress.setValue(self.fileListWidget.count())
-        self._runYoloVidButton.setEnabled(True)
-
-        self.actions.editMode.setEnabled(True)
-        self.actions.undo.setEnabled(True)
-        self.setDirty()
-
-    def runYoloTrack(self):
-        self._runYoloTrackButton.setEnabled(False)
-
-        if self.fileListWidget.count()<=0:
-            self.errorMessage("Error","<p>Files list is empty.</p>")
-            self._runYoloTrackButton.setEnabled(True)
+        if not images:
+            self.yoloWorkerFinished(None, button)
             return
-        
-        progress = QtWidgets.QProgressDialog("Running Model on Frames", "Cancel", 0, self.fileListWidget.count(), self)
-        progress.setWindowModality(Qt.WindowModal)
+
+        progress = QtWidgets.QProgressDialog(
+            self.tr("Running Model on Frames"), self.tr("Cancel"), 0, len(images), self
+        )
+        progress.setWindowModality(Qt.NonModal)
         progress.setMinimumDuration(0)
+        progress.setValue(0)
 
-        if not self.yoloModel.loadModel():
-            self._runYoloVidButton.setEnabled(True)
-            progress.hide()
+        worker = ModelWorker(
+            self.yoloModel.model,
+            images,
+            track=track,
+            batch_size=self._config["yolo"]["batch_size"],
+            parent=self,
+        )
+        worker.frameProcessed.connect(self.yoloFrameProcessed)
+        worker.progress.connect(progress.setValue)
+        worker.error.connect(lambda msg: self.errorMessage("Error", msg))
+        worker.finished.connect(lambda: self.yoloWorkerFinished(progress, button))
+        progress.canceled.connect(worker.cancel)
+        self.yoloWorker = worker
+        worker.start()
+
+    def yoloFrameProcessed(self, imagePath, arrays):
+        if self.yoloModel.predictions is not None:
+            self.yoloModel.predictions.append(imagePath, *arrays)
+
+    def yoloWorkerFinished(self, progress, button):
+        self.yoloWorker = None
+        if progress is not None:
+            progress.close()
+        button.setEnabled(True)
+        if self.yoloModel.predictions is not None:
+            self.yoloModel.predictions.flush()
+
+        ## Frames opened while the worker ran may show their prediction already.
+        if not self.filename or self.predictionFile == self.filename:
             return
-
-        images = self.imageList
-        self.yoloModel.resetPredictions()
-
-        for i in range(0,self.fileListWidget.count()):
-            progress.setValue(i)
-
-            if not progress.wasCanceled():
-                self.yoloModel.runModelWithTrack(images[i])
-        
-        print(len(self.yoloModel.predictions))
-        self.loadLabels(self.yoloModel.getCurrentImagePrediction(self.fileListWidget.currentRow()))
-        progress.setValue(self.fileListWidget.count())
-        self._runYoloTrackButton.setEnabled(True)
-        
+        prediction = self.yoloModel.getImagePrediction(self.filename)
+        if prediction is None:
+            return
+        self.loadLabels(prediction)
+        self.predictionFile = self.filename
         self.actions.editMode.setEnabled(True)
         self.actions.undo.setEnabled(True)
         self.setDirty()
 
+    def cancelYoloWorker(self, wait=False):
+        if self.yoloWorker is None:
+            return
+        self.yoloWorker.cancel()
+        if wait:
+            self.yoloWorker.wait()
+
     def selectObjModel(self):
         defaultPath = osp.dirname(self.yoloModel.modelPath) if self.yoloModel.modelPath else "."
         model_path, _ = QtWidgets.QFileDialog.getOpenFileName(
@@ -2727,6 +2971,8 @@ class MainWindow(QtWidgets.QMainWindow):
         self.yoloModel.setModelPath(model_path)
         self.yoloModelLabel.setText(self.yoloModel.getUniqueName())
         self.toggleRunYoloBtns()
+        if self._config["yolo"]["warmup"]:
+            self.yoloModel.warmup()
 
     def toggleRunYoloBtns(self):
         flag1 = True if self.fileListWidget.count()>0 else False
@@ -0,0 +1,109 @@
+import os
+import os.path as osp
+import tempfile
+import threading
+import time
+
+from qtpy import QtCore
+
+from .label_file import LabelFile
+from .logger import logger
+
+# Process umask, read once since reading it means setting it.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+class AutoSaver(QtCore.QObject):
+    """Write label files on a background thread.
+
+    `schedule` takes an immutable snapshot of `LabelFile.save` arguments.
+    Snapshots of the same file scheduled within `delay` seconds are
+    coalesced and only the latest one is written. Files are written to a
+    temporary file in the same directory and renamed over the label file,
+    so readers never see partial files. The label file keeps its mode, new
+    ones get the default mode of the umask. `saved` or `failed` is emitted
+    after each write.
+    """
+
+    saved = QtCore.Signal(str)
+    failed = QtCore.Signal(str, str)
+
+    def __init__(self, delay=0.5):
+        super().__init__()
+        self.delay = delay
+        self._cond = threading.Condition()
+        self._pending = {}  # key=filename, value=(due time, save kwargs)
+        self._writing = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def schedule(self, filename, data):
+        with self._cond:
+            self._pending[filename] = (time.monotonic() + self.delay, data)
+            self._cond.notify_all()
+
+    def discard(self, filename):
+        """Drop pending snapshot of filename and wait for a running write."""
+        with self._cond:
+            self._pending.pop(filename, None)
+            while self._writing == filename:
+                self._cond.wait()
+
+    def flush(self, filename=None):
+        """Write pending snapshots now and wait until they are written."""
+        with self._cond:
+            for key, (_, data) in self._pending.items():
+                if filename is None or key == filename:
+                    self._pending[key] = (0, data)
+            self._cond.notify_all()
+            while self._writing is not None or any(
+                filename is None or key == filename for key in self._pending
+            ):
+                self._cond.wait()
+
+    @staticmethod
+    def write(filename, data):
+        """Save label file atomically, data being `LabelFile.save` kwargs."""
+        dirname = osp.dirname(filename)
+        if dirname and not osp.exists(dirname):
+            os.makedirs(dirname)
+        basename, ext = osp.splitext(osp.basename(filename))
+        fd, tmp = tempfile.mkstemp(suffix=ext, prefix="." + basename, dir=dirname)
+        os.close(fd)
+        try:
+            LabelFile().save(filename=tmp, **data)
+            # mkstemp creates files readable by the owner only.
+            try:
+                mode = os.stat(filename).st_mode & 0o7777
+            except OSError:
+                mode = 0o666 & ~_UMASK
+            os.chmod(tmp, mode)
+            os.replace(tmp, filename)
+        finally:
+            if osp.exists(tmp):
+                os.remove(tmp)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    due = [(due, key) for key, (due, _) in self._pending.items()]
+                    if due and min(due)[0] <= now:
+                        filename = min(due)[1]
+                        break
+                    self._cond.wait(min(due)[0] - now if due else None)
+                _, data = self._pending.pop(filename)
+                self._writing = filename
+            try:
+                self.write(filename, data)
+            except Exception as e:
+                logger.error("Failed saving {}: {}".format(filename, e))
+                self.failed.emit(filename, str(e))
+            else:
+                self.saved.emit(filename)
+            finally:
+                with self._cond:
+                    self._writing = None
+                    self._cond.notify_all()
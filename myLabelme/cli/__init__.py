@@ -1,6 +1,9 @@
 # flake8: noqa
 
+from . import convert_label_file
 from . import draw_json
 from . import draw_label_png
+from . import export_dataset
 from . import export_json
 from . import on_docker
+from . import precompute_embeddings
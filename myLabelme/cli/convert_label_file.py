@@ -0,0 +1,64 @@
+import argparse
+import os.path as osp
+
+from ..label_file import LabelFile
+from ..logger import logger
+
+
+def convert(in_file, out_file, store_data=True):
+    label_file = LabelFile(in_file)
+    shapes = []
+    for shape in label_file.shapes:
+        shape = dict(shape)
+        shape.update(shape.pop("other_data"))
+        shapes.append(shape)
+    # Keep the image relative to the output file.
+    imagePath = osp.relpath(
+        osp.join(osp.dirname(in_file), label_file.imagePath),
+        osp.dirname(osp.abspath(out_file)),
+    )
+    height, width = label_file.getImageShapes()
+    LabelFile().save(
+        filename=out_file,
+        shapes=shapes,
+        imagePath=imagePath,
+        imageHeight=height,
+        imageWidth=width,
+        imageData=label_file.imageData if store_data else None,
+        otherData=label_file.otherData,
+        flags=label_file.flags,
+        check_image_size=False,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert label files between JSON (%s) and binary (%s)."
+        % (LabelFile.suffix, LabelFile.binary_suffix)
+    )
+    parser.add_argument("label_files", nargs="+")
+    parser.add_argument(
+        "--to",
+        choices=["json", "lbz"],
+        default="lbz",
+        help="output format",
+    )
+    parser.add_argument(
+        "--no-image-data",
+        action="store_true",
+        help="do not embed image bytes, keep only imagePath",
+    )
+    args = parser.parse_args()
+
+    suffix = LabelFile.suffix if args.to == "json" else LabelFile.binary_suffix
+    for in_file in args.label_files:
+        out_file = osp.splitext(in_file)[0] + suffix
+        if out_file == in_file:
+            logger.info("Skipping {}, already {}".format(in_file, args.to))
+            continue
+        convert(in_file, out_file, store_data=not args.no_image_data)
+        logger.info("Converted {} to {}".format(in_file, out_file))
+
+
+if __name__ == "__main__":
+    main()
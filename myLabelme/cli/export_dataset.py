@@ -0,0 +1,245 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import os.path as osp
+import time
+
+import imgviz
+import PIL.Image
+
+from .. import utils
+from ..label_file import LabelFile
+from ..logger import logger
+
+LAYOUTS = {
+    # key=format, value=list of (output, path relative to output directory)
+    "png": [
+        ("img", "{name}/img.png"),
+        ("label", "{name}/label.png"),
+        ("label_viz", "{name}/label_viz.png"),
+    ],
+    "voc": [
+        ("img", "JPEGImages/{name}.jpg"),
+        ("label", "SegmentationClass/{name}.png"),
+        ("label_viz", "SegmentationClassVisualization/{name}.jpg"),
+    ],
+}
+
+# Set in each worker process by _init_worker.
+_label_name_to_value = None
+_label_names = None
+
+
+def find_label_files(inputs):
+    """Return label files in directories or matching glob patterns."""
+    label_files = set()
+    for pattern in inputs:
+        if osp.isdir(pattern):
+            for dirpath, _, filenames in os.walk(pattern):
+                for filename in filenames:
+                    if LabelFile.is_label_file(filename):
+                        label_files.add(osp.normpath(osp.join(dirpath, filename)))
+        else:
+            for filename in glob.glob(pattern, recursive=True):
+                if LabelFile.is_label_file(filename):
+                    label_files.add(osp.normpath(filename))
+    return sorted(label_files)
+
+
+def read_label_info(label_file):
+    """Return (label names, image file or None) without decoding the image."""
+    try:
+        if osp.splitext(label_file)[1].lower() == LabelFile.binary_suffix:
+            label_file_data = LabelFile(label_file, check_image_size=False)
+            shapes = label_file_data.shapes
+            imagePath = label_file_data.imagePath
+        else:
+            with open(label_file) as f:
+                data = json.load(f)
+            shapes = data["shapes"]
+            imagePath = data["imagePath"]
+    except Exception as e:
+        logger.warning("Skipping {}: {}".format(label_file, e))
+        return None
+    image_file = osp.join(osp.dirname(label_file), imagePath)
+    if not osp.exists(image_file):
+        image_file = None
+    return sorted({shape["label"] for shape in shapes}), image_file
+
+
+def is_up_to_date(label_file, image_file, out_files):
+    try:
+        out_mtime = min(os.stat(out_file).st_mtime_ns for out_file in out_files)
+    except OSError:
+        return False
+    in_files = [label_file] if image_file is None else [label_file, image_file]
+    return out_mtime >= max(os.stat(in_file).st_mtime_ns for in_file in in_files)
+
+
+def _init_worker(label_name_to_value):
+    global _label_name_to_value, _label_names
+    _label_name_to_value = label_name_to_value
+    _label_names = [None] * (max(label_name_to_value.values()) + 1)
+    for name, value in label_name_to_value.items():
+        _label_names[value] = name
+
+
+def _save(filename, arr, kind):
+    if not osp.exists(osp.dirname(filename)):
+        os.makedirs(osp.dirname(filename), exist_ok=True)
+    if kind == "label":
+        utils.lblsave(filename, arr)
+        return
+    if filename.endswith(".jpg") and arr.ndim == 3 and arr.shape[2] == 4:
+        arr = arr[:, :, :3]
+    PIL.Image.fromarray(arr).save(filename)
+
+
+def _write_label_names(filename, label_names):
+    with open(filename, "w") as f:
+        f.write("".join(name + "\n" for name in label_names))
+
+
+def export_file(task):
+    """Export one label file in a worker, returning error message or None."""
+    label_file, out_files = task
+    try:
+        label_file_data = LabelFile(label_file, check_image_size=False)
+        img = utils.img_data_to_arr(label_file_data.imageData)
+        lbl, _ = utils.shapes_to_label(
+            img.shape, label_file_data.shapes, _label_name_to_value
+        )
+        outputs = {"img": img, "label": lbl}
+        if "label_viz" in out_files:
+            outputs["label_viz"] = imgviz.label2rgb(
+                lbl, imgviz.asgray(img), label_names=_label_names, loc="rb"
+            )
+        for kind, out_file in out_files.items():
+            _save(out_file, outputs[kind], kind)
+    except Exception as e:
+        return "{}: {}".format(type(e).__name__, e)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export label files to a segmentation dataset, "
+        "using all CPU cores."
+    )
+    parser.add_argument(
+        "inputs", nargs="+", help="directories or glob patterns of label files"
+    )
+    parser.add_argument("-o", "--out", required=True, help="output directory")
+    parser.add_argument("--format", choices=sorted(LAYOUTS), default="png")
+    parser.add_argument(
+        "--labels",
+        help="text file of label names, one per line, fixing label values",
+    )
+    parser.add_argument("--noviz", action="store_true", help="no visualization")
+    parser.add_argument(
+        "--force", action="store_true", help="export also up-to-date files"
+    )
+    parser.add_argument(
+        "--num-workers", type=int, default=os.cpu_count() or 1, help="processes"
+    )
+    args = parser.parse_args()
+
+    label_files = find_label_files(args.inputs)
+    logger.info("Found {} label files".format(len(label_files)))
+    if not label_files:
+        return
+    root = osp.commonpath([osp.abspath(osp.dirname(f)) for f in label_files])
+
+    t_start = time.time()
+    with multiprocessing.Pool(args.num_workers) as pool:
+        infos = pool.map(read_label_info, label_files, chunksize=64)
+    label_files = [f for f, info in zip(label_files, infos) if info is not None]
+    infos = [info for info in infos if info is not None]
+
+    if not osp.exists(args.out):
+        os.makedirs(args.out)
+    label_names_file = osp.join(args.out, "label_names.txt")
+    exported_names = []
+    if osp.exists(label_names_file):
+        with open(label_names_file) as f:
+            exported_names = [line.strip() for line in f if line.strip()]
+
+    # Label values must not depend on which files or workers see a label first,
+    # and values of exported labels are kept, so new labels are appended.
+    if args.labels:
+        with open(args.labels) as f:
+            label_names = [line.strip() for line in f if line.strip()]
+        if "_background_" in label_names:
+            label_names.remove("_background_")
+    else:
+        found = {name for names, _ in infos for name in names}
+        label_names = exported_names + sorted(found - set(exported_names))
+    label_name_to_value = {"_background_": 0}
+    for name in label_names:
+        label_name_to_value.setdefault(name, len(label_name_to_value))
+    label_names = list(label_name_to_value)
+
+    force = args.force
+    values_changed = label_names[: len(exported_names)] != exported_names
+    if values_changed:
+        # Written once all files are exported, so an interrupted or failed
+        # run is exported again next time.
+        logger.info("Label values changed, exporting all files")
+        force = True
+    else:
+        # Written first, so outputs never use values which are not saved.
+        _write_label_names(label_names_file, label_names)
+
+    tasks = []
+    skipped = 0
+    names_seen = set()
+    for label_file, (names, image_file) in zip(label_files, infos):
+        unknown = set(names) - label_name_to_value.keys()
+        if unknown:
+            logger.warning(
+                "Skipping {}: unknown labels {}".format(label_file, sorted(unknown))
+            )
+            continue
+        name = osp.splitext(osp.relpath(osp.abspath(label_file), root))[0]
+        if name in names_seen:
+            logger.warning("Skipping {}: same name as another file".format(label_file))
+            continue
+        names_seen.add(name)
+        out_files = {
+            kind: osp.join(args.out, path.format(name=name))
+            for kind, path in LAYOUTS[args.format]
+            if not (args.noviz and kind == "label_viz")
+        }
+        if not force and is_up_to_date(label_file, image_file, out_files.values()):
+            skipped += 1
+            continue
+        tasks.append((label_file, out_files))
+    logger.info("Exporting {} files, {} up to date".format(len(tasks), skipped))
+
+    n_failed = 0
+    with multiprocessing.Pool(
+        args.num_workers, initializer=_init_worker, initargs=(label_name_to_value,)
+    ) as pool:
+        # Workers write outputs themselves, so only small results come back.
+        results = pool.imap(export_file, tasks, chunksize=8)
+        for i, (task, error) in enumerate(zip(tasks, results)):
+            if error is not None:
+                n_failed += 1
+                logger.error("Failed exporting {}: {}".format(task[0], error))
+            if (i + 1) % 1000 == 0:
+                logger.info("Exported {}/{} files".format(i + 1, len(tasks)))
+
+    if values_changed and n_failed == 0:
+        _write_label_names(label_names_file, label_names)
+
+    logger.info(
+        "Exported {} files to {} in {:.1f} seconds, {} failed".format(
+            len(tasks) - n_failed, args.out, time.time() - t_start, n_failed
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
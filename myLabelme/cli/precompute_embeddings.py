@@ -0,0 +1,80 @@
+import argparse
+import os.path as osp
+import time
+
+import PIL.Image
+
+from ..config import get_config
+from ..dir_index import DirectoryIndex
+from ..logger import logger
+
+
+def main():
+    # Imported here, so importing the cli package does not load AI runtimes.
+    from .. import ai
+
+    config = get_config()["ai"]
+
+    parser = argparse.ArgumentParser(
+        description="Compute AI model embeddings of all images in a directory "
+        "ahead of time, so ai_polygon/ai_mask modes are interactive at once."
+    )
+    parser.add_argument("image_dir")
+    parser.add_argument(
+        "--model",
+        default=config["default"],
+        choices=[model.name for model in ai.MODELS],
+        help="AI model name",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=config["embedding_cache"]["dir"]
+        or osp.join(osp.expanduser("~"), ".cache", "myLabelme", "embeddings"),
+        help="embedding cache directory",
+    )
+    parser.add_argument(
+        "--max-disk",
+        type=int,
+        default=config["embedding_cache"]["max_disk"],
+        help="embedding cache size in MB",
+    )
+    parser.add_argument(
+        "--num-workers", type=int, default=config["precompute"]["num_workers"]
+    )
+    parser.add_argument(
+        "--num-threads",
+        type=int,
+        default=config["precompute"]["num_threads"],
+        help="intra-op threads per worker, 0 for onnxruntime default",
+    )
+    args = parser.parse_args()
+
+    extensions = tuple(ext for ext in PIL.Image.registered_extensions())
+    filenames = DirectoryIndex(args.image_dir, extensions).refresh()
+    logger.info("Found {} images in {}".format(len(filenames), args.image_dir))
+
+    model = [model for model in ai.MODELS if model.name == args.model][0]()
+    model.set_embedding_cache(
+        ai.EmbeddingCache(
+            cache_dir=args.cache_dir,
+            max_bytes=args.max_disk * 1024 * 1024,
+            ram_entries=0,
+        )
+    )
+    precomputer = ai.EmbeddingPrecomputer(
+        model, num_workers=args.num_workers, num_threads=args.num_threads
+    )
+
+    t_start = time.time()
+    precomputer.precompute(filenames)
+    precomputer.wait()
+    precomputer.shutdown()
+    logger.info(
+        "Computed embeddings of {} images in {:.1f} seconds".format(
+            len(filenames), time.time() - t_start
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
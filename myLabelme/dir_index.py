@@ -0,0 +1,84 @@
+import os
+import os.path as osp
+import re
+
+import natsort
+
+from .logger import logger
+
+
+class DirectoryIndex(object):
+    """In-memory index of the image files under a root directory.
+
+    Listings are cached per directory together with the directory mtime.
+    `refresh` only stats directories and lists again the ones whose mtime
+    changed, since adding or removing an entry changes the mtime of its
+    parent. Searching runs against the sorted in-memory list.
+    """
+
+    def __init__(self, root, extensions):
+        self.root = root
+        self.extensions = tuple(extensions)
+        self._dirs = {}  # key=dirpath, value=(mtime_ns, files, subdirs)
+        self._files = None
+
+    def refresh(self):
+        """Update the index from the filesystem and return the sorted files."""
+        seen = set()
+        changed = self._scanDir(self.root, seen)
+        for dirpath in set(self._dirs) - seen:
+            del self._dirs[dirpath]
+            changed = True
+        if changed or self._files is None:
+            files = []
+            for _, dir_files, _ in self._dirs.values():
+                files.extend(dir_files)
+            self._files = natsort.os_sorted(files)
+        return self._files
+
+    def _scanDir(self, dirpath, seen):
+        try:
+            mtime = os.stat(dirpath).st_mtime_ns
+        except OSError:
+            return False
+        seen.add(dirpath)
+
+        changed = False
+        cached = self._dirs.get(dirpath)
+        if cached is not None and cached[0] == mtime:
+            subdirs = cached[2]
+        else:
+            files, subdirs = [], []
+            try:
+                with os.scandir(dirpath) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                subdirs.append(osp.join(dirpath, entry.name))
+                            elif entry.name.lower().endswith(self.extensions):
+                                path = osp.normpath(osp.join(dirpath, entry.name))
+                                files.append(path)
+                        except OSError:
+                            continue
+            except OSError as e:
+                logger.warning("Failed scanning directory {}: {}".format(dirpath, e))
+            self._dirs[dirpath] = (mtime, files, subdirs)
+            changed = True
+
+        for subdir in subdirs:
+            changed = self._scanDir(subdir, seen) or changed
+        return changed
+
+    def files(self):
+        """Return the sorted files, refreshing only if never scanned."""
+        if self._files is None:
+            return self.refresh()
+        return self._files
+
+    def search(self, pattern):
+        """Return the indexed files matching regex pattern."""
+        try:
+            regex = re.compile(pattern)
+        except re.error:
+            return self.files()
+        return [f for f in self.files() if regex.search(f)]
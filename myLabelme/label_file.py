@@ -1,9 +1,12 @@
 import base64
 import contextlib
+import functools
 import io
 import json
 import os.path as osp
+import zipfile
 
+import numpy as np
 import PIL.Image
 
 from . import PY2
@@ -33,39 +36,111 @@ class LabelFileError(Exception):
 
 class LabelFile(object):
     suffix = ".json"
+    # Zip container of a JSON header, typed arrays and the raw image bytes.
+    binary_suffix = ".lbz"
+    shape_keys = [
+        "label",
+        "points",
+        "group_id",
+        "shape_type",
+        "flags",
+        "description",
+        "mask",
+    ]
 
-    def __init__(self, filename=None):
+    def __init__(self, filename=None, check_image_size=True, load_image=True):
         self.shapes = []
         self.imagePath = None
         self.imageData = None
         if filename is not None:
-            self.load(filename)
+            self.load(
+                filename, check_image_size=check_image_size, load_image=load_image
+            )
         self.filename = filename
 
+    @property
+    def imageData(self):
+        # Binary label files read image bytes only when they are used.
+        if self._imageData is None and self._imageDataLoader is not None:
+            self._imageData = self._imageDataLoader()
+            self._imageDataLoader = None
+        return self._imageData
+
+    @imageData.setter
+    def imageData(self, value):
+        self._imageData = value
+        self._imageDataLoader = None
+
     @staticmethod
-    def load_image_file(filename):
+    def _open_image_file(filename):
         try:
-            image_pil = PIL.Image.open(filename)
+            with io.open(filename, "rb") as f:
+                data = f.read()
+            image_pil = PIL.Image.open(io.BytesIO(data))
         except IOError:
             logger.error("Failed opening image file: {}".format(filename))
-            return
+            return None, None, None
 
         # apply orientation to image according to exif
-        image_pil = utils.apply_exif_orientation(image_pil)
+        image_pil_oriented = utils.apply_exif_orientation(image_pil)
+        return data, image_pil, image_pil_oriented
+
+    @staticmethod
+    def load_image_file(filename):
+        data, image_pil, image_pil_oriented = LabelFile._open_image_file(filename)
+        if data is None:
+            return
+
+        ext = osp.splitext(filename)[1].lower()
+        if PY2 and QT4:
+            format = "PNG"
+        elif ext in [".jpg", ".jpeg"]:
+            format = "JPEG"
+        else:
+            format = "PNG"
+
+        # file bytes can be used as is, so avoid lossy re-encoding
+        if image_pil_oriented is image_pil and image_pil.format == format:
+            return data
 
         with io.BytesIO() as f:
-            ext = osp.splitext(filename)[1].lower()
-            if PY2 and QT4:
-                format = "PNG"
-            elif ext in [".jpg", ".jpeg"]:
-                format = "JPEG"
-            else:
-                format = "PNG"
-            image_pil.save(f, format=format)
+            image_pil_oriented.save(f, format=format)
             f.seek(0)
             return f.read()
 
-    def load(self, filename):
+    @staticmethod
+    def load_image_arr(filename):
+        """Decode image file once into RGB(A) array.
+
+        Returns (img_arr, imageData) or None. imageData is the file bytes
+        if they can be stored as is, otherwise None so that it is encoded
+        from img_arr only when needed.
+        """
+        data, image_pil, image_pil_oriented = LabelFile._open_image_file(filename)
+        if data is None:
+            return
+        try:
+            img_arr = utils.img_pil_to_arr(image_pil_oriented)
+        except (IOError, OSError):
+            logger.error("Failed decoding image file: {}".format(filename))
+            return
+
+        imageData = None
+        if image_pil_oriented is image_pil and image_pil.format in ["JPEG", "PNG"]:
+            imageData = data
+        return img_arr, imageData
+
+    def load(self, filename, check_image_size=True, load_image=True):
+        """Load label file.
+
+        check_image_size=False skips comparing imageHeight and imageWidth
+        with the image, for trusted files loaded in bulk. load_image=False
+        reads the image file only when imageData is first used.
+        """
+        if osp.splitext(filename)[1].lower() == self.binary_suffix:
+            self._loadBinary(filename)
+            return
+
         keys = [
             "version",
             "imageData",
@@ -75,34 +150,34 @@ class LabelFile(object):
             "imageHeight",
             "imageWidth",
         ]
-        shape_keys = [
-            "label",
-            "points",
-            "group_id",
-            "shape_type",
-            "flags",
-            "description",
-            "mask",
-        ]
+        shape_keys = self.shape_keys
         try:
             with open(filename, "r") as f:
                 data = json.load(f)
 
+            imageDataLoader = None
             if data["imageData"] is not None:
                 imageData = base64.b64decode(data["imageData"])
                 if PY2 and QT4:
                     imageData = utils.img_data_to_png_data(imageData)
+                if check_image_size:
+                    self._check_image_height_and_width(
+                        imageData, data.get("imageHeight"), data.get("imageWidth")
+                    )
             else:
                 # relative path from label file to relative path from cwd
-                imagePath = osp.join(osp.dirname(filename), data["imagePath"])
-                imageData = self.load_image_file(imagePath)
+                imageDataLoader = functools.partial(
+                    self._load_checked_image_file,
+                    osp.join(osp.dirname(filename), data["imagePath"]),
+                    (data.get("imageHeight"), data.get("imageWidth"))
+                    if check_image_size
+                    else None,
+                )
+                imageData = None
+                if load_image:
+                    imageData, imageDataLoader = imageDataLoader(), None
             flags = data.get("flags") or {}
             imagePath = data["imagePath"]
-            self._check_image_height_and_width(
-                base64.b64encode(imageData).decode("utf-8"),
-                data.get("imageHeight"),
-                data.get("imageWidth"),
-            )
             shapes = [
                 dict(
                     label=s["label"],
@@ -129,24 +204,145 @@ class LabelFile(object):
         self.shapes = shapes
         self.imagePath = imagePath
         self.imageData = imageData
+        self._imageDataLoader = imageDataLoader
         self.filename = filename
         self.otherData = otherData
 
+    @classmethod
+    def _load_checked_image_file(cls, filename, image_size=None):
+        try:
+            imageData = cls.load_image_file(filename)
+            if image_size is not None:
+                cls._check_image_height_and_width(imageData, *image_size)
+        except Exception as e:
+            raise LabelFileError(e)
+        return imageData
+
+    def _loadBinary(self, filename):
+        try:
+            with zipfile.ZipFile(filename) as zf:
+                data = json.loads(zf.read("header.json").decode("utf-8"))
+                points = np.load(io.BytesIO(zf.read("points.npy")))
+                masks = np.load(io.BytesIO(zf.read("masks.npy")))
+                has_image = "image" in zf.namelist()
+
+            shapes = []
+            offset = 0
+            for s in data.pop("shapes"):
+                count = s.pop("num_points")
+                mask = s["mask"]
+                if mask is not None:
+                    (height, width), start, end = mask
+                    mask = np.unpackbits(masks[start:end], count=height * width)
+                    mask = mask.reshape(height, width).astype(bool)
+                shapes.append(
+                    dict(
+                        label=s["label"],
+                        points=points[offset : offset + count].tolist(),
+                        shape_type=s.get("shape_type", "polygon"),
+                        flags=s.get("flags", {}),
+                        description=s.get("description"),
+                        group_id=s.get("group_id"),
+                        mask=mask,
+                        other_data={
+                            k: v for k, v in s.items() if k not in self.shape_keys
+                        },
+                    )
+                )
+                offset += count
+
+            if has_image:
+                imageDataLoader = functools.partial(
+                    self._readBinaryMember, filename, "image"
+                )
+            else:
+                # relative path from label file to relative path from cwd
+                imagePath = osp.join(osp.dirname(filename), data["imagePath"])
+                imageDataLoader = functools.partial(self.load_image_file, imagePath)
+        except Exception as e:
+            raise LabelFileError(e)
+
+        # Only replace data after everything is loaded.
+        self.flags = data.pop("flags") or {}
+        self.shapes = shapes
+        self.imagePath = data.pop("imagePath")
+        self.imageData = None
+        self._imageDataLoader = imageDataLoader
+        self.filename = filename
+        for key in ["version", "imageHeight", "imageWidth"]:
+            data.pop(key, None)
+        self.otherData = data
+
+    @staticmethod
+    def _readBinaryMember(filename, name):
+        with zipfile.ZipFile(filename) as zf:
+            return zf.read(name)
+
+    @staticmethod
+    def _saveBinary(filename, data, imageData):
+        points = []
+        masks = []
+        mask_bytes = 0
+        shapes = []
+        for shape in data["shapes"]:
+            shape = dict(shape)
+            shape_points = np.asarray(shape.pop("points"), dtype=np.float64)
+            points.append(shape_points.reshape(-1, 2))
+            shape["num_points"] = len(points[-1])
+            mask = shape.pop("mask", None)
+            if isinstance(mask, str):
+                mask = utils.img_b64_to_arr(mask)
+            if mask is not None:
+                mask = np.asarray(mask, dtype=bool)
+                packed = np.packbits(mask.ravel())
+                masks.append(packed)
+                shape["mask"] = [mask.shape, mask_bytes, mask_bytes + packed.size]
+                mask_bytes += packed.size
+            else:
+                shape["mask"] = None
+            shapes.append(shape)
+        header = dict(data, shapes=shapes)
+        header.pop("imageData", None)
+
+        def npy(arr):
+            with io.BytesIO() as f:
+                np.save(f, arr)
+                return f.getvalue()
+
+        with zipfile.ZipFile(filename, "w") as zf:
+            zf.writestr(
+                "header.json",
+                json.dumps(header, ensure_ascii=False),
+                compress_type=zipfile.ZIP_DEFLATED,
+            )
+            zf.writestr(
+                "points.npy",
+                npy(np.concatenate(points) if points else np.zeros((0, 2))),
+            )
+            zf.writestr(
+                "masks.npy",
+                npy(np.concatenate(masks) if masks else np.zeros(0, np.uint8)),
+            )
+            if imageData is not None:
+                # Stored uncompressed, image formats are compressed already.
+                zf.writestr("image", imageData)
+
     @staticmethod
     def _check_image_height_and_width(imageData, imageHeight, imageWidth):
-        img_arr = utils.img_b64_to_arr(imageData)
-        if imageHeight is not None and img_arr.shape[0] != imageHeight:
+        # only image header is read, pixels are not decoded.
+        width, height = utils.img_data_to_pil(imageData).size
+        if imageHeight is not None and height != imageHeight:
             logger.error(
                 "imageHeight does not match with imageData or imagePath, "
                 "so getting imageHeight from actual image."
             )
-            imageHeight = img_arr.shape[0]
-        if imageWidth is not None and img_arr.shape[1] != imageWidth:
+            imageHeight = height
+        if imageWidth is not None and width != imageWidth:
             logger.error(
                 "imageWidth does not match with imageData or imagePath, "
                 "so getting imageWidth from actual image."
             )
-            imageWidth = img_arr.shape[1]
+            imageWidth = width
         return imageHeight, imageWidth
 
     def save(
@@ -159,12 +355,15 @@ class LabelFile(object):
         imageData=None,
         otherData=None,
         flags=None,
+        check_image_size=True,
     ):
+        imageBytes = imageData
         if imageData is not None:
+            if check_image_size:
+                imageHeight, imageWidth = self._check_image_height_and_width(
+                    imageData, imageHeight, imageWidth
+                )
             imageData = base64.b64encode(imageData).decode("utf-8")
-            imageHeight, imageWidth = self._check_image_height_and_width(
-                imageData, imageHeight, imageWidth
-            )
         if otherData is None:
             otherData = {}
         if flags is None:
@@ -182,6 +381,16 @@ class LabelFile(object):
             assert key not in data
             data[key] = value
         try:
+            if osp.splitext(filename)[1].lower() == self.binary_suffix:
+                self._saveBinary(filename, data, imageBytes)
+                self.filename = filename
+                return
+            data["shapes"] = [
+                dict(s, mask=utils.img_arr_to_b64(s["mask"]))
+                if isinstance(s.get("mask"), np.ndarray)
+                else s
+                for s in shapes
+            ]
             with open(filename, "w") as f:
                 json.dump(data, f, ensure_ascii=False, indent=2)
             self.filename = filename
@@ -190,7 +399,10 @@ class LabelFile(object):
 
     @staticmethod
     def is_label_file(filename):
-        return osp.splitext(filename)[1].lower() == LabelFile.suffix
+        return osp.splitext(filename)[1].lower() in [
+            LabelFile.suffix,
+            LabelFile.binary_suffix,
+        ]
     
     def loadYoloTxtFile(self, filename:str, legendFilePath:str=None):
         data = self.loadTxtFileData(filename)
@@ -199,8 +411,9 @@ class LabelFile(object):
         self.flags = None
         
     def getImageShapes(self):
-        imgArr = utils.img_data_to_arr(self.imageData)
-        return imgArr.shape[:2]
+        ## only image header is read.
+        width, height = utils.img_data_to_pil(self.imageData).size
+        return height, width
 
     def loadTxtFileData(self, filename):
         with open(filename, "r") as f:
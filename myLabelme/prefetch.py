@@ -0,0 +1,96 @@
+import concurrent.futures
+import threading
+
+from . import utils
+from .label_file import LabelFile
+from .logger import logger
+
+
+class ImagePrefetcher(object):
+    """Decode images of neighbouring files in background threads.
+
+    Entries are (imageArr, imageData, QImage) tuples keyed by filename,
+    where QImage shares the imageArr buffer. Only the files passed to the
+    last `prefetch` call are kept, and scheduling stops once the decoded
+    entries exceed `max_bytes`.
+    """
+
+    def __init__(self, num_workers=2, max_bytes=512 * 1024 * 1024):
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, num_workers),
+            thread_name_prefix="prefetch",
+        )
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._futures = {}  # key=filename, value=Future
+
+    @staticmethod
+    def decode(filename):
+        loaded = LabelFile.load_image_arr(filename)
+        if loaded is None:
+            return None
+        imageArr, imageData = loaded
+        return imageArr, imageData, utils.img_arr_to_qimage(imageArr)
+
+    @staticmethod
+    def _entrySize(entry):
+        if entry is None:
+            return 0
+        imageArr, imageData, _ = entry
+        return imageArr.nbytes + len(imageData or b"")
+
+    def _usedBytes(self):
+        used = 0
+        done = 0
+        for future in self._futures.values():
+            if future.done() and not future.cancelled() and not future.exception():
+                used += self._entrySize(future.result())
+                done += 1
+        # Assume in-flight entries are as big as the decoded ones.
+        pending = len(self._futures) - done
+        if done and pending:
+            used += used // done * pending
+        return used
+
+    def prefetch(self, filenames):
+        """Schedule decoding of filenames, ordered by priority.
+
+        Entries for files that are not in filenames are dropped.
+        """
+        with self._lock:
+            wanted = set(filenames)
+            for filename in list(self._futures):
+                if filename not in wanted:
+                    self._futures.pop(filename).cancel()
+
+            for filename in filenames:
+                if filename in self._futures:
+                    continue
+                if self._usedBytes() >= self._max_bytes:
+                    logger.debug("Prefetch memory budget is reached.")
+                    break
+                self._futures[filename] = self._executor.submit(
+                    self.decode, filename
+                )
+
+    def take(self, filename):
+        """Return the (imageArr, imageData, QImage) entry for filename or None.
+
+        Waits for the entry if it is still being decoded.
+        """
+        with self._lock:
+            future = self._futures.get(filename)
+        if future is None or future.cancelled():
+            return None
+        try:
+            return future.result()
+        except Exception as e:
+            logger.warning("Failed prefetching image {}: {}".format(filename, e))
+            return None
+
+    def clear(self):
+        """Cancel pending decodes and drop all entries."""
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
+            self._futures = {}
@@ -9,9 +9,6 @@ from qtpy import QtGui
 from . import utils
 from .logger import logger
 
-# TODO(unknown):
-# - [opt] Store paths instead of creating new ones at each paint.
-
 
 class Shape(object):
     # Render handles as squares
@@ -49,6 +46,12 @@ class Shape(object):
     ):
         self.label = label
         self.group_id = group_id
+        self._pointsArray = None
+        self._path = None
+        self._boundingRect = None
+        self._paintPaths = None
+        self._maskPaint = None
+        self._pointsVersion = 0
         self.points = []
         self.point_labels = []
         self.shape_type = shape_type
@@ -90,6 +93,48 @@ class Shape(object):
         self.shape_type, self.points, self.point_labels = self._shape_raw
         self._shape_raw = None
 
+    @property
+    def mask(self):
+        return self._mask
+
+    @mask.setter
+    def mask(self, value):
+        self._mask = value
+        self._maskPaint = None
+
+    @property
+    def points(self):
+        return self._points
+
+    @points.setter
+    def points(self, value):
+        self._points = value
+        self._pointsChanged()
+
+    def _pointsChanged(self):
+        self._pointsVersion += 1
+        self._pointsArray = None
+        self._path = None
+        self._boundingRect = None
+        self._paintPaths = None
+
+    def __getstate__(self):
+        # Cached Qt paths cannot be copied, they are rebuilt on demand.
+        state = self.__dict__.copy()
+        state["_path"] = None
+        state["_boundingRect"] = None
+        state["_paintPaths"] = None
+        state["_maskPaint"] = None
+        return state
+
+    def pointsArray(self):
+        """Points as a cached (N, 2) float array, rebuilt after edits."""
+        if self._pointsArray is None or len(self._pointsArray) != len(self._points):
+            self._pointsArray = np.array(
+                [(p.x(), p.y()) for p in self._points], dtype=float
+            ).reshape(-1, 2)
+        return self._pointsArray
+
     @property
     def shape_type(self):
         return self._shape_type
@@ -110,6 +155,9 @@ class Shape(object):
         ]:
             raise ValueError("Unexpected shape_type: {}".format(value))
         self._shape_type = value
+        # Cached path is drawn for the shape type too.
+        self._path = None
+        self._boundingRect = None
 
     def close(self):
         self._closed = True
@@ -120,6 +168,21 @@ class Shape(object):
         else:
             self.points.append(point)
             self.point_labels.append(label)
+            self._pointsChanged()
+
+    def addPoints(self, points):
+        """Add (x, y) pairs at once, like calling addPoint for each."""
+        points = [QtCore.QPointF(x, y) for x, y in points]
+        if not points:
+            return
+        first = self.points[0] if self.points else points[0]
+        kept = [p for p in points if p != first]
+        if not self.points:
+            kept.insert(0, first)
+        if len(kept) < len(points):
+            self.close()
+        self.points = self.points + kept
+        self.point_labels = self.point_labels + [1] * len(kept)
 
     def canAddPoint(self):
         return self.shape_type in ["polygon", "linestrip"]
@@ -128,12 +191,14 @@ class Shape(object):
         if self.points:
             if self.point_labels:
                 self.point_labels.pop()
+            self._pointsChanged()
             return self.points.pop()
         return None
 
     def insertPoint(self, i, point, label=1):
         self.points.insert(i, point)
         self.point_labels.insert(i, label)
+        self._pointsChanged()
 
     def removePoint(self, i):
         if not self.canAddPoint():
@@ -161,6 +226,7 @@ class Shape(object):
 
         self.points.pop(i)
         self.point_labels.pop(i)
+        self._pointsChanged()
 
     def isClosed(self):
         return self._closed
@@ -184,73 +250,24 @@ class Shape(object):
         painter.setPen(pen)
 
         if self.mask is not None:
-            image_to_draw = np.zeros(self.mask.shape + (4,), dtype=np.uint8)
-            fill_color = (
-                self.select_fill_color.getRgb()
-                if self.selected
-                else self.fill_color.getRgb()
-            )
-            image_to_draw[self.mask] = fill_color
-            qimage = QtGui.QImage.fromData(utils.img_arr_to_data(image_to_draw))
+            fill_color = self.select_fill_color if self.selected else self.fill_color
+            qimage, line_path = self._getMaskPaint(fill_color)
             painter.drawImage(
                 int(round(self.points[0].x())),
                 int(round(self.points[0].y())),
                 qimage,
             )
-
-            line_path = QtGui.QPainterPath()
-            contours = skimage.measure.find_contours(np.pad(self.mask, pad_width=1))
-            for contour in contours:
-                contour += [self.points[0].y(), self.points[0].x()]
-                line_path.moveTo(contour[0, 1], contour[0, 0])
-                for point in contour[1:]:
-                    line_path.lineTo(point[1], point[0])
+            painter.save()
+            painter.translate(self.points[0])
             painter.drawPath(line_path)
+            painter.restore()
 
         if self.points:
-            line_path = QtGui.QPainterPath()
-            vrtx_path = QtGui.QPainterPath()
-            negative_vrtx_path = QtGui.QPainterPath()
-
-            if self.shape_type in ["rectangle", "mask"]:
-                assert len(self.points) in [1, 2]
-                if len(self.points) == 2:
-                    rectangle = self.getRectFromLine(*self.points)
-                    line_path.addRect(rectangle)
-                if self.shape_type == "rectangle":
-                    for i in range(len(self.points)):
-                        self.drawVertex(vrtx_path, i)
-            elif self.shape_type == "circle":
-                assert len(self.points) in [1, 2]
-                if len(self.points) == 2:
-                    rectangle = self.getCircleRectFromLine(self.points)
-                    line_path.addEllipse(rectangle)
-                for i in range(len(self.points)):
-                    self.drawVertex(vrtx_path, i)
-            elif self.shape_type == "linestrip":
-                line_path.moveTo(self.points[0])
-                for i, p in enumerate(self.points):
-                    line_path.lineTo(p)
-                    self.drawVertex(vrtx_path, i)
-            elif self.shape_type == "points":
-                assert len(self.points) == len(self.point_labels)
-                for i, point_label in enumerate(self.point_labels):
-                    if point_label == 1:
-                        self.drawVertex(vrtx_path, i)
-                    else:
-                        self.drawVertex(negative_vrtx_path, i)
+            line_path, vrtx_path, negative_vrtx_path = self._getPaintPaths()
+            if self._highlightIndex is not None:
+                self._vertex_fill_color = self.hvertex_fill_color
             else:
-                line_path.moveTo(self.points[0])
-                # Uncommenting the following line will draw 2 paths
-                # for the 1st vertex, and make it non-filled, which
-                # may be desirable.
-                # self.drawVertex(vrtx_path, 0)
-
-                for i, p in enumerate(self.points):
-                    line_path.lineTo(p)
-                    self.drawVertex(vrtx_path, i)
-                if self.isClosed():
-                    line_path.lineTo(self.points[0])
+                self._vertex_fill_color = self.vertex_fill_color
 
             painter.drawPath(line_path)
             if vrtx_path.length() > 0:
@@ -265,6 +282,109 @@ class Shape(object):
             painter.drawPath(negative_vrtx_path)
             painter.fillPath(negative_vrtx_path, QtGui.QColor(255, 0, 0, 255))
 
+    def _getMaskPaint(self, fill_color):
+        """Return cached (image, outline path) of the mask in fill_color.
+
+        The image wraps an RGBA buffer without copying and the outline is
+        relative to the top-left point. Both are rebuilt when a mask is
+        set and the image also when the color changes.
+        """
+        key = fill_color.rgba()
+        if self._maskPaint is not None and self._maskPaint[0] == key:
+            return self._maskPaint[1:3]
+
+        if self._maskPaint is not None:
+            outline = self._maskPaint[2]
+        else:
+            outline = QtGui.QPainterPath()
+            contours = skimage.measure.find_contours(np.pad(self.mask, pad_width=1))
+            for contour in contours:
+                outline.moveTo(contour[0, 1], contour[0, 0])
+                for point in contour[1:]:
+                    outline.lineTo(point[1], point[0])
+
+        r, g, b, a = fill_color.getRgb()
+        height, width = self.mask.shape
+        buffer = np.zeros((height, width, 4), dtype=np.uint8)
+        buffer[self.mask] = (r * a // 255, g * a // 255, b * a // 255, a)
+        qimage = QtGui.QImage(
+            buffer.data,
+            width,
+            height,
+            width * 4,
+            QtGui.QImage.Format_RGBA8888_Premultiplied,
+        )
+        # Keep buffer alive as long as the image that points to it.
+        self._maskPaint = (key, qimage, outline, buffer)
+        return qimage, outline
+
+    def _getPaintPaths(self):
+        """Return cached (line, vertex, negative vertex) paths for painting.
+
+        Paths are rebuilt when points change and when the scale, highlight
+        or closed state they were built for changes.
+        """
+        key = (
+            len(self.points),
+            self.shape_type,
+            self._closed,
+            self.scale,
+            self.point_size,
+            self.point_type,
+            self._highlightIndex,
+            self._highlightMode,
+        )
+        if self._paintPaths is not None and self._paintPaths[0] == key:
+            return self._paintPaths[1]
+
+        line_path = QtGui.QPainterPath()
+        vrtx_path = QtGui.QPainterPath()
+        negative_vrtx_path = QtGui.QPainterPath()
+
+        if self.shape_type in ["rectangle", "mask"]:
+            assert len(self.points) in [1, 2]
+            if len(self.points) == 2:
+                rectangle = self.getRectFromLine(*self.points)
+                line_path.addRect(rectangle)
+            if self.shape_type == "rectangle":
+                for i in range(len(self.points)):
+                    self.drawVertex(vrtx_path, i)
+        elif self.shape_type == "circle":
+            assert len(self.points) in [1, 2]
+            if len(self.points) == 2:
+                rectangle = self.getCircleRectFromLine(self.points)
+                line_path.addEllipse(rectangle)
+            for i in range(len(self.points)):
+                self.drawVertex(vrtx_path, i)
+        elif self.shape_type == "linestrip":
+            line_path.moveTo(self.points[0])
+            for i, p in enumerate(self.points):
+                line_path.lineTo(p)
+                self.drawVertex(vrtx_path, i)
+        elif self.shape_type == "points":
+            assert len(self.points) == len(self.point_labels)
+            for i, point_label in enumerate(self.point_labels):
+                if point_label == 1:
+                    self.drawVertex(vrtx_path, i)
+                else:
+                    self.drawVertex(negative_vrtx_path, i)
+        else:
+            line_path.moveTo(self.points[0])
+            # Uncommenting the following line will draw 2 paths
+            # for the 1st vertex, and make it non-filled, which
+            # may be desirable.
+            # self.drawVertex(vrtx_path, 0)
+
+            for i, p in enumerate(self.points):
+                line_path.lineTo(p)
+                self.drawVertex(vrtx_path, i)
+            if self.isClosed():
+                line_path.lineTo(self.points[0])
+
+        paths = (line_path, vrtx_path, negative_vrtx_path)
+        self._paintPaths = (key, paths)
+        return paths
+
     def drawVertex(self, path, i):
         d = self.point_size / self.scale
         shape = self.point_type
@@ -284,25 +404,18 @@ class Shape(object):
             assert False, "unsupported vertex shape"
 
     def nearestVertex(self, point, epsilon):
-        min_distance = float("inf")
-        min_i = None
-        for i, p in enumerate(self.points):
-            dist = utils.distance(p - point)
-            if dist <= epsilon and dist < min_distance:
-                min_distance = dist
-                min_i = i
-        return min_i
+        if not self.points:
+            return None
+        dists = utils.distances(self.pointsArray(), (point.x(), point.y()))
+        i = int(np.argmin(dists))
+        return i if dists[i] <= epsilon else None
 
     def nearestEdge(self, point, epsilon):
-        min_distance = float("inf")
-        post_i = None
-        for i in range(len(self.points)):
-            line = [self.points[i - 1], self.points[i]]
-            dist = utils.distancetoline(point, line)
-            if dist <= epsilon and dist < min_distance:
-                min_distance = dist
-                post_i = i
-        return post_i
+        if not self.points:
+            return None
+        dists = utils.distancestolines(self.pointsArray(), (point.x(), point.y()))
+        i = int(np.argmin(dists))
+        return i if dists[i] <= epsilon else None
 
     def containsPoint(self, point):
         if self.mask is not None:
@@ -330,6 +443,11 @@ class Shape(object):
         return rectangle
 
     def makePath(self):
+        if self._path is None or self._path[0] != len(self.points):
+            self._path = (len(self.points), self._makePath())
+        return self._path[1]
+
+    def _makePath(self):
         if self.shape_type in ["rectangle", "mask"]:
             path = QtGui.QPainterPath()
             if len(self.points) == 2:
@@ -347,13 +465,17 @@ class Shape(object):
         return path
 
     def boundingRect(self):
-        return self.makePath().boundingRect()
+        path = self.makePath()
+        if self._boundingRect is None or self._boundingRect[0] is not path:
+            self._boundingRect = (path, path.boundingRect())
+        return self._boundingRect[1]
 
     def moveBy(self, offset):
         self.points = [p + offset for p in self.points]
 
     def moveVertexBy(self, i, offset):
         self.points[i] = self.points[i] + offset
+        self._pointsChanged()
 
     def highlightVertex(self, i, action):
         """Highlight a vertex appropriately based on the current action
@@ -373,6 +495,59 @@ class Shape(object):
     def copy(self):
         return copy.deepcopy(self)
 
+    # Attributes which are not part of the annotation, see `sameState`.
+    _transient_attrs = {
+        "_points",
+        "_pointsArray",
+        "_path",
+        "_boundingRect",
+        "_paintPaths",
+        "_maskPaint",
+        "selected",
+        "_highlightIndex",
+        "_highlightMode",
+        "_highlightSettings",
+    }
+
+    def snapshot(self):
+        """Copy for undo history.
+
+        Unlike `copy`, the mask and colors are shared, as they are replaced
+        rather than modified in place; only lists and dicts are copied.
+        """
+        shape = type(self).__new__(type(self))
+        shape.__dict__ = self.__getstate__()
+        shape._points = list(self._points)
+        shape.point_labels = list(self.point_labels)
+        shape._points_raw = list(self._points_raw)
+        shape.flags = copy.copy(self.flags)
+        shape.other_data = copy.copy(self.other_data)
+        shape.selected = False
+        shape._highlightIndex = None
+        return shape
+
+    def sameState(self, snapshot):
+        """Return True if shape was not changed since snapshot was taken."""
+        if self._pointsVersion != snapshot._pointsVersion:
+            return False
+        if self.__dict__.keys() != snapshot.__dict__.keys():
+            return False
+        for key, value in self.__dict__.items():
+            if key in self._transient_attrs:
+                continue
+            other = snapshot.__dict__[key]
+            if value is other:
+                continue
+            if isinstance(value, np.ndarray) or isinstance(other, np.ndarray):
+                return False
+            if type(value) is not type(other) or value != other:
+                return False
+        return True
+
+    def nbytes(self):
+        """Rough memory size of shape, masks excluded."""
+        return 512 + 64 * len(self._points)
+
     def __len__(self):
         return len(self.points)
 
@@ -381,3 +556,4 @@ class Shape(object):
 
     def __setitem__(self, key, value):
         self.points[key] = value
+        self._pointsChanged()
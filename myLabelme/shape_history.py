@@ -0,0 +1,91 @@
+class ShapeHistory(object):
+    """Undo stack of shape lists which share unchanged shapes.
+
+    Each entry is a list of `Shape.snapshot` copies. A snapshot is taken
+    only for shapes which changed since the previous entry, others reuse
+    the snapshot of that entry, so an edit costs memory in proportion to
+    the changed shapes. Masks are shared by snapshots and counted once.
+    The oldest entries are dropped beyond `max_entries` or `max_bytes`,
+    keeping at least two so that the last edit can be undone.
+    """
+
+    def __init__(self, max_entries=12, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = []
+        self._snapshots = {}  # key=live shape, value=snapshot of it
+        self._refs = {}  # key=id(snapshot or mask), value=[object, count, nbytes]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getitem__(self, index):
+        return self._entries[index]
+
+    def clear(self):
+        self.nbytes = 0
+        self._entries = []
+        self._snapshots = {}
+        self._refs = {}
+
+    def _ref(self, obj, nbytes, count):
+        ref = self._refs.get(id(obj))
+        if ref is None:
+            ref = self._refs[id(obj)] = [obj, 0, nbytes]
+            self.nbytes += nbytes
+        ref[1] += count
+        if ref[1] == 0:
+            del self._refs[id(obj)]
+            self.nbytes -= ref[2]
+
+    def _refEntry(self, entry, count):
+        for snapshot in entry:
+            self._ref(snapshot, snapshot.nbytes(), count)
+            if snapshot.mask is not None:
+                self._ref(snapshot.mask, snapshot.mask.nbytes, count)
+
+    def push(self, shapes):
+        """Add state of shapes on top, taking snapshots of changed shapes."""
+        snapshots = {}
+        entry = []
+        for shape in shapes:
+            snapshot = self._snapshots.get(shape)
+            if snapshot is None or not shape.sameState(snapshot):
+                snapshot = shape.snapshot()
+            snapshots[shape] = snapshot
+            entry.append(snapshot)
+        self._snapshots = snapshots
+        self._entries.append(entry)
+        self._refEntry(entry, 1)
+        while len(self._entries) > 2 and (
+            len(self._entries) > self.max_entries or self.nbytes > self.max_bytes
+        ):
+            self._refEntry(self._entries.pop(0), -1)
+
+    def pop(self):
+        entry = self._entries.pop()
+        self._refEntry(entry, -1)
+        return entry
+
+    def restore(self, entry, shapes):
+        """Return live shapes of entry, reusing unchanged ones of shapes.
+
+        Only snapshots which differ from shapes are copied, so that history
+        entries are never modified by later edits.
+        """
+        live = {}
+        for shape in shapes:
+            snapshot = self._snapshots.get(shape)
+            if snapshot is not None and shape.sameState(snapshot):
+                live[id(snapshot)] = shape
+        restored = []
+        snapshots = {}
+        for snapshot in entry:
+            shape = live.pop(id(snapshot), None)
+            if shape is None:
+                shape = snapshot.snapshot()
+            snapshots[shape] = snapshot
+            restored.append(shape)
+        self._snapshots = snapshots
+        return restored
@@ -0,0 +1,135 @@
+import math
+
+
+class ShapeIndex(object):
+    """Uniform grid over shape bounding boxes for hit-testing.
+
+    Each shape is registered in the grid cells its bounding box overlaps,
+    together with a sequence number giving its z-order (later shapes are
+    painted on top). Shapes spanning more than `max_cells` cells are kept
+    in a separate list which is always checked. The owner calls `insert`,
+    `update` and `remove` whenever shape geometry changes.
+    """
+
+    def __init__(self, cell_size=64, max_cells=256):
+        self.cell_size = cell_size
+        self.max_cells = max_cells
+        self._cells = {}  # key=(cx, cy), value=set of shapes
+        self._large = set()
+        self._entries = {}  # key=shape, value=(seq, cell range)
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, shape):
+        return shape in self._entries
+
+    @staticmethod
+    def bounds(shape):
+        """Return (x1, y1, x2, y2) of shape or None if it has no points."""
+        points = shape.points
+        if not points:
+            return None
+        if shape.shape_type == "circle" and len(points) == 2:
+            c, p = points
+            r = math.hypot(c.x() - p.x(), c.y() - p.y())
+            return c.x() - r, c.y() - r, c.x() + r, c.y() + r
+        xs = [p.x() for p in points]
+        ys = [p.y() for p in points]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def _cellRange(self, x1, y1, x2, y2):
+        s = self.cell_size
+        return (
+            int(math.floor(x1 / s)),
+            int(math.floor(y1 / s)),
+            int(math.floor(x2 / s)),
+            int(math.floor(y2 / s)),
+        )
+
+    def clear(self):
+        self._cells = {}
+        self._large = set()
+        self._entries = {}
+        self._seq = 0
+
+    def rebuild(self, shapes):
+        """Index shapes, in z-order from bottom to top."""
+        self.clear()
+        for shape in shapes:
+            self.insert(shape)
+
+    def insert(self, shape, seq=None):
+        """Add shape on top of the indexed shapes."""
+        if shape in self._entries:
+            self.remove(shape)
+        if seq is None:
+            self._seq += 1
+            seq = self._seq
+        bounds = self.bounds(shape)
+        if bounds is None:
+            self._entries[shape] = (seq, None)
+            return
+        cells = self._cellRange(*bounds)
+        cx1, cy1, cx2, cy2 = cells
+        if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > self.max_cells:
+            self._large.add(shape)
+            self._entries[shape] = (seq, None)
+            return
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                members = self._cells.get((cx, cy))
+                if members is None:
+                    members = self._cells[(cx, cy)] = set()
+                members.add(shape)
+        self._entries[shape] = (seq, cells)
+
+    def remove(self, shape):
+        entry = self._entries.pop(shape, None)
+        if entry is None:
+            return
+        _, cells = entry
+        self._large.discard(shape)
+        if cells is None:
+            return
+        cx1, cy1, cx2, cy2 = cells
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                members = self._cells[(cx, cy)]
+                members.discard(shape)
+                if not members:
+                    del self._cells[(cx, cy)]
+
+    def update(self, shape):
+        """Re-index shape after its points changed, keeping its z-order.
+
+        Shapes which are not indexed, e.g. copies being dragged, are ignored.
+        """
+        entry = self._entries.get(shape)
+        if entry is None:
+            return
+        self.remove(shape)
+        self.insert(shape, seq=entry[0])
+
+    def sync(self, shapes):
+        """Rebuild if shapes were added or removed without notifying."""
+        if len(shapes) != len(self._entries):
+            self.rebuild(shapes)
+
+    def sorted(self, shapes):
+        """Return indexed shapes among shapes, in z-order from bottom to top."""
+        shapes = [shape for shape in shapes if shape in self._entries]
+        return sorted(shapes, key=lambda shape: self._entries[shape][0])
+
+    def candidates(self, point, radius=0):
+        """Return shapes whose bounds are within radius of point, topmost first."""
+        x, y = point.x(), point.y()
+        cx1, cy1, cx2, cy2 = self._cellRange(
+            x - radius, y - radius, x + radius, y + radius
+        )
+        found = set(self._large)
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                found.update(self._cells.get((cx, cy), ()))
+        return sorted(found, key=lambda shape: self._entries[shape][0], reverse=True)
@@ -0,0 +1,236 @@
+import collections
+import concurrent.futures
+import hashlib
+import io
+import math
+import os
+import os.path as osp
+import tempfile
+import threading
+
+import PIL.Image
+from qtpy import QtCore
+from qtpy import QtGui
+
+from . import utils
+from .logger import logger
+
+EXIF_ORIENTATION = 0x0112
+
+
+class TiledImage(QtCore.QObject):
+    """Huge image shown from a pyramid of tiles cached on disk.
+
+    Level 0 is the full resolution and each next level halves it, up to
+    the level that fits in one tile. The pyramid is built once in the
+    background, coarsest level first, and reused while the file is
+    unchanged. `draw` paints only the tiles in view at the level of detail
+    of the current scale; missing tiles are loaded by worker threads and
+    drawn from a coarser level meanwhile. `tileLoaded` is emitted when
+    more tiles are available.
+
+    Width, height, size, isNull and cacheKey follow QPixmap, so the canvas
+    can use it in place of a pixmap.
+    """
+
+    tileLoaded = QtCore.Signal()
+
+    def __init__(
+        self, filename, tile_size=512, cache_dir=None, num_workers=2, max_tiles=256
+    ):
+        super().__init__()
+        self.filename = filename
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self._width, self._height = self.imageSize(filename)
+        self.levels = 1
+        while max(self._width, self._height) > tile_size * 2 ** (self.levels - 1):
+            self.levels += 1
+
+        if cache_dir is None:
+            cache_dir = osp.join(osp.expanduser("~"), ".cache", "myLabelme", "tiles")
+        self.root = osp.join(cache_dir, self._digest())
+
+        self._lock = threading.Lock()
+        self._tiles = collections.OrderedDict()  # key=(level, tx, ty), value=QImage
+        self._pending = set()
+        self._closed = False
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, num_workers),
+            thread_name_prefix="tiles",
+        )
+        if not osp.exists(osp.join(self.root, "done")):
+            self._executor.submit(self._build)
+
+    @staticmethod
+    def imageSize(filename):
+        """Return (width, height) after EXIF orientation, reading the header."""
+        with PIL.Image.open(filename) as image:
+            width, height = image.size
+            if image.getexif().get(EXIF_ORIENTATION) in [5, 6, 7, 8]:
+                width, height = height, width
+        return width, height
+
+    @classmethod
+    def isLarge(cls, filename, min_pixels):
+        try:
+            width, height = cls.imageSize(filename)
+        except (IOError, OSError, SyntaxError):
+            return False
+        return width * height >= min_pixels
+
+    def _digest(self):
+        stat = os.stat(self.filename)
+        h = hashlib.blake2b(digest_size=16)
+        key = (osp.abspath(self.filename), stat.st_mtime_ns, stat.st_size)
+        h.update(str(key + (self.tile_size,)).encode())
+        return h.hexdigest()
+
+    def width(self):
+        return self._width
+
+    def height(self):
+        return self._height
+
+    def size(self):
+        return QtCore.QSize(self._width, self._height)
+
+    def isNull(self):
+        return False
+
+    def cacheKey(self):
+        return id(self)
+
+    def _tileFile(self, level, tx, ty):
+        return osp.join(self.root, str(level), "%d_%d.png" % (tx, ty))
+
+    def _build(self):
+        try:
+            logger.info("Building tile pyramid of {}".format(self.filename))
+            image = PIL.Image.open(self.filename)
+            image = utils.apply_exif_orientation(image)
+            if image.mode not in ["L", "RGB", "RGBA"]:
+                image = image.convert("RGBA" if "A" in image.mode else "RGB")
+            pyramid = [image]
+            for _ in range(1, self.levels):
+                pyramid.append(pyramid[-1].reduce(2))
+            # Coarse levels are small and let the whole image show up early.
+            for level in reversed(range(self.levels)):
+                self._writeLevel(level, pyramid[level])
+                if self._closed:
+                    return
+                pyramid[level] = None
+                self.tileLoaded.emit()
+            with io.open(osp.join(self.root, "done"), "w"):
+                pass
+            logger.info("Built tile pyramid of {}".format(self.filename))
+        except Exception as e:
+            logger.error("Failed building tiles of {}: {}".format(self.filename, e))
+
+    def _writeLevel(self, level, image):
+        level_dir = osp.join(self.root, str(level))
+        if not osp.exists(level_dir):
+            os.makedirs(level_dir)
+        s = self.tile_size
+        for ty in range(int(math.ceil(image.height / s))):
+            if self._closed:
+                return
+            for tx in range(int(math.ceil(image.width / s))):
+                tile_file = self._tileFile(level, tx, ty)
+                if osp.exists(tile_file):
+                    continue
+                x2 = min((tx + 1) * s, image.width)
+                y2 = min((ty + 1) * s, image.height)
+                tile = image.crop((tx * s, ty * s, x2, y2))
+                # Write to temp file first so readers never see partial tiles.
+                fd, tmp = tempfile.mkstemp(suffix=".png.tmp", dir=level_dir)
+                with os.fdopen(fd, "wb") as f:
+                    tile.save(f, format="PNG", compress_level=1)
+                os.replace(tmp, tile_file)
+
+    def _load(self, key):
+        image = QtGui.QImage(self._tileFile(*key))
+        with self._lock:
+            self._pending.discard(key)
+            if image.isNull():
+                return
+            self._tiles[key] = image
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+        self.tileLoaded.emit()
+
+    def tile(self, level, tx, ty, load=True):
+        """Return cached tile image or None, loading it in background."""
+        key = (level, tx, ty)
+        with self._lock:
+            image = self._tiles.get(key)
+            if image is not None:
+                self._tiles.move_to_end(key)
+                return image
+            if not load or key in self._pending or self._closed:
+                return None
+            if not osp.exists(self._tileFile(*key)):
+                return None  # not built yet, tileLoaded is emitted once it is
+            self._pending.add(key)
+        self._executor.submit(self._load, key)
+        return None
+
+    def levelFor(self, scale):
+        """Return the coarsest level with at least one pixel per screen pixel."""
+        if scale <= 0:
+            return self.levels - 1
+        level = int(math.floor(math.log2(1.0 / scale))) if scale < 1 else 0
+        return max(0, min(self.levels - 1, level))
+
+    def draw(self, painter, rect, scale):
+        """Paint tiles covering rect, given in full resolution coordinates."""
+        self.tile(self.levels - 1, 0, 0)  # overview shown while loading
+        level = self.levelFor(scale)
+        span = self.tile_size * 2**level
+        tx1 = max(0, int(rect.left() // span))
+        ty1 = max(0, int(rect.top() // span))
+        tx2 = min(int(math.ceil(self._width / span)) - 1, int(rect.right() // span))
+        ty2 = min(int(math.ceil(self._height / span)) - 1, int(rect.bottom() // span))
+        for ty in range(ty1, ty2 + 1):
+            for tx in range(tx1, tx2 + 1):
+                self._drawTile(painter, level, tx, ty)
+
+    def _drawTile(self, painter, level, tx, ty):
+        image = self.tile(level, tx, ty)
+        if image is not None:
+            factor = 2**level
+            target = QtCore.QRectF(
+                tx * self.tile_size * factor,
+                ty * self.tile_size * factor,
+                image.width() * factor,
+                image.height() * factor,
+            )
+            painter.drawImage(target, image)
+            return
+        # Draw the part of a cached coarser tile until this one is loaded.
+        for coarse in range(level + 1, self.levels):
+            shift = coarse - level
+            image = self.tile(coarse, tx >> shift, ty >> shift, load=False)
+            if image is None:
+                continue
+            factor = 2**level
+            s = self.tile_size
+            cx = (tx * s - (tx >> shift << shift) * s) / 2**shift
+            cy = (ty * s - (ty >> shift << shift) * s) / 2**shift
+            source = QtCore.QRectF(cx, cy, s / 2**shift, s / 2**shift).intersected(
+                QtCore.QRectF(0, 0, image.width(), image.height())
+            )
+            target = QtCore.QRectF(
+                tx * s * factor,
+                ty * s * factor,
+                source.width() * 2**coarse,
+                source.height() * 2**coarse,
+            )
+            painter.drawImage(target, image, source)
+            return
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            self._tiles.clear()
+        self._executor.shutdown(wait=False)
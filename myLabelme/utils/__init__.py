@@ -11,6 +11,8 @@ from .image import img_data_to_pil
 from .image import img_data_to_png_data
 from .image import img_pil_to_data
 from .image import img_qt_to_arr
+from .image import img_pil_to_arr
+from .image import img_arr_to_qimage
 
 from .shape import labelme_shapes_to_label
 from .shape import masks_to_bboxes
@@ -26,4 +28,6 @@ from .qt import labelValidator
 from .qt import struct
 from .qt import distance
 from .qt import distancetoline
+from .qt import distances
+from .qt import distancestolines
 from .qt import fmtShortcut
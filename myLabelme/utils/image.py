@@ -8,6 +8,7 @@ import numpy as np
 import PIL.ExifTags
 import PIL.Image
 import PIL.ImageOps
+from qtpy import QtGui
 
 
 def img_data_to_pil(img_data):
@@ -59,6 +60,33 @@ def img_data_to_png_data(img_data):
             return f.read()
 
 
+def img_pil_to_arr(img_pil):
+    if img_pil.mode not in ["RGB", "RGBA"]:
+        if img_pil.mode in ["LA", "PA"] or "transparency" in img_pil.info:
+            img_pil = img_pil.convert("RGBA")
+        else:
+            img_pil = img_pil.convert("RGB")
+    img_arr = np.asarray(img_pil)
+    return img_arr
+
+
+def img_arr_to_qimage(img_arr):
+    img_arr = np.ascontiguousarray(img_arr)
+    height, width = img_arr.shape[:2]
+    if img_arr.ndim == 2:
+        format = QtGui.QImage.Format_Grayscale8
+    elif img_arr.shape[2] == 3:
+        format = QtGui.QImage.Format_RGB888
+    elif img_arr.shape[2] == 4:
+        format = QtGui.QImage.Format_RGBA8888
+    else:
+        raise ValueError("Unsupported image shape: {}".format(img_arr.shape))
+    # QImage does not copy the buffer, so keep img_arr alive with it.
+    img_qt = QtGui.QImage(img_arr.data, width, height, img_arr.strides[0], format)
+    img_qt.ndarray = img_arr
+    return img_qt
+
+
 def img_qt_to_arr(img_qt):
     w, h, d = img_qt.size().width(), img_qt.size().height(), img_qt.depth()
     bytes_ = img_qt.bits().asstring(w * h * d // 8)
@@ -96,6 +96,42 @@ def distancetoline(point, line):
     return np.linalg.norm(np.cross(p2 - p1, p1 - p3)) / np.linalg.norm(p2 - p1)
 
 
+def distances(points, point):
+    """Distances from point to each row of an (N, 2) points array."""
+    x = points[:, 0] - point[0]
+    y = points[:, 1] - point[1]
+    return np.sqrt(x * x + y * y)
+
+
+def distancestolines(points, point):
+    """Distances from point to the edges (points[i - 1], points[i]).
+
+    Same as calling `distancetoline` per edge, in one pass over an (N, 2)
+    points array, with the same formulas so that ties are kept. The first
+    edge closes the polygon from the last point.
+    """
+    p1 = np.roll(points, 1, axis=0)
+    d = points - p1
+    v1 = point - p1  # p3 - p1
+    v2 = point - points  # p3 - p2
+    norm2 = (d * d).sum(axis=1)
+    dist1 = np.sqrt((v1 * v1).sum(axis=1))
+    dist2 = np.sqrt((v2 * v2).sum(axis=1))
+    cross = np.abs(d[:, 0] * v1[:, 1] - d[:, 1] * v1[:, 0])
+    line = np.divide(
+        cross, np.sqrt(norm2), out=np.zeros_like(cross), where=norm2 > 0
+    )
+    return np.where(
+        (v1 * d).sum(axis=1) < 0,
+        dist1,
+        np.where(
+            (v2 * d).sum(axis=1) > 0,
+            dist2,
+            np.where(norm2 == 0, dist1, line),
+        ),
+    )
+
+
 def fmtShortcut(text):
     mod, key = text.split("+", 1)
     return "<b>%s</b>+<b>%s</b>" % (mod, key)
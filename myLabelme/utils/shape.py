@@ -9,6 +9,7 @@ import PIL.Image
 import PIL.ImageDraw
 
 from ..logger import logger
+from .image import img_b64_to_arr
 
 
 def polygons_to_mask(img_shape, polygons, shape_type=None):
@@ -19,15 +20,60 @@ def polygons_to_mask(img_shape, polygons, shape_type=None):
 
 
 def shape_to_mask(img_shape, points, shape_type=None, line_width=10, point_size=5):
-    mask = np.zeros(img_shape[:2], dtype=np.uint8)
-    mask = PIL.Image.fromarray(mask)
-    draw = PIL.ImageDraw.Draw(mask)
+    mask = np.zeros(img_shape[:2], dtype=bool)
+    clipped = _shape_to_clipped_mask(
+        img_shape, points, shape_type, line_width=line_width, point_size=point_size
+    )
+    if clipped is not None:
+        (y1, x1, y2, x2), clipped_mask = clipped
+        mask[y1:y2, x1:x2] = clipped_mask
+    return mask
+
+
+def _shape_to_clipped_mask(
+    img_shape, points, shape_type=None, line_width=10, point_size=5
+):
+    """Rasterize shape within its bounding box clipped to the image.
+
+    Returns ((y1, x1, y2, x2), mask of that box) or None if the shape is
+    outside of the image. Drawing is offset by whole pixels, so the mask is
+    the same as the one drawn on the full image.
+    """
     xy = [tuple(point) for point in points]
     if shape_type == "circle":
         assert len(xy) == 2, "Shape of shape_type=circle must have 2 points"
         (cx, cy), (px, py) = xy
         d = math.sqrt((cx - px) ** 2 + (cy - py) ** 2)
-        draw.ellipse([cx - d, cy - d, cx + d, cy + d], outline=1, fill=1)
+        bounds = [cx - d, cy - d, cx + d, cy + d]
+    elif shape_type == "point":
+        assert len(xy) == 1, "Shape of shape_type=point must have 1 points"
+        cx, cy = xy[0]
+        r = point_size
+        bounds = [cx - r, cy - r, cx + r, cy + r]
+    else:
+        xs = [x for x, _ in xy]
+        ys = [y for _, y in xy]
+        bounds = [min(xs), min(ys), max(xs), max(ys)]
+    margin = 2
+    if shape_type in ["line", "linestrip"]:
+        margin += line_width
+    height, width = img_shape[:2]
+    x1 = max(0, int(math.floor(bounds[0])) - margin)
+    y1 = max(0, int(math.floor(bounds[1])) - margin)
+    x2 = min(width, int(math.ceil(bounds[2])) + margin + 1)
+    y2 = min(height, int(math.ceil(bounds[3])) + margin + 1)
+    if x1 >= x2 or y1 >= y2:
+        return None
+
+    mask = PIL.Image.new("L", (x2 - x1, y2 - y1), 0)
+    draw = PIL.ImageDraw.Draw(mask)
+    xy = [(x - x1, y - y1) for x, y in xy]
+    if shape_type == "circle":
+        draw.ellipse(
+            [bounds[0] - x1, bounds[1] - y1, bounds[2] - x1, bounds[3] - y1],
+            outline=1,
+            fill=1,
+        )
     elif shape_type == "rectangle":
         assert len(xy) == 2, "Shape of shape_type=rectangle must have 2 points"
         draw.rectangle(xy, outline=1, fill=1)
@@ -37,21 +83,37 @@ def shape_to_mask(img_shape, points, shape_type=None, line_width=10, point_size=
     elif shape_type == "linestrip":
         draw.line(xy=xy, fill=1, width=line_width)
     elif shape_type == "point":
-        assert len(xy) == 1, "Shape of shape_type=point must have 1 points"
-        cx, cy = xy[0]
-        r = point_size
-        draw.ellipse([cx - r, cy - r, cx + r, cy + r], outline=1, fill=1)
+        draw.ellipse(
+            [bounds[0] - x1, bounds[1] - y1, bounds[2] - x1, bounds[3] - y1],
+            outline=1,
+            fill=1,
+        )
     else:
         assert len(xy) > 2, "Polygon must have points more than 2"
         draw.polygon(xy=xy, outline=1, fill=1)
-    mask = np.array(mask, dtype=bool)
-    return mask
+    return (y1, x1, y2, x2), np.array(mask, dtype=bool)
+
+
+def _mask_shape_to_clipped_mask(img_shape, points, mask):
+    """Place mask of shape_type=mask at its top-left point, clipped to image."""
+    if isinstance(mask, str):
+        mask = img_b64_to_arr(mask)
+    mask = np.asarray(mask, dtype=bool)
+    x1, y1 = (int(v) for v in points[0])
+    height, width = img_shape[:2]
+    y2 = min(height, y1 + mask.shape[0])
+    x2 = min(width, x1 + mask.shape[1])
+    mask = mask[max(0, -y1) :, max(0, -x1) :]
+    y1, x1 = max(0, y1), max(0, x1)
+    if x1 >= x2 or y1 >= y2:
+        return None
+    return (y1, x1, y2, x2), mask[: y2 - y1, : x2 - x1]
 
 
 def shapes_to_label(img_shape, shapes, label_name_to_value):
     cls = np.zeros(img_shape[:2], dtype=np.int32)
     ins = np.zeros_like(cls)
-    instances = []
+    instances = {}  # key=(label, group_id), value=instance id
     for shape in shapes:
         points = shape["points"]
         label = shape["label"]
@@ -64,13 +126,20 @@ def shapes_to_label(img_shape, shapes, label_name_to_value):
         instance = (cls_name, group_id)
 
         if instance not in instances:
-            instances.append(instance)
-        ins_id = instances.index(instance) + 1
+            instances[instance] = len(instances) + 1
+        ins_id = instances[instance]
         cls_id = label_name_to_value[cls_name]
 
-        mask = shape_to_mask(img_shape[:2], points, shape_type)
-        cls[mask] = cls_id
-        ins[mask] = ins_id
+        # Only the bounding box of shape is drawn and written.
+        if shape_type == "mask":
+            clipped = _mask_shape_to_clipped_mask(img_shape, points, shape["mask"])
+        else:
+            clipped = _shape_to_clipped_mask(img_shape[:2], points, shape_type)
+        if clipped is None:
+            continue
+        (y1, x1, y2, x2), mask = clipped
+        cls[y1:y2, x1:x2][mask] = cls_id
+        ins[y1:y2, x1:x2][mask] = ins_id
 
     return cls, ins
 
@@ -1,6 +1,5 @@
 import PIL.Image
 import PIL.ImageEnhance
-from qtpy import QtGui
 from qtpy import QtWidgets
 from qtpy.QtCore import Qt
 
@@ -33,8 +32,7 @@ class BrightnessContrastDialog(QtWidgets.QDialog):
         img = PIL.ImageEnhance.Brightness(img).enhance(brightness)
         img = PIL.ImageEnhance.Contrast(img).enhance(contrast)
 
-        img_data = utils.img_pil_to_data(img)
-        qimage = QtGui.QImage.fromData(img_data)
+        qimage = utils.img_arr_to_qimage(utils.img_pil_to_arr(img))
         self.callback(qimage)
 
     def _create_slider(self):
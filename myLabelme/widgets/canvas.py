@@ -1,4 +1,3 @@
-import imgviz
 from qtpy import QtCore
 from qtpy import QtGui
 from qtpy import QtWidgets
@@ -8,6 +7,9 @@ from .. import utils
 from .. import QT5
 from ..logger import logger
 from ..shape import Shape
+from ..shape_history import ShapeHistory
+from ..shape_index import ShapeIndex
+from ..tiled_image import TiledImage
 
 # TODO(unknown):
 # - [maybe] Find optimal epsilon value.
@@ -30,6 +32,7 @@ class Canvas(QtWidgets.QWidget):
     shapeMoved = QtCore.Signal()
     drawingPolygon = QtCore.Signal(bool)
     vertexSelected = QtCore.Signal(bool)
+    aiModelChanged = QtCore.Signal()
 
     CREATE, EDIT = 0, 1
 
@@ -46,6 +49,8 @@ class Canvas(QtWidgets.QWidget):
                 "Unexpected value for double_click event: {}".format(self.double_click)
             )
         self.num_backups = kwargs.pop("num_backups", 10)
+        self.max_backup_bytes = kwargs.pop("max_backup_bytes", 256 * 1024 * 1024)
+        self._embedding_cache = kwargs.pop("embedding_cache", None)
         self._crosshair = kwargs.pop(
             "crosshair",
             {
@@ -62,8 +67,16 @@ class Canvas(QtWidgets.QWidget):
         super(Canvas, self).__init__(*args, **kwargs)
         # Initialise local state.
         self.mode = self.EDIT
+        self._shapeIndex = ShapeIndex()
+        # Image and shapes which are not being edited, cached at current scale.
+        self._layer = None
+        self._layerKey = None
+        self._layerVersion = 0
+        self._liveRect = QtCore.QRect()
         self.shapes = []
-        self.shapesBackups = []
+        self.shapesBackups = ShapeHistory(
+            max_entries=self.num_backups + 2, max_bytes=self.max_backup_bytes
+        )
         self.current = None
         self.selectedShapes = []  # save the selected shapes here
         self.selectedShapesCopy = []
@@ -101,6 +114,26 @@ class Canvas(QtWidgets.QWidget):
         self.setFocusPolicy(QtCore.Qt.WheelFocus)
 
         self._ai_model = None
+        self._image_arr = None
+        self._image_file = None
+        self._ai_preview = ai.PreviewDecoder()
+        self._ai_preview.resultReady.connect(self.update)
+        self._ai_preview_last = None
+
+    @property
+    def shapes(self):
+        return self._shapes
+
+    @shapes.setter
+    def shapes(self, value):
+        self._shapes = value
+        self._shapeIndex.rebuild(value)
+        self._layerVersion += 1
+
+    def invalidateLayer(self):
+        """Redraw cached shapes, e.g. after their colors or labels changed."""
+        self._layerVersion += 1
+        self.update()
 
     def fillDrawing(self):
         return self._fill_drawing
@@ -137,22 +170,51 @@ class Canvas(QtWidgets.QWidget):
         else:
             logger.debug("Initializing AI model: %r" % model.name)
             self._ai_model = model()
+            self._resetAiPreview()
+            if self._embedding_cache is not None:
+                self._ai_model.set_embedding_cache(self._embedding_cache)
+            self.aiModelChanged.emit()
 
         if self.pixmap is None:
             logger.warning("Pixmap is not set yet")
             return
 
-        self._ai_model.set_image(
-            image=utils.img_qt_to_arr(self.pixmap.toImage())
-        )
+        self._resetAiPreview()
+        self._setAiImage()
+
+    def _resetAiPreview(self):
+        self._ai_preview.reset()
+        self._ai_preview_last = None
+
+    @property
+    def aiModel(self):
+        return self._ai_model
+
+    def _getAiImage(self):
+        # Use decoded image pixels if given to avoid converting the pixmap.
+        if self._image_arr is not None:
+            return self._image_arr
+        return utils.img_qt_to_arr(self.pixmap.toImage())
+
+    def _setAiImage(self):
+        if isinstance(self.pixmap, TiledImage):
+            logger.warning("AI models are not supported on tiled images")
+            return
+        self._ai_model.set_image(image=self._getAiImage(), filename=self._image_file)
+
+    def _setPixmap(self, pixmap):
+        if self.pixmap is pixmap:
+            return
+        if isinstance(self.pixmap, TiledImage):
+            self.pixmap.tileLoaded.disconnect(self.invalidateLayer)
+            self.pixmap.close()
+        self.pixmap = pixmap
+        if isinstance(pixmap, TiledImage):
+            pixmap.tileLoaded.connect(self.invalidateLayer)
 
     def storeShapes(self):
-        shapesBackup = []
-        for shape in self.shapes:
-            shapesBackup.append(shape.copy())
-        if len(self.shapesBackups) > self.num_backups:
-            self.shapesBackups = self.shapesBackups[-self.num_backups - 1 :]
-        self.shapesBackups.append(shapesBackup)
+        self.invalidateLayer()
+        self.shapesBackups.push(self.shapes)
 
     @property
     def isShapeRestorable(self):
@@ -174,7 +236,7 @@ class Canvas(QtWidgets.QWidget):
         # The application will eventually call Canvas.loadShapes which will
         # push this right back onto the stack.
         shapesBackup = self.shapesBackups.pop()
-        self.shapes = shapesBackup
+        self.shapes = self.shapesBackups.restore(shapesBackup, self.shapes)
         self.selectedShapes = []
         for shape in self.shapes:
             shape.selected = False
@@ -203,7 +265,7 @@ class Canvas(QtWidgets.QWidget):
         self.mode = self.EDIT if value else self.CREATE
         if self.mode == self.EDIT:
             # CREATE -> EDIT
-            self.repaint()  # clear crosshair
+            self.update()  # clear crosshair
         else:
             # EDIT -> CREATE
             self.unHighlight()
@@ -248,7 +310,7 @@ class Canvas(QtWidgets.QWidget):
 
             self.overrideCursor(CURSOR_DRAW)
             if not self.current:
-                self.repaint()  # draw crosshair
+                self.update()  # draw crosshair
                 return
 
             if self.outOfPixmap(pos):
@@ -292,7 +354,7 @@ class Canvas(QtWidgets.QWidget):
                 self.line.point_labels = [1]
                 self.line.close()
             assert len(self.line.points) == len(self.line.point_labels)
-            self.repaint()
+            self.updateLive()
             self.current.highlightClear()
             return
 
@@ -301,23 +363,23 @@ class Canvas(QtWidgets.QWidget):
             if self.selectedShapesCopy and self.prevPoint:
                 self.overrideCursor(CURSOR_MOVE)
                 self.boundedMoveShapes(self.selectedShapesCopy, pos)
-                self.repaint()
+                self.updateLive()
             elif self.selectedShapes:
                 self.selectedShapesCopy = [s.copy() for s in self.selectedShapes]
-                self.repaint()
+                self.updateLive()
             return
 
         # Polygon/Vertex moving.
         if QtCore.Qt.LeftButton & ev.buttons():
             if self.selectedVertex():
                 self.boundedMoveVertex(pos)
-                self.repaint()
                 self.movingShape = True
+                self.updateLive()
             elif self.selectedShapes and self.prevPoint:
                 self.overrideCursor(CURSOR_MOVE)
                 self.boundedMoveShapes(self.selectedShapes, pos)
-                self.repaint()
                 self.movingShape = True
+                self.updateLive()
             return
 
         # Just hovering over the canvas, 2 possibilities:
@@ -325,7 +387,9 @@ class Canvas(QtWidgets.QWidget):
         # - Highlight vertex
         # Update shape/vertex fill and tooltip value accordingly.
         self.setToolTip(self.tr("Image"))
-        for shape in reversed([s for s in self.shapes if self.isVisible(s)]):
+        self._shapeIndex.sync(self.shapes)
+        candidates = self._shapeIndex.candidates(pos, self.epsilon / self.scale)
+        for shape in [s for s in candidates if self.isVisible(s)]:
             # Look for a nearby vertex to highlight. If that fails,
             # check if we happen to be inside a shape.
             index = shape.nearestVertex(pos, self.epsilon / self.scale)
@@ -381,6 +445,7 @@ class Canvas(QtWidgets.QWidget):
         if shape is None or index is None or point is None:
             return
         shape.insertPoint(index, point)
+        self._shapeIndex.update(shape)
         shape.highlightVertex(index, shape.MOVE_VERTEX)
         self.hShape = shape
         self.hVertex = index
@@ -393,6 +458,7 @@ class Canvas(QtWidgets.QWidget):
         if shape is None or index is None:
             return
         shape.removePoint(index)
+        self._shapeIndex.update(shape)
         shape.highlightClear()
         self.hShape = shape
         self.prevhVertex = None
@@ -429,7 +495,7 @@ class Canvas(QtWidgets.QWidget):
                             self.line.points[1],
                             label=self.line.point_labels[1],
                         )
-                        self.line.points[0] = self.current.points[-1]
+                        self.line[0] = self.current.points[-1]
                         self.line.point_labels[0] = self.current.point_labels[-1]
                         if ev.modifiers() & QtCore.Qt.ControlModifier:
                             self.finalise()
@@ -475,14 +541,14 @@ class Canvas(QtWidgets.QWidget):
                 group_mode = int(ev.modifiers()) == QtCore.Qt.ControlModifier
                 self.selectShapePoint(pos, multiple_selection_mode=group_mode)
                 self.prevPoint = pos
-                self.repaint()
+                self.update()
         elif ev.button() == QtCore.Qt.RightButton and self.editing():
             group_mode = int(ev.modifiers()) == QtCore.Qt.ControlModifier
             if not self.selectedShapes or (
                 self.hShape is not None and self.hShape not in self.selectedShapes
             ):
                 self.selectShapePoint(pos, multiple_selection_mode=group_mode)
-                self.repaint()
+                self.update()
             self.prevPoint = pos
 
     def mouseReleaseEvent(self, ev):
@@ -492,7 +558,7 @@ class Canvas(QtWidgets.QWidget):
             if not menu.exec_(self.mapToGlobal(ev.pos())) and self.selectedShapesCopy:
                 # Cancel the move by deleting the shadow copy.
                 self.selectedShapesCopy = []
-                self.repaint()
+                self.update()
         elif ev.button() == QtCore.Qt.LeftButton:
             if self.editing():
                 if (
@@ -518,13 +584,15 @@ class Canvas(QtWidgets.QWidget):
         if copy:
             for i, shape in enumerate(self.selectedShapesCopy):
                 self.shapes.append(shape)
+                self._shapeIndex.insert(shape)
                 self.selectedShapes[i].selected = False
                 self.selectedShapes[i] = shape
         else:
             for i, shape in enumerate(self.selectedShapesCopy):
                 self.selectedShapes[i].points = shape.points
+                self._shapeIndex.update(self.selectedShapes[i])
         self.selectedShapesCopy = []
-        self.repaint()
+        self.update()
         self.storeShapes()
         return True
 
@@ -562,7 +630,8 @@ class Canvas(QtWidgets.QWidget):
             index, shape = self.hVertex, self.hShape
             shape.highlightVertex(index, shape.MOVE_VERTEX)
         else:
-            for shape in reversed(self.shapes):
+            self._shapeIndex.sync(self.shapes)
+            for shape in self._shapeIndex.candidates(point):
                 if self.isVisible(shape) and shape.containsPoint(point):
                     self.setHiding()
                     if shape not in self.selectedShapes:
@@ -605,6 +674,7 @@ class Canvas(QtWidgets.QWidget):
         if self.outOfPixmap(pos):
             pos = self.intersectionPoint(point, pos)
         shape.moveVertexBy(index, pos - point)
+        self._shapeIndex.update(shape)
 
     def boundedMoveShapes(self, shapes, pos):
         if self.outOfPixmap(pos):
@@ -627,6 +697,7 @@ class Canvas(QtWidgets.QWidget):
         if dp:
             for shape in shapes:
                 shape.moveBy(dp)
+                self._shapeIndex.update(shape)
             self.prevPoint = pos
             return True
         return False
@@ -643,6 +714,7 @@ class Canvas(QtWidgets.QWidget):
         if self.selectedShapes:
             for shape in self.selectedShapes:
                 self.shapes.remove(shape)
+                self._shapeIndex.remove(shape)
                 deleted_shapes.append(shape)
             self.storeShapes()
             self.selectedShapes = []
@@ -659,6 +731,7 @@ class Canvas(QtWidgets.QWidget):
             self.selectedShapes.remove(shape)
         if shape in self.shapes:
             self.shapes.remove(shape)
+            self._shapeIndex.remove(shape)
         self.storeShapes()
         self.update()
 
@@ -683,17 +756,15 @@ class Canvas(QtWidgets.QWidget):
         if not self.pixmap:
             return super(Canvas, self).paintEvent(event)
 
+        layerRect, below, above, between = self._getLayer()
         p = self._painter
         p.begin(self)
+        p.drawPixmap(layerRect.topLeft(), below)
         p.setRenderHint(QtGui.QPainter.Antialiasing)
-        p.setRenderHint(QtGui.QPainter.HighQualityAntialiasing)
-        p.setRenderHint(QtGui.QPainter.SmoothPixmapTransform)
 
         p.scale(self.scale, self.scale)
         p.translate(self.offsetToCenter())
 
-        p.drawPixmap(0, 0, self.pixmap)
-
         # draw crosshair
         if (
             self._crosshair[self._createMode]
@@ -715,11 +786,30 @@ class Canvas(QtWidgets.QWidget):
                 self.height() - 1,
             )
 
+        # Shapes being selected or moved are drawn in their order with the
+        # shapes between them, under the layer of later shapes.
         Shape.scale = self.scale
-        for shape in self.shapes:
+        live = set(self._layerExcluded()).union(between)
+        for shape in self._shapeIndex.sorted(live):
             if (shape.selected or not self._hideBackround) and self.isVisible(shape):
                 shape.fill = shape.selected or shape == self.hShape
                 shape.paint(p)
+        if above is not None:
+            p.save()
+            p.resetTransform()
+            p.drawPixmap(layerRect.topLeft(), above)
+            p.restore()
+
+        # The hovered shape stays in the layer and is highlighted on top,
+        # so that hovering does not rebuild the layer.
+        if (
+            self.hShape is not None
+            and self.hShape not in live
+            and not self._hideBackround
+            and self.isVisible(self.hShape)
+        ):
+            self.hShape.fill = True
+            self.hShape.paint(p)
         if self.current:
             self.current.paint(p)
             assert len(self.line.points) == len(self.line.point_labels)
@@ -744,46 +834,192 @@ class Canvas(QtWidgets.QWidget):
             drawing_shape.addPoint(self.line[1])
             drawing_shape.fill = True
             drawing_shape.paint(p)
-        elif self.createMode == "ai_polygon" and self.current is not None:
+        elif (
+            self.createMode in ["ai_polygon", "ai_mask"]
+            and self.current is not None
+        ):
             drawing_shape = self.current.copy()
             drawing_shape.addPoint(
                 point=self.line.points[1],
                 label=self.line.point_labels[1],
             )
-            points = self._ai_model.predict_polygon_from_points(
-                points=[[point.x(), point.y()] for point in drawing_shape.points],
-                point_labels=drawing_shape.point_labels,
-            )
-            if len(points) > 2:
-                drawing_shape.setShapeRefined(
-                    shape_type="polygon",
-                    points=[QtCore.QPointF(point[0], point[1]) for point in points],
-                    point_labels=[1] * len(points),
-                )
+            # Decoded off-thread, so paint the last result until it is ready.
+            result = self._requestAiPreview(drawing_shape)
+            if result is not None and self._setAiShape(drawing_shape, result):
                 drawing_shape.fill = self.fillDrawing()
                 drawing_shape.selected = True
                 drawing_shape.paint(p)
-        elif self.createMode == "ai_mask" and self.current is not None:
-            drawing_shape = self.current.copy()
-            drawing_shape.addPoint(
-                point=self.line.points[1],
-                label=self.line.point_labels[1],
-            )
-            mask = self._ai_model.predict_mask_from_points(
-                points=[[point.x(), point.y()] for point in drawing_shape.points],
-                point_labels=drawing_shape.point_labels,
+
+        p.end()
+
+    def _requestAiPreview(self, shape):
+        key = ai.PreviewDecoder.key(
+            self.createMode,
+            [[point.x(), point.y()] for point in shape.points],
+            shape.point_labels,
+        )
+        result = self._ai_preview.get(key)
+        if result is None:
+            self._ai_preview.request(self._ai_model, key)
+            if self._ai_preview_last is not None:
+                mode, result = self._ai_preview_last
+                if mode != self.createMode:
+                    result = None
+        else:
+            self._ai_preview_last = (self.createMode, result)
+        return result
+
+    def _setAiShape(self, shape, result, force=False):
+        """Refine shape of prompt points by decoded result of PreviewDecoder."""
+        if self.createMode == "ai_polygon":
+            if len(result) <= 2 and not force:
+                return False
+            shape.setShapeRefined(
+                shape_type="polygon",
+                points=[QtCore.QPointF(point[0], point[1]) for point in result],
+                point_labels=[1] * len(result),
             )
-            y1, x1, y2, x2 = imgviz.instances.masks_to_bboxes([mask])[0].astype(int)
-            drawing_shape.setShapeRefined(
+        else:
+            (x1, y1, x2, y2), mask = result
+            shape.setShapeRefined(
                 shape_type="mask",
                 points=[QtCore.QPointF(x1, y1), QtCore.QPointF(x2, y2)],
                 point_labels=[1, 1],
-                mask=mask[y1 : y2 + 1, x1 : x2 + 1],
+                mask=mask,
             )
-            drawing_shape.selected = True
-            drawing_shape.paint(p)
+        return True
+
+    def _layerExcluded(self):
+        excluded = list(self.selectedShapes)
+        if self.movingShape and self.hShape is not None:
+            excluded.append(self.hShape)
+        return excluded
+
+    def _getLayer(self):
+        """Return (rect, below, above, between) of static shapes in view.
+
+        below is a pixmap of the image and the shapes before the first
+        selected or moved shape, above one of the shapes after the last
+        (None if there are none). between are the other shapes in between,
+        which are painted with the selected and moved ones to keep the
+        order of shapes. Rebuilt only when the view, scale, selection or
+        shapes changed.
+        """
+        rect = self.visibleRegion().boundingRect()
+        if rect.isEmpty():
+            rect = self.rect()
+        excluded = self._layerExcluded()
+        dpr = self.devicePixelRatioF()
+        key = (
+            rect,
+            dpr,
+            self.scale,
+            self.pixmap.cacheKey(),
+            self._hideBackround,
+            tuple(id(shape) for shape in excluded),
+            self._layerVersion,
+        )
+        if self._layer is not None and self._layerKey == key:
+            return (rect,) + self._layer
+
+        excluded = set(excluded)
+        first = last = None
+        for i, shape in enumerate(self.shapes):
+            if shape in excluded:
+                if first is None:
+                    first = i
+                last = i
+        if first is None:
+            first = last = len(self.shapes)
+        between = [s for s in self.shapes[first + 1 : last] if s not in excluded]
+
+        below = self._paintLayer(rect, dpr, self.shapes[:first], image=True)
+        above = None
+        if last + 1 < len(self.shapes) and not self._hideBackround:
+            above = self._paintLayer(rect, dpr, self.shapes[last + 1 :])
+
+        self._layer = (below, above, between)
+        self._layerKey = key
+        return (rect,) + self._layer
+
+    def _paintLayer(self, rect, dpr, shapes, image=False):
+        layer = QtGui.QPixmap(rect.size() * dpr)
+        layer.setDevicePixelRatio(dpr)
+        layer.fill(QtCore.Qt.transparent)
+        p = QtGui.QPainter(layer)
+        p.setRenderHint(QtGui.QPainter.Antialiasing)
+        p.setRenderHint(QtGui.QPainter.SmoothPixmapTransform)
+        p.translate(-rect.topLeft())
+        p.scale(self.scale, self.scale)
+        p.translate(self.offsetToCenter())
+        if image and isinstance(self.pixmap, TiledImage):
+            offset = self.offsetToCenter()
+            self.pixmap.draw(
+                p,
+                QtCore.QRectF(
+                    QtCore.QPointF(rect.topLeft()) / self.scale - offset,
+                    QtCore.QPointF(rect.bottomRight()) / self.scale - offset,
+                ),
+                self.scale,
+            )
+        elif image:
+            p.drawPixmap(0, 0, self.pixmap)
 
+        Shape.scale = self.scale
+        if not self._hideBackround:
+            for shape in shapes:
+                if shape.selected or not self.isVisible(shape):
+                    continue
+                shape.fill = False
+                if shape is self.hShape and self.hVertex is not None:
+                    # Keep the vertex highlight out of the cached layer.
+                    shape.highlightClear()
+                    shape.paint(p)
+                    shape.highlightVertex(self.hVertex, shape.MOVE_VERTEX)
+                else:
+                    shape.paint(p)
         p.end()
+        return layer
+
+    def updateLive(self):
+        """Schedule repaint of the area of shapes being drawn or moved.
+
+        Covers where the shapes are now and where they were painted last.
+        """
+        if self.drawing() and (
+            self._crosshair[self._createMode]
+            or self.createMode in ["ai_polygon", "ai_mask"]
+        ):
+            # Crosshair and AI previews are not bound to the shape points.
+            self.update()
+            return
+
+        shapes = self.selectedShapes + self.selectedShapesCopy
+        if self.hShape is not None:
+            shapes.append(self.hShape)
+        if self.current:
+            shapes += [self.current, self.line]
+        x1 = y1 = float("inf")
+        x2 = y2 = -float("inf")
+        for shape in shapes:
+            bounds = ShapeIndex.bounds(shape)
+            if bounds is None:
+                continue
+            x1, y1 = min(x1, bounds[0]), min(y1, bounds[1])
+            x2, y2 = max(x2, bounds[2]), max(y2, bounds[3])
+        if x1 > x2:
+            self.update()
+            return
+
+        # Leave room for highlighted vertices and the pen.
+        margin = 4 * Shape.point_size / self.scale + 2 / self.scale
+        offset = self.offsetToCenter()
+        rect = QtCore.QRectF(
+            (QtCore.QPointF(x1 - margin, y1 - margin) + offset) * self.scale,
+            (QtCore.QPointF(x2 + margin, y2 + margin) + offset) * self.scale,
+        ).toAlignedRect()
+        self.update(rect.united(self._liveRect))
+        self._liveRect = rect
 
     def transformPos(self, point):
         """Convert from widget-logical coordinates to painter-logical ones."""
@@ -804,35 +1040,22 @@ class Canvas(QtWidgets.QWidget):
 
     def finalise(self):
         assert self.current
-        if self.createMode == "ai_polygon":
-            # convert points to polygon by an AI model
-            assert self.current.shape_type == "points"
-            points = self._ai_model.predict_polygon_from_points(
-                points=[[point.x(), point.y()] for point in self.current.points],
-                point_labels=self.current.point_labels,
-            )
-            self.current.setShapeRefined(
-                points=[QtCore.QPointF(point[0], point[1]) for point in points],
-                point_labels=[1] * len(points),
-                shape_type="polygon",
-            )
-        elif self.createMode == "ai_mask":
-            # convert points to mask by an AI model
+        if self.createMode in ["ai_polygon", "ai_mask"]:
+            # convert points to polygon or mask by an AI model
             assert self.current.shape_type == "points"
-            mask = self._ai_model.predict_mask_from_points(
-                points=[[point.x(), point.y()] for point in self.current.points],
-                point_labels=self.current.point_labels,
-            )
-            y1, x1, y2, x2 = imgviz.instances.masks_to_bboxes([mask])[0].astype(int)
-            self.current.setShapeRefined(
-                shape_type="mask",
-                points=[QtCore.QPointF(x1, y1), QtCore.QPointF(x2, y2)],
-                point_labels=[1, 1],
-                mask=mask[y1 : y2 + 1, x1 : x2 + 1],
+            key = ai.PreviewDecoder.key(
+                self.createMode,
+                [[point.x(), point.y()] for point in self.current.points],
+                self.current.point_labels,
             )
+            result = self._ai_preview.get(key)
+            if result is None:
+                result = ai.PreviewDecoder.decode(self._ai_model, key)
+            self._setAiShape(self.current, result, force=True)
         self.current.close()
 
         self.shapes.append(self.current)
+        self._shapeIndex.insert(self.current)
         self.storeShapes()
         self.current = None
         self.setHiding(False)
@@ -943,8 +1166,8 @@ class Canvas(QtWidgets.QWidget):
     def moveByKeyboard(self, offset):
         if self.selectedShapes:
             self.boundedMoveShapes(self.selectedShapes, self.prevPoint + offset)
-            self.repaint()
             self.movingShape = True
+            self.updateLive()
 
     def keyPressEvent(self, ev):
         modifiers = ev.modifiers()
@@ -993,6 +1216,7 @@ class Canvas(QtWidgets.QWidget):
     def undoLastLine(self):
         assert self.shapes
         self.current = self.shapes.pop()
+        self._shapeIndex.remove(self.current)
         self.current.setOpen()
         self.current.restoreShapeRaw()
         if self.createMode in ["polygon", "linestrip"]:
@@ -1014,12 +1238,18 @@ class Canvas(QtWidgets.QWidget):
             self.drawingPolygon.emit(False)
         self.update()
 
-    def loadPixmap(self, pixmap, clear_shapes=True):
-        self.pixmap = pixmap
+    def loadPixmap(self, pixmap, clear_shapes=True, image_arr=None, image_file=None):
+        """Show pixmap, or a TiledImage for images too large for one.
+
+        AI models use image_arr if given, and key its embedding by
+        image_file so that it is shared with precomputed embeddings.
+        """
+        self._setPixmap(pixmap)
+        self._image_arr = image_arr
+        self._image_file = image_file
+        self._resetAiPreview()
         if self._ai_model:
-            self._ai_model.set_image(
-                image=utils.img_qt_to_arr(self.pixmap.toImage())
-            )
+            self._setAiImage()
         if clear_shapes:
             self.shapes = []
         self.update()
@@ -1029,6 +1259,8 @@ class Canvas(QtWidgets.QWidget):
             self.shapes = list(shapes)
         else:
             self.shapes.extend(shapes)
+            for shape in shapes:
+                self._shapeIndex.insert(shape)
         self.storeShapes()
         self.current = None
         self.hShape = None
@@ -1038,7 +1270,7 @@ class Canvas(QtWidgets.QWidget):
 
     def setShapeVisible(self, shape, value):
         self.visible[shape] = value
-        self.update()
+        self.invalidateLayer()
 
     def overrideCursor(self, cursor):
         self.restoreCursor()
@@ -1050,6 +1282,8 @@ class Canvas(QtWidgets.QWidget):
 
     def resetState(self):
         self.restoreCursor()
-        self.pixmap = None
-        self.shapesBackups = []
+        self._setPixmap(None)
+        self._image_arr = None
+        self._image_file = None
+        self.shapesBackups.clear()
         self.update()
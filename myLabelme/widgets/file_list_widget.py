@@ -0,0 +1,171 @@
+import os.path as osp
+
+from qtpy import QtCore
+from qtpy import QtWidgets
+from qtpy.QtCore import Qt
+
+
+class FileListModel(QtCore.QAbstractListModel):
+    """List model over image file paths.
+
+    Rows are looked up by path through a dict, and the check state (label
+    file exists) is computed lazily in batches when rows are displayed.
+    """
+
+    BATCH_SIZE = 256
+
+    def __init__(self, parent=None):
+        super(FileListModel, self).__init__(parent)
+        self._paths = []
+        self._rows = {}  # key=path, value=row
+        self._checked = {}  # key=path, value=label file exists
+        self._labelFileGetter = None
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._paths)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        path = self._paths[index.row()]
+        if role in [Qt.DisplayRole, Qt.ToolTipRole]:
+            return path
+        if role == Qt.CheckStateRole:
+            if path not in self._checked:
+                self._computeChecked(index.row())
+            return Qt.Checked if self._checked[path] else Qt.Unchecked
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def _computeChecked(self, row):
+        start = row - row % self.BATCH_SIZE
+        for path in self._paths[start : start + self.BATCH_SIZE]:
+            if path in self._checked:
+                continue
+            label_file = None
+            if self._labelFileGetter:
+                label_file = self._labelFileGetter(path)
+            self._checked[path] = bool(label_file) and osp.exists(label_file)
+
+    def setLabelFileGetter(self, getter):
+        """Set function which returns label file path of an image path."""
+        self._labelFileGetter = getter
+        self.invalidateChecked()
+
+    def invalidateChecked(self):
+        self._checked = {}
+        if self._paths:
+            self.dataChanged.emit(
+                self.index(0), self.index(len(self._paths) - 1), [Qt.CheckStateRole]
+            )
+
+    def setChecked(self, path, checked):
+        row = self.rowOf(path)
+        if row < 0:
+            return
+        self._checked[path] = checked
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+
+    def paths(self):
+        # The list is owned by the model, do not modify it.
+        return self._paths
+
+    def rowOf(self, path):
+        return self._rows.get(path, -1)
+
+    def setPaths(self, paths):
+        self.beginResetModel()
+        self._paths = list(paths)
+        self._rows = {path: row for row, path in enumerate(self._paths)}
+        self._checked = {}
+        self.endResetModel()
+
+    def appendPaths(self, paths):
+        paths = [path for path in paths if path not in self._rows]
+        if not paths:
+            return
+        first = len(self._paths)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(paths) - 1)
+        for path in paths:
+            self._rows[path] = len(self._paths)
+            self._paths.append(path)
+        self.endInsertRows()
+
+    def removePaths(self, paths):
+        rows = sorted({self.rowOf(path) for path in paths} - {-1})
+        ranges = []  # [first, last] of contiguous rows
+        for row in rows:
+            if ranges and ranges[-1][1] == row - 1:
+                ranges[-1][1] = row
+            else:
+                ranges.append([row, row])
+        # From the last range, so rows of the ranges before stay valid.
+        for first, last in reversed(ranges):
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+            for path in self._paths[first : last + 1]:
+                del self._rows[path]
+                self._checked.pop(path, None)
+            del self._paths[first : last + 1]
+            for row in range(first, len(self._paths)):
+                self._rows[self._paths[row]] = row
+            self.endRemoveRows()
+
+
+class FileListWidget(QtWidgets.QListView):
+    itemSelectionChanged = QtCore.Signal()
+
+    def __init__(self):
+        super(FileListWidget, self).__init__()
+        self.setModel(FileListModel(self))
+        self.setUniformItemSizes(True)
+        self.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        self.selectionModel().selectionChanged.connect(
+            lambda *args: self.itemSelectionChanged.emit()
+        )
+
+    def __len__(self):
+        return self.model().rowCount()
+
+    def count(self):
+        return self.model().rowCount()
+
+    def paths(self):
+        return self.model().paths()
+
+    def rowOf(self, path):
+        return self.model().rowOf(path)
+
+    def currentRow(self):
+        index = self.currentIndex()
+        return index.row() if index.isValid() else -1
+
+    def setCurrentRow(self, row):
+        self.setCurrentIndex(self.model().index(row))
+
+    def selectedRows(self):
+        return sorted(index.row() for index in self.selectedIndexes())
+
+    def setLabelFileGetter(self, getter):
+        self.model().setLabelFileGetter(getter)
+
+    def setChecked(self, path, checked=True):
+        self.model().setChecked(path, checked)
+
+    def addFiles(self, paths):
+        self.model().appendPaths(paths)
+
+    def setFiles(self, paths):
+        self.model().setPaths(paths)
+
+    def removeFiles(self, paths):
+        self.model().removePaths(paths)
+
+    def clear(self):
+        self.model().setPaths([])
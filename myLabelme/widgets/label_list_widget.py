@@ -1,3 +1,5 @@
+import collections
+
 from qtpy import QtCore
 from qtpy import QtGui
 from qtpy import QtWidgets
@@ -8,9 +10,29 @@ from qtpy.QtWidgets import QStyle
 
 # https://stackoverflow.com/a/2039745/4158863
 class HTMLDelegate(QtWidgets.QStyledItemDelegate):
+    # Laid out documents are cached by HTML text. Text color of the palette
+    # is applied when drawing, so one document serves every item state.
+    max_documents = 512
+    max_sizes = 65536
+
     def __init__(self, parent=None):
         super(HTMLDelegate, self).__init__()
         self.doc = QtGui.QTextDocument(self)
+        self._docs = collections.OrderedDict()  # key=html, value=QTextDocument
+        self._sizes = {}  # key=html, value=QSize
+        self._measureDoc = QtGui.QTextDocument(self)
+
+    def document(self, text):
+        doc = self._docs.get(text)
+        if doc is not None:
+            self._docs.move_to_end(text)
+            return doc
+        doc = QtGui.QTextDocument()
+        doc.setHtml(text)
+        self._docs[text] = doc
+        while len(self._docs) > self.max_documents:
+            self._docs.popitem(last=False)
+        return doc
 
     def paint(self, painter, option, index):
         painter.save()
@@ -18,7 +40,7 @@ class HTMLDelegate(QtWidgets.QStyledItemDelegate):
         options = QtWidgets.QStyleOptionViewItem(option)
 
         self.initStyleOption(options, index)
-        self.doc.setHtml(options.text)
+        doc = self.document(options.text)
         options.text = ""
 
         style = (
@@ -53,16 +75,33 @@ class HTMLDelegate(QtWidgets.QStyledItemDelegate):
 
         painter.translate(textRect.topLeft())
         painter.setClipRect(textRect.translated(-textRect.topLeft()))
-        self.doc.documentLayout().draw(painter, ctx)
+        doc.documentLayout().draw(painter, ctx)
 
         painter.restore()
 
     def sizeHint(self, option, index):
+        if index is None:
+            text = None
+            doc = self.doc
+        else:
+            text = index.data(Qt.DisplayRole) or ""
+            size = self._sizes.get(text)
+            if size is not None:
+                return size
+            doc = self._docs.get(text)
+            if doc is None:
+                doc = self._measureDoc
+                doc.setHtml(text)
         thefuckyourshitup_constant = 4
-        return QtCore.QSize(
-            int(self.doc.idealWidth()),
-            int(self.doc.size().height() - thefuckyourshitup_constant),
+        size = QtCore.QSize(
+            int(doc.idealWidth()),
+            int(doc.size().height() - thefuckyourshitup_constant),
         )
+        if text is not None:
+            if len(self._sizes) >= self.max_sizes:
+                self._sizes.clear()
+            self._sizes[text] = size
+        return size
 
 
 class LabelListWidgetItem(QtGui.QStandardItem):
@@ -108,6 +147,7 @@ class LabelListWidget(QtWidgets.QListView):
     def __init__(self):
         super(LabelListWidget, self).__init__()
         self._selectedItems = []
+        self._itemsByShape = {}  # key=shape, value=item
 
         self.setWindowFlags(Qt.Window)
         self.setModel(StandardItemModel())
@@ -119,6 +159,9 @@ class LabelListWidget(QtWidgets.QListView):
 
         self.doubleClicked.connect(self.itemDoubleClickedEvent)
         self.selectionModel().selectionChanged.connect(self.itemSelectionChangedEvent)
+        # Dropped items are cloned into new rows and the old rows removed.
+        self.model().rowsInserted.connect(self._rowsInserted)
+        self.model().rowsAboutToBeRemoved.connect(self._rowsAboutToBeRemoved)
 
     def __len__(self):
         return self.model().rowCount()
@@ -138,6 +181,18 @@ class LabelListWidget(QtWidgets.QListView):
     def itemChanged(self):
         return self.model().itemChanged
 
+    def _rowsInserted(self, parent, first, last):
+        for row in range(first, last + 1):
+            item = self.model().item(row)
+            if item is not None:
+                self._itemsByShape[item.shape()] = item
+
+    def _rowsAboutToBeRemoved(self, parent, first, last):
+        for row in range(first, last + 1):
+            item = self.model().item(row)
+            if item is not None and self._itemsByShape.get(item.shape()) is item:
+                del self._itemsByShape[item.shape()]
+
     def itemSelectionChangedEvent(self, selected, deselected):
         selected = [self.model().itemFromIndex(i) for i in selected.indexes()]
         deselected = [self.model().itemFromIndex(i) for i in deselected.indexes()]
@@ -156,8 +211,19 @@ class LabelListWidget(QtWidgets.QListView):
         if not isinstance(item, LabelListWidgetItem):
             raise TypeError("item must be LabelListWidgetItem")
         self.model().setItem(self.model().rowCount(), 0, item)
+        self._itemsByShape[item.shape()] = item
         item.setSizeHint(self.itemDelegate().sizeHint(None, None))
 
+    def addItems(self, items):
+        """Append items with one rows inserted signal."""
+        sizeHint = self.itemDelegate().sizeHint(None, None)
+        for item in items:
+            if not isinstance(item, LabelListWidgetItem):
+                raise TypeError("item must be LabelListWidgetItem")
+            item.setSizeHint(sizeHint)
+        if items:
+            self.model().invisibleRootItem().appendRows(items)
+
     def removeItem(self, item):
         index = self.model().indexFromItem(item)
         self.model().removeRows(index.row(), 1)
@@ -167,11 +233,11 @@ class LabelListWidget(QtWidgets.QListView):
         self.selectionModel().select(index, QtCore.QItemSelectionModel.Select)
 
     def findItemByShape(self, shape):
-        for row in range(self.model().rowCount()):
-            item = self.model().item(row, 0)
-            if item.shape() == shape:
-                return item
-        raise ValueError("cannot find shape: {}".format(shape))
+        item = self._itemsByShape.get(shape)
+        if item is None:
+            raise ValueError("cannot find shape: {}".format(shape))
+        return item
 
     def clear(self):
         self.model().clear()
+        self._itemsByShape = {}
@@ -9,16 +9,31 @@ from .escapable_qlist_widget import EscapableQListWidget
 
 
 class UniqueLabelQListWidget(EscapableQListWidget):
+    def __init__(self, *args, **kwargs):
+        super(UniqueLabelQListWidget, self).__init__(*args, **kwargs)
+        self._itemsByLabel = {}  # key=label, value=item
+        self.model().rowsInserted.connect(self._rowsInserted)
+        self.model().rowsAboutToBeRemoved.connect(self._rowsAboutToBeRemoved)
+        self.model().modelReset.connect(self._itemsByLabel.clear)
+
+    def _rowsInserted(self, parent, first, last):
+        for row in range(first, last + 1):
+            item = self.item(row)
+            self._itemsByLabel.setdefault(item.data(Qt.UserRole), item)
+
+    def _rowsAboutToBeRemoved(self, parent, first, last):
+        for row in range(first, last + 1):
+            item = self.item(row)
+            if self._itemsByLabel.get(item.data(Qt.UserRole)) is item:
+                del self._itemsByLabel[item.data(Qt.UserRole)]
+
     def mousePressEvent(self, event):
         super(UniqueLabelQListWidget, self).mousePressEvent(event)
         if not self.indexAt(event.pos()).isValid():
             self.clearSelection()
 
     def findItemByLabel(self, label):
-        for row in range(self.count()):
-            item = self.item(row)
-            if item.data(Qt.UserRole) == label:
-                return item
+        return self._itemsByLabel.get(label)
 
     def createItemFromLabel(self, label):
         if self.findItemByLabel(label):
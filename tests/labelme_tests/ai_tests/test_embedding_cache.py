@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+
+from labelme.ai.embedding_cache import EmbeddingCache
+from labelme.ai.embedding_cache import image_digest
+
+
+def test_image_digest():
+    image = np.zeros((2000, 3000, 3), dtype=np.uint8)
+    assert image_digest(image) == image_digest(image.copy())
+    assert image_digest(image) != image_digest(image[:, :2999])
+    assert image_digest(image) != image_digest(image.astype(np.float32))
+    changed = image.copy()
+    changed[0, 0] = 1
+    assert image_digest(image) != image_digest(changed)
+
+
+def test_EmbeddingCache(tmp_path):
+    embeddings = [np.full((4, 8, 8), i, dtype=np.float32) for i in range(3)]
+    nbytes = embeddings[0].nbytes + 128  # npy header
+    cache = EmbeddingCache(
+        cache_dir=str(tmp_path), max_bytes=2 * nbytes, ram_entries=1
+    )
+    assert cache.get("a") is None
+    for key, embedding in zip("abc", embeddings):
+        cache.put(key, embedding)
+
+    # least recently used file is removed
+    assert "a" not in cache
+    assert sorted(os.listdir(str(tmp_path))) == ["b.npy", "c.npy"]
+    np.testing.assert_array_equal(cache.get("b"), embeddings[1])
+
+    # disk tier is loaded again by a new cache
+    cache = EmbeddingCache(cache_dir=str(tmp_path), max_bytes=2 * nbytes)
+    assert "b" in cache and "c" in cache
+    embedding = cache.get("c")
+    assert isinstance(embedding, np.memmap)
+    np.testing.assert_array_equal(embedding, embeddings[2])
+
+
+def test_EmbeddingCache_evict_mapped(tmp_path):
+    embedding = np.zeros((4, 8, 8), dtype=np.float32)
+    cache = EmbeddingCache(
+        cache_dir=str(tmp_path), max_bytes=embedding.nbytes + 128, ram_entries=2
+    )
+    cache.put("a", embedding)
+    cache = EmbeddingCache(
+        cache_dir=str(tmp_path), max_bytes=embedding.nbytes + 128, ram_entries=2
+    )
+    assert isinstance(cache.get("a"), np.memmap)
+    cache.put("b", embedding)
+    # memory map of evicted file is dropped from the memory tier
+    assert "a" not in cache
+    assert cache.get("a") is None
+    assert os.listdir(str(tmp_path)) == ["b.npy"]
+
+
+def test_EmbeddingCache_evict_retry(tmp_path, monkeypatch):
+    embedding = np.zeros((4, 8, 8), dtype=np.float32)
+    cache = EmbeddingCache(
+        cache_dir=str(tmp_path), max_bytes=embedding.nbytes + 128, ram_entries=0
+    )
+    cache.put("a", embedding)
+
+    def remove_mapped(filename):
+        # as on Windows while the file is mapped elsewhere
+        raise PermissionError(filename)
+
+    remove = os.remove
+    monkeypatch.setattr(os, "remove", remove_mapped)
+    cache.put("b", embedding)
+    assert "a" not in cache
+    assert sorted(os.listdir(str(tmp_path))) == ["a.npy", "b.npy"]
+
+    monkeypatch.setattr(os, "remove", remove)
+    cache.put("c", embedding)
+    assert os.listdir(str(tmp_path)) == ["c.npy"]
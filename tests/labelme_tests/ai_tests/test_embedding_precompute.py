@@ -0,0 +1,71 @@
+import os.path as osp
+
+import numpy as np
+import onnxruntime
+import PIL.Image
+import pytest
+
+import labelme.app
+import labelme.config
+from labelme.ai.efficient_sam import EfficientSam
+from labelme.ai.embedding_cache import EmbeddingCache
+from labelme.ai.embedding_precompute import EmbeddingPrecomputer
+from labelme.label_file import LabelFile
+
+
+class _CountingSession(object):
+    """Encoder session returning a constant embedding and counting runs."""
+
+    runs = 0
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def run(self, output_names, input_feed):
+        _CountingSession.runs += 1
+        return [np.zeros((1, 4, 8, 8), dtype=np.float32)]
+
+
+@pytest.mark.gui
+def test_precompute_then_open_annotated(qtbot, tmp_path, monkeypatch):
+    monkeypatch.setattr(onnxruntime, "InferenceSession", _CountingSession)
+    _CountingSession.runs = 0
+
+    # EXIF-rotated, so the image embedded in the label file is re-encoded
+    img_file = str(tmp_path / "img.jpg")
+    image = PIL.Image.fromarray(
+        np.random.RandomState(0).randint(0, 255, (30, 40, 3), dtype=np.uint8)
+    )
+    exif = image.getexif()
+    exif[0x0112] = 6
+    image.save(img_file, exif=exif)
+    LabelFile().save(
+        filename=str(tmp_path / "img.json"),
+        shapes=[],
+        imagePath="img.jpg",
+        imageHeight=40,
+        imageWidth=30,
+        imageData=LabelFile.load_image_file(img_file),
+    )
+
+    model = EfficientSam(encoder_path="encoder.onnx", decoder_path="decoder.onnx")
+    model.set_embedding_cache(EmbeddingCache())
+    precomputer = EmbeddingPrecomputer(model)
+    precomputer.precompute([img_file])
+    precomputer.wait()
+    precomputer.shutdown()
+    assert _CountingSession.runs == 1
+
+    config = labelme.config.get_default_config()
+    config["ai"]["embedding_cache"]["max_disk"] = 0
+    win = labelme.app.MainWindow(config, None, None, None)
+    qtbot.addWidget(win)
+    win.canvas._ai_model = model
+    assert win.loadFile(img_file)
+    assert osp.samefile(win.imagePath, img_file)
+    win.onNewBrightnessContrast(win.image)
+
+    # embedding is found in cache, so the encoder is not run again
+    assert model._thread is None
+    assert _CountingSession.runs == 1
+    win.close()
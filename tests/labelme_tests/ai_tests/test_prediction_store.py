@@ -0,0 +1,70 @@
+import io
+import json
+import os.path as osp
+
+import numpy as np
+
+from labelme.ai.prediction_store import PredictionStore
+
+
+def _boxes(count, value):
+    return np.full((count, 4), value, dtype=np.float32)
+
+
+def test_PredictionStore(tmp_path):
+    root = str(tmp_path)
+    store = PredictionStore(root, names={0: "person", 1: "car"})
+    store.append("a.jpg", _boxes(2, 1), [0, 1], track_ids=[5, 6])
+    store.append("b.jpg", _boxes(0, 0), [])
+    boxes, classes, track_ids = store.get("a.jpg")
+    np.testing.assert_array_equal(boxes, _boxes(2, 1))
+    np.testing.assert_array_equal(classes, [0, 1])
+    np.testing.assert_array_equal(track_ids, [5, 6])
+    store.append("a.jpg", _boxes(1, 3), [1])  # predicted again
+    store.close()
+
+    store = PredictionStore(root)
+    assert store.names == {0: "person", 1: "car"}
+    assert len(store) == 2
+    assert "a.jpg" in store and "b.jpg" in store and "c.jpg" not in store
+    boxes, classes, track_ids = store.get("a.jpg")
+    np.testing.assert_array_equal(boxes, _boxes(1, 3))
+    np.testing.assert_array_equal(classes, [1])
+    np.testing.assert_array_equal(track_ids, [-1])
+    assert len(store.get("b.jpg")[0]) == 0
+    assert store.get("c.jpg") is None
+
+    store.clear()
+    assert len(store) == 0
+    assert len(PredictionStore(root)) == 0
+
+
+def test_PredictionStore_recover(tmp_path):
+    root = str(tmp_path)
+    store = PredictionStore(root, flush_every=1)
+    store.append("a.jpg", _boxes(2, 1), [0, 0])
+    store.append("b.jpg", _boxes(2, 2), [0, 0])
+    # killed while appending: index lines are written after the rows
+    store.flush_every = 10
+    store.append("c.jpg", _boxes(1, 3), [0])
+    for writer in store._writers.values():
+        writer.flush()
+    # rows of b.jpg were lost and the last line was cut
+    for column, (dtype, width) in PredictionStore.COLUMNS.items():
+        with io.open(osp.join(root, column + ".bin"), "r+b") as f:
+            f.truncate(2 * np.dtype(dtype).itemsize * width)
+    with io.open(osp.join(root, "index.jsonl"), "a") as f:
+        f.write('["c.jpg", 4')
+
+    store = PredictionStore(root)
+    assert len(store) == 1
+    with io.open(osp.join(root, "index.jsonl")) as f:
+        assert [json.loads(line)[1:] for line in f] == [[0, 2]]
+
+    # new rows take the place of the lost ones
+    store.append("d.jpg", _boxes(3, 4), [1, 1, 1])
+    store.close()
+    store = PredictionStore(root)
+    assert "b.jpg" not in store and "c.jpg" not in store
+    np.testing.assert_array_equal(store.get("a.jpg")[0], _boxes(2, 1))
+    np.testing.assert_array_equal(store.get("d.jpg")[0], _boxes(3, 4))
@@ -2,11 +2,14 @@ import os.path as osp
 import shutil
 import tempfile
 
+import PIL.Image
 import pytest
 
 import labelme.app
 import labelme.config
 import labelme.testing
+from labelme.label_file import LabelFile
+from labelme.tiled_image import TiledImage
 
 here = osp.dirname(osp.abspath(__file__))
 data_dir = osp.join(here, "data")
@@ -112,3 +115,80 @@ def test_MainWindow_annotate_jpg(qtbot):
 
     labelme.testing.assert_labelfile_sanity(out_file)
     shutil.rmtree(tmp_dir)
+
+
+@pytest.mark.gui
+def test_MainWindow_open_tiled_img_with_json(qtbot):
+    tmp_dir = tempfile.mkdtemp()
+    img_file = osp.join(tmp_dir, "large.png")
+    PIL.Image.new("RGB", (64, 48)).save(img_file)
+    LabelFile().save(
+        filename=osp.join(tmp_dir, "large.json"),
+        shapes=[
+            dict(
+                label="whole",
+                points=[[10, 10], [50, 40]],
+                group_id=None,
+                shape_type="rectangle",
+                flags={},
+                description="",
+                mask=None,
+            )
+        ],
+        imagePath="large.png",
+        imageHeight=48,
+        imageWidth=64,
+    )
+
+    config = labelme.config.get_default_config()
+    config["tiled_image"]["min_pixels"] = 64 * 48
+    config["tiled_image"]["cache_dir"] = osp.join(tmp_dir, "tiles")
+    win = labelme.app.MainWindow(config, img_file, None, None)
+    qtbot.addWidget(win)
+    win.show()
+    qtbot.waitUntil(lambda: getattr(win, "labelFile", None) is not None)
+
+    # image is shown from tiles and never read through the label file
+    assert isinstance(win.image, TiledImage)
+    assert win.imageArr is None
+    assert win.labelFile._imageData is None
+    assert len(win.canvas.shapes) == 1
+    win.close()
+    shutil.rmtree(tmp_dir)
+
+
+@pytest.mark.gui
+def test_MainWindow_yolo_prediction_loaded_once(qtbot, monkeypatch):
+    tmp_dir = tempfile.mkdtemp()
+    img_file = osp.join(tmp_dir, "frame.png")
+    PIL.Image.new("RGB", (64, 48)).save(img_file)
+
+    win = labelme.app.MainWindow(labelme.config.get_default_config(), None, None, None)
+    qtbot.addWidget(win)
+    monkeypatch.setattr(win, "mayContinue", lambda: True)
+    monkeypatch.setattr(
+        win.yoloModel,
+        "getImagePrediction",
+        lambda imagePath: [
+            dict(
+                label="person",
+                points=[[10, 10], [50, 40]],
+                group_id=None,
+                shape_type="rectangle",
+                flags={},
+                description="",
+                mask=None,
+                other_data={},
+            )
+        ],
+    )
+    win.show()
+    win.loadFile(img_file)
+    assert len(win.labelList) == 1
+
+    # frame opened while the worker ran already shows its prediction
+    win.yoloWorkerFinished(None, win._runYoloVidButton)
+    assert len(win.labelList) == 1
+    assert len(win.canvas.shapes) == 1
+    win.close()
+    shutil.rmtree(tmp_dir)
@@ -0,0 +1,90 @@
+import json
+import os
+import os.path as osp
+import stat
+
+from qtpy import QtCore
+
+from labelme.autosave import AutoSaver
+
+
+def _data(label):
+    shape = dict(
+        label=label,
+        points=[[1, 2], [3, 4]],
+        group_id=None,
+        description="",
+        shape_type="line",
+        flags={},
+        mask=None,
+    )
+    return dict(
+        shapes=[shape],
+        imagePath="img.jpg",
+        imageHeight=10,
+        imageWidth=10,
+        imageData=None,
+        otherData={},
+        flags={},
+    )
+
+
+def _connect(saver):
+    saved, failed = [], []
+    # called in the writer thread, so no event loop is needed
+    saver.saved.connect(saved.append, QtCore.Qt.DirectConnection)
+    saver.failed.connect(
+        lambda filename, message: failed.append(filename), QtCore.Qt.DirectConnection
+    )
+    return saved, failed
+
+
+def test_AutoSaver(tmp_path):
+    filename = str(tmp_path / "img.json")
+    saver = AutoSaver(delay=60)
+    saved, failed = _connect(saver)
+
+    # snapshots scheduled within delay are written once
+    for label in ["a", "b", "c"]:
+        saver.schedule(filename, _data(label))
+    assert not osp.exists(filename)
+    saver.flush()
+    with open(filename) as f:
+        assert json.load(f)["shapes"][0]["label"] == "c"
+    assert saved == [filename]
+    assert not failed
+    assert os.listdir(str(tmp_path)) == ["img.json"]
+
+    saver.schedule(filename, _data("d"))
+    saver.discard(filename)
+    saver.flush()
+    with open(filename) as f:
+        assert json.load(f)["shapes"][0]["label"] == "c"
+    assert saved == [filename]
+
+
+def test_AutoSaver_mode(tmp_path):
+    umask = os.umask(0)
+    os.umask(umask)
+    saver = AutoSaver(delay=0)
+    filename = str(tmp_path / "new.json")
+    saver.schedule(filename, _data("a"))
+    saver.flush()
+    assert stat.S_IMODE(os.stat(filename).st_mode) == 0o666 & ~umask
+
+    # existing label file keeps its mode
+    os.chmod(filename, 0o664)
+    saver.schedule(filename, _data("b"))
+    saver.flush()
+    assert stat.S_IMODE(os.stat(filename).st_mode) == 0o664
+
+
+def test_AutoSaver_failed(tmp_path):
+    (tmp_path / "file").write_text("")
+    filename = str(tmp_path / "file" / "img.json")
+    saver = AutoSaver(delay=0)
+    saved, failed = _connect(saver)
+    saver.schedule(filename, _data("a"))
+    saver.flush()
+    assert not saved
+    assert failed == [filename]
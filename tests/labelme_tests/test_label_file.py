@@ -0,0 +1,165 @@
+# -*- encoding: utf-8 -*-
+
+import io
+import os.path as osp
+import zipfile
+
+import numpy as np
+import PIL.Image
+import pytest
+
+from labelme.label_file import LabelFile
+from labelme.label_file import LabelFileError
+
+
+def _write_image(filename, height=20, width=30):
+    arr = np.random.RandomState(0).randint(0, 255, (height, width, 3), np.uint8)
+    PIL.Image.fromarray(arr).save(filename)
+    with open(filename, "rb") as f:
+        return f.read()
+
+
+def _make_shapes():
+    mask = np.zeros((4, 5), dtype=bool)
+    mask[1:3, 2:4] = True
+    return [
+        dict(
+            label="person",
+            points=[[1.0, 2.0], [10.5, 2.0], [10.5, 12.25]],
+            group_id=None,
+            shape_type="polygon",
+            flags={"occluded": True},
+            description="",
+            mask=None,
+            score=0.75,
+        ),
+        dict(
+            label="dog",
+            points=[[3.0, 4.0], [8.0, 8.0]],
+            group_id=1,
+            shape_type="mask",
+            flags={},
+            description="brown",
+            mask=mask,
+        ),
+        dict(
+            label="ball",
+            points=[[5.0, 6.0]],
+            group_id=None,
+            shape_type="point",
+            flags={},
+            description=None,
+            mask=None,
+        ),
+    ]
+
+
+def _save(filename, imagePath, imageData=None):
+    LabelFile().save(
+        filename=filename,
+        shapes=_make_shapes(),
+        imagePath=imagePath,
+        imageHeight=20,
+        imageWidth=30,
+        imageData=imageData,
+        otherData={"source": "test"},
+        flags={"reviewed": True},
+    )
+
+
+def _check_shapes(shapes):
+    expected = _make_shapes()
+    assert len(shapes) == len(expected)
+    for shape, s in zip(shapes, expected):
+        assert shape["label"] == s["label"]
+        assert shape["points"] == s["points"]
+        assert shape["group_id"] == s["group_id"]
+        assert shape["shape_type"] == s["shape_type"]
+        assert shape["flags"] == s["flags"]
+        assert shape["description"] == s["description"]
+        if s["mask"] is None:
+            assert shape["mask"] is None
+        else:
+            assert shape["mask"].dtype == bool
+            np.testing.assert_array_equal(shape["mask"], s["mask"])
+    assert shapes[0]["other_data"] == {"score": 0.75}
+
+
+@pytest.mark.parametrize("suffix", [".json", ".lbz"])
+def test_LabelFile_round_trip(tmp_path, suffix):
+    imageData = _write_image(str(tmp_path / "image.png"))
+    filename = str(tmp_path / ("image" + suffix))
+    _save(filename, "image.png", imageData=imageData)
+
+    label_file = LabelFile(filename)
+    _check_shapes(label_file.shapes)
+    assert label_file.imagePath == "image.png"
+    assert label_file.flags == {"reviewed": True}
+    assert label_file.otherData == {"source": "test"}
+    assert label_file.imageData == imageData
+    assert label_file.filename == filename
+
+
+def test_LabelFile_binary_stores_image(tmp_path):
+    imageData = _write_image(str(tmp_path / "image.png"))
+    filename = str(tmp_path / "image.lbz")
+    _save(filename, "image.png", imageData=imageData)
+
+    with zipfile.ZipFile(filename) as zf:
+        assert sorted(zf.namelist()) == [
+            "header.json",
+            "image",
+            "masks.npy",
+            "points.npy",
+        ]
+        points = np.load(io.BytesIO(zf.read("points.npy")))
+    assert points.shape == (6, 2)
+
+    # embedded image bytes are used even if the image file is gone
+    (tmp_path / "image.png").unlink()
+    label_file = LabelFile(filename)
+    assert label_file.imageData == imageData
+
+
+def test_LabelFile_binary_without_image(tmp_path):
+    image_dir = tmp_path / "images"
+    image_dir.mkdir()
+    _write_image(str(image_dir / "image.png"))
+    filename = str(tmp_path / "image.lbz")
+    _save(filename, osp.join("images", "image.png"))
+
+    with zipfile.ZipFile(filename) as zf:
+        assert "image" not in zf.namelist()
+
+    label_file = LabelFile(filename)
+    _check_shapes(label_file.shapes)
+    # image is read from imagePath only when imageData is first used
+    assert label_file._imageData is None
+    assert label_file.imageData == LabelFile.load_image_file(
+        str(image_dir / "image.png")
+    )
+
+
+def test_LabelFile_binary_empty(tmp_path):
+    filename = str(tmp_path / "image.lbz")
+    LabelFile().save(
+        filename=filename,
+        shapes=[],
+        imagePath="image.png",
+        imageHeight=20,
+        imageWidth=30,
+    )
+
+    label_file = LabelFile(filename)
+    assert label_file.shapes == []
+    assert label_file.flags == {}
+    assert label_file.otherData == {}
+
+
+def test_LabelFile_binary_corrupt(tmp_path):
+    filename = str(tmp_path / "image.lbz")
+    with open(filename, "wb") as f:
+        f.write(b"not a zip file")
+
+    with pytest.raises(LabelFileError):
+        LabelFile(filename)
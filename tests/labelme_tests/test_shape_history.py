@@ -0,0 +1,116 @@
+# -*- encoding: utf-8 -*-
+
+import numpy as np
+from qtpy import QtCore
+
+from labelme.shape import Shape
+from labelme.shape_history import ShapeHistory
+
+
+def _make_shape(label, x=0.0, mask=None):
+    shape = Shape(label=label, shape_type="mask" if mask is not None else "polygon")
+    shape.addPoint(QtCore.QPointF(x, 0))
+    shape.addPoint(QtCore.QPointF(x + 10, 0))
+    shape.addPoint(QtCore.QPointF(x + 10, 10))
+    shape.mask = mask
+    return shape
+
+
+def test_ShapeHistory_shares_unchanged_snapshots():
+    history = ShapeHistory()
+    shapes = [_make_shape("a"), _make_shape("b", x=20)]
+    history.push(shapes)
+
+    shapes[1][0] = QtCore.QPointF(25, 5)
+    history.push(shapes)
+
+    assert len(history) == 2
+    assert history[0][0] is history[1][0]
+    assert history[0][1] is not history[1][1]
+    assert history[0][1].points[0] == QtCore.QPointF(20, 0)
+    assert history[1][1].points[0] == QtCore.QPointF(25, 5)
+
+    # snapshots are not modified by later edits of live shapes
+    shapes[0].label = "c"
+    assert history[1][0].label == "a"
+
+
+def test_ShapeHistory_undo_redo():
+    history = ShapeHistory()
+    shapes = [_make_shape("a"), _make_shape("b", x=20)]
+    history.push(shapes)
+    shapes[1][0] = QtCore.QPointF(25, 5)
+    history.push(shapes)
+
+    # undo as Canvas.restoreShape does
+    history.pop()
+    restored = history.restore(history.pop(), shapes)
+    assert len(history) == 0
+    assert restored[0] is shapes[0]
+    assert restored[1] is not shapes[1]
+    assert restored[1].points[0] == QtCore.QPointF(20, 0)
+
+    # Canvas.loadShapes pushes the restored shapes back, which shares
+    # the snapshots of unchanged shapes
+    history.push(restored)
+    entry = history[-1]
+    restored[1][0] = QtCore.QPointF(30, 5)
+    history.push(restored)
+    assert history[-1][0] is entry[0]
+    assert entry[1].points[0] == QtCore.QPointF(20, 0)
+
+    # restoring again copies the snapshot instead of handing it out
+    history.pop()
+    again = history.restore(history.pop(), restored)
+    assert again[1] is not entry[1]
+    again[1][0] = QtCore.QPointF(40, 5)
+    assert entry[1].points[0] == QtCore.QPointF(20, 0)
+
+
+def test_ShapeHistory_max_entries():
+    history = ShapeHistory(max_entries=3)
+    shapes = [_make_shape("a")]
+    for i in range(5):
+        shapes[0][0] = QtCore.QPointF(i, 0)
+        history.push(shapes)
+    assert len(history) == 3
+    assert history[0][0].points[0] == QtCore.QPointF(2, 0)
+    assert history.nbytes == sum(snapshot.nbytes() for (snapshot,) in history)
+
+
+def test_ShapeHistory_max_bytes_keeps_two_entries():
+    history = ShapeHistory(max_bytes=1)
+    shapes = [_make_shape("a")]
+    for i in range(4):
+        shapes[0][0] = QtCore.QPointF(i, 0)
+        history.push(shapes)
+    # the last edit can still be undone
+    assert len(history) == 2
+    assert history[-1][0].points[0] == QtCore.QPointF(3, 0)
+
+
+def test_ShapeHistory_counts_masks_once():
+    history = ShapeHistory()
+    mask = np.ones((100, 100), dtype=bool)
+    shapes = [_make_shape("a", mask=mask), _make_shape("b", x=20)]
+    history.push(shapes)
+    nbytes = history.nbytes
+    assert nbytes == mask.nbytes + sum(s.nbytes() for s in history[0])
+
+    # a changed shape is copied, but its mask is shared with the old copy
+    shapes[0].label = "c"
+    history.push(shapes)
+    assert history[1][0] is not history[0][0]
+    assert history[1][0].mask is mask
+    assert history.nbytes == nbytes + history[1][0].nbytes()
+
+    # a new mask is counted, the old one until its entries are gone
+    shapes[0].mask = np.zeros((100, 100), dtype=bool)
+    history.push(shapes)
+    assert history.nbytes == nbytes + 2 * history[1][0].nbytes() + mask.nbytes
+
+    history.pop()
+    history.pop()
+    assert history.nbytes == nbytes
+    history.pop()
+    assert history.nbytes == 0
@@ -0,0 +1,141 @@
+# -*- encoding: utf-8 -*-
+
+import random
+
+from qtpy import QtCore
+
+from labelme.shape import Shape
+from labelme.shape_index import ShapeIndex
+
+
+def _make_shape(rng, shape_type="polygon"):
+    x = rng.uniform(-50, 1000)
+    y = rng.uniform(-50, 1000)
+    # a few shapes span many cells and are kept apart from the grid
+    size = rng.choice([5, 40, 200, 3000])
+    shape = Shape(label="a", shape_type=shape_type)
+    if shape_type == "circle":
+        shape.points = [QtCore.QPointF(x, y), QtCore.QPointF(x + size / 2, y)]
+    else:
+        shape.points = [
+            QtCore.QPointF(x + rng.uniform(0, size), y + rng.uniform(0, size))
+            for _ in range(4)
+        ]
+    return shape
+
+
+def _move(shape, dx, dy):
+    shape.points = [QtCore.QPointF(p.x() + dx, p.y() + dy) for p in shape.points]
+
+
+def _brute_force(shapes, point, radius):
+    x, y = point.x(), point.y()
+    found = []
+    for shape in reversed(shapes):
+        bounds = ShapeIndex.bounds(shape)
+        if bounds is None:
+            continue
+        x1, y1, x2, y2 = bounds
+        if x1 - radius <= x <= x2 + radius and y1 - radius <= y <= y2 + radius:
+            found.append(shape)
+    return found
+
+
+def _check(index, shapes, rng, n_queries=200):
+    shapes_set = set(shapes)
+    for _ in range(n_queries):
+        point = QtCore.QPointF(rng.uniform(-100, 1100), rng.uniform(-100, 1100))
+        radius = rng.choice([0, 3, 30])
+        candidates = index.candidates(point, radius)
+        assert set(candidates) <= shapes_set
+        # candidates may include shapes in the same cells, but no shape
+        # within radius is missed and the topmost comes first
+        expected = _brute_force(shapes, point, radius)
+        assert [s for s in candidates if s in set(expected)] == expected
+
+
+def test_ShapeIndex_candidates():
+    rng = random.Random(0)
+    shapes = [_make_shape(rng) for _ in range(300)]
+    shapes += [_make_shape(rng, "circle") for _ in range(20)]
+    index = ShapeIndex(cell_size=32, max_cells=64)
+    index.rebuild(shapes)
+    assert len(index) == len(shapes)
+    _check(index, shapes, rng)
+
+
+def test_ShapeIndex_insert_move_remove():
+    rng = random.Random(1)
+    shapes = [_make_shape(rng) for _ in range(200)]
+    index = ShapeIndex(cell_size=32, max_cells=64)
+    index.rebuild(shapes)
+
+    for _ in range(50):
+        shape = _make_shape(rng)
+        shapes.append(shape)
+        index.insert(shape)
+    _check(index, shapes, rng)
+
+    # moved shapes keep their z-order
+    for shape in rng.sample(shapes, 80):
+        _move(shape, rng.uniform(-300, 300), rng.uniform(-300, 300))
+        index.update(shape)
+    _check(index, shapes, rng)
+
+    for shape in rng.sample(shapes, 100):
+        shapes.remove(shape)
+        index.remove(shape)
+    assert len(index) == len(shapes)
+    _check(index, shapes, rng)
+
+    # removing and updating shapes which are not indexed is a no-op
+    copy = shapes[0].copy()
+    index.update(copy)
+    index.remove(copy)
+    assert copy not in index
+    _check(index, shapes, rng)
+
+
+def test_ShapeIndex_sync():
+    rng = random.Random(2)
+    shapes = [_make_shape(rng) for _ in range(100)]
+    index = ShapeIndex(cell_size=32, max_cells=64)
+    index.sync(shapes)
+    _check(index, shapes, rng)
+
+    # shapes changed without notifying the index
+    del shapes[10:30]
+    shapes += [_make_shape(rng) for _ in range(5)]
+    index.sync(shapes)
+    assert len(index) == len(shapes)
+    _check(index, shapes, rng)
+
+
+def test_ShapeIndex_z_order():
+    index = ShapeIndex(cell_size=32)
+    shapes = []
+    for i in range(5):
+        shape = Shape(label=str(i))
+        shape.points = [QtCore.QPointF(0, 0), QtCore.QPointF(10 + i, 10 + i)]
+        shapes.append(shape)
+    index.rebuild(shapes)
+
+    point = QtCore.QPointF(5, 5)
+    assert index.candidates(point) == shapes[::-1]
+
+    # moving a shape does not bring it on top
+    _move(shapes[1], 1, 1)
+    index.update(shapes[1])
+    assert index.candidates(point) == shapes[::-1]
+
+    # an inserted shape is on top
+    index.remove(shapes[2])
+    index.insert(shapes[2])
+    assert index.candidates(point) == [shapes[i] for i in [2, 4, 3, 1, 0]]
+    assert index.sorted(set(shapes)) == [shapes[i] for i in [0, 1, 3, 4, 2]]
+
+    # shapes without points are indexed but never found
+    empty = Shape(label="empty")
+    index.insert(empty)
+    assert empty in index
+    assert empty not in index.candidates(point, 100)
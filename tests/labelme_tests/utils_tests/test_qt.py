@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+from qtpy import QtCore
+
+from labelme import utils
+from labelme.shape import Shape
+
+
+def _points(arr):
+    return [QtCore.QPointF(x, y) for x, y in arr]
+
+
+def _nearest_vertex(points, point, epsilon):
+    # scalar loop as used by Shape before the kernels
+    min_distance = float("inf")
+    min_i = None
+    for i, p in enumerate(points):
+        dist = utils.distance(p - point)
+        if dist <= epsilon and dist < min_distance:
+            min_distance = dist
+            min_i = i
+    return min_i
+
+
+def _nearest_edge(points, point, epsilon):
+    min_distance = float("inf")
+    post_i = None
+    for i in range(len(points)):
+        dist = utils.distancetoline(point, [points[i - 1], points[i]])
+        if dist <= epsilon and dist < min_distance:
+            min_distance = dist
+            post_i = i
+    return post_i
+
+
+def _random_cases(n_cases=50):
+    rng = np.random.RandomState(0)
+    for _ in range(n_cases):
+        arr = rng.uniform(0, 100, (rng.randint(1, 12), 2)).round()
+        if len(arr) > 2:
+            # duplicate vertices give zero-length edges
+            arr[rng.randint(1, len(arr))] = arr[0]
+        for point in rng.uniform(-10, 110, (10, 2)).round():
+            yield arr, QtCore.QPointF(*point)
+
+
+def test_distances():
+    for arr, point in _random_cases():
+        expected = [utils.distance(p - point) for p in _points(arr)]
+        np.testing.assert_allclose(
+            utils.distances(arr, (point.x(), point.y())), expected
+        )
+
+
+def test_distancestolines():
+    for arr, point in _random_cases():
+        points = _points(arr)
+        expected = [
+            utils.distancetoline(point, [points[i - 1], points[i]])
+            for i in range(len(points))
+        ]
+        np.testing.assert_allclose(
+            utils.distancestolines(arr, (point.x(), point.y())), expected
+        )
+
+
+def test_distancestolines_degenerate_edge():
+    arr = np.array([[0, 0], [0, 0], [10, 0]], dtype=float)
+    point = QtCore.QPointF(3, 4)
+    dists = utils.distancestolines(arr, (point.x(), point.y()))
+    # zero-length edge is as far as its point
+    assert dists[1] == pytest.approx(5)
+    assert dists[1] == pytest.approx(
+        utils.distancetoline(point, _points(arr[[0, 1]]))
+    )
+
+
+@pytest.mark.parametrize("shape_type", ["polygon", "linestrip"])
+def test_Shape_nearest_vertex_and_edge(shape_type):
+    for arr, point in _random_cases():
+        shape = Shape(shape_type=shape_type)
+        shape.points = _points(arr)
+        if shape_type == "polygon":
+            shape.close()
+        for epsilon in [0, 5, 30]:
+            assert shape.nearestVertex(point, epsilon) == _nearest_vertex(
+                shape.points, point, epsilon
+            )
+            # the closing edge is checked for open shapes too, as before
+            assert shape.nearestEdge(point, epsilon) == _nearest_edge(
+                shape.points, point, epsilon
+            )
+
+
+def test_Shape_nearest_ties():
+    shape = Shape()
+    shape.points = _points([[0, 0], [10, 0], [10, 0], [0, 0]])
+    # ties resolve to the first index
+    assert shape.nearestVertex(QtCore.QPointF(10, 1), 5) == 1
+    assert shape.nearestVertex(QtCore.QPointF(0, 1), 5) == 0
+    assert shape.nearestEdge(QtCore.QPointF(5, 1), 5) == 1
+    assert shape.nearestVertex(QtCore.QPointF(50, 50), 5) is None
+    assert shape.nearestEdge(QtCore.QPointF(50, 50), 5) is None
+
+    # vertex and edge caches follow edits
+    shape[1] = QtCore.QPointF(20, 0)
+    assert shape.nearestVertex(QtCore.QPointF(20, 1), 5) == 1
+    assert Shape().nearestVertex(QtCore.QPointF(0, 0), 5) is None
+    assert Shape().nearestEdge(QtCore.QPointF(0, 0), 5) is None
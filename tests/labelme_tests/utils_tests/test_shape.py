@@ -1,3 +1,7 @@
+import numpy as np
+import PIL.Image
+import PIL.ImageDraw
+
 from labelme.utils import shape as shape_module
 
 from .util import get_img_and_data
@@ -22,3 +26,45 @@ def test_shape_to_mask():
         points = shape["points"]
         mask = shape_module.shape_to_mask(img.shape[:2], points)
         assert mask.shape == img.shape[:2]
+
+
+def test_shapes_to_label_clipped():
+    img_shape = (40, 50)
+    shapes = [
+        # partly outside of the image
+        dict(label="a", points=[[-5, 30], [20, -8], [35, 25]], shape_type="polygon"),
+        dict(label="b", points=[[40, 30], [60, 45]], shape_type="rectangle"),
+        dict(label="b", points=[[5, 35], [8, 38]], shape_type="circle", group_id=1),
+        dict(label="a", points=[[45, 2], [70, 10]], shape_type="line"),
+        dict(label="a", points=[[-3, -3]], shape_type="point"),
+        # outside of the image
+        dict(label="b", points=[[60, 0], [80, 20]], shape_type="rectangle"),
+    ]
+    label_name_to_value = {"_background_": 0, "a": 1, "b": 2}
+    cls, ins = shape_module.shapes_to_label(img_shape, shapes, label_name_to_value)
+
+    expected_cls = np.zeros(img_shape, dtype=np.int32)
+    expected_ins = np.zeros(img_shape, dtype=np.int32)
+    for i, shape in enumerate(shapes):
+        # reference drawn on the whole image
+        mask = PIL.Image.new("L", img_shape[::-1], 0)
+        draw = PIL.ImageDraw.Draw(mask)
+        xy = [tuple(point) for point in shape["points"]]
+        if shape["shape_type"] == "circle":
+            (cx, cy), (px, py) = xy
+            d = np.hypot(cx - px, cy - py)
+            draw.ellipse([cx - d, cy - d, cx + d, cy + d], outline=1, fill=1)
+        elif shape["shape_type"] == "rectangle":
+            draw.rectangle(xy, outline=1, fill=1)
+        elif shape["shape_type"] == "line":
+            draw.line(xy=xy, fill=1, width=10)
+        elif shape["shape_type"] == "point":
+            (cx, cy), r = xy[0], 5
+            draw.ellipse([cx - r, cy - r, cx + r, cy + r], outline=1, fill=1)
+        else:
+            draw.polygon(xy=xy, outline=1, fill=1)
+        mask = np.array(mask, dtype=bool)
+        expected_cls[mask] = label_name_to_value[shape["label"]]
+        expected_ins[mask] = i + 1
+    np.testing.assert_array_equal(cls, expected_cls)
+    np.testing.assert_array_equal(ins, expected_ins)
@@ -0,0 +1,104 @@
+# -*- encoding: utf-8 -*-
+
+import pytest
+from qtpy import QtCore
+from qtpy import QtGui
+
+from labelme.shape import Shape
+from labelme.widgets import Canvas
+
+
+def _make_shapes():
+    shapes = []
+    for i, color in enumerate(["red", "lime", "blue"]):
+        color = QtGui.QColor(color)
+        shape = Shape(label=str(i), shape_type="rectangle")
+        shape.addPoint(QtCore.QPointF(20 + 30 * i, 20 + 30 * i))
+        shape.addPoint(QtCore.QPointF(120 + 30 * i, 120 + 30 * i))
+        shape.line_color = shape.select_line_color = color
+        shape.fill_color = shape.select_fill_color = color
+        shape.vertex_fill_color = shape.hvertex_fill_color = color
+        shape.close()
+        shapes.append(shape)
+    return shapes
+
+
+def _render_in_order(canvas, pixmap):
+    image = QtGui.QImage(canvas.size(), QtGui.QImage.Format_RGB32)
+    image.fill(QtCore.Qt.white)
+    p = QtGui.QPainter(image)
+    p.setRenderHint(QtGui.QPainter.Antialiasing)
+    p.setRenderHint(QtGui.QPainter.SmoothPixmapTransform)
+    p.scale(canvas.scale, canvas.scale)
+    p.translate(canvas.offsetToCenter())
+    p.drawPixmap(0, 0, pixmap)
+    Shape.scale = canvas.scale
+    hovered = canvas.hShape
+    if hovered is not None and hovered.selected:
+        hovered = None
+    for shape in canvas.shapes:
+        shape.fill = shape.selected or shape is canvas.hShape
+        if shape is hovered:
+            shape.fill = False
+            shape.highlightClear()
+        shape.paint(p)
+    # hovered shape and its vertex are highlighted over the others
+    if hovered is not None:
+        if canvas.hVertex is not None:
+            hovered.highlightVertex(canvas.hVertex, Shape.MOVE_VERTEX)
+        hovered.fill = True
+        hovered.paint(p)
+    p.end()
+    return image
+
+
+def _make_canvas(qtbot):
+    canvas = Canvas()
+    qtbot.addWidget(canvas)
+    canvas.resize(200, 200)
+    pixmap = QtGui.QPixmap(200, 200)
+    pixmap.fill(QtCore.Qt.white)
+    canvas.loadPixmap(pixmap)
+    shapes = _make_shapes()
+    canvas.loadShapes(shapes)
+    canvas.show()
+    qtbot.waitExposed(canvas)
+    return canvas, pixmap, shapes
+
+
+def _grab(canvas):
+    canvas.repaint()
+    return canvas.grab().toImage().convertToFormat(QtGui.QImage.Format_RGB32)
+
+
+@pytest.mark.gui
+@pytest.mark.parametrize("selected", [[1], [0], [2], [0, 2]])
+def test_Canvas_paint_keeps_shape_order(qtbot, selected):
+    canvas, pixmap, shapes = _make_canvas(qtbot)
+    canvas.selectedShapes = [shapes[i] for i in selected]
+    for shape in canvas.selectedShapes:
+        shape.selected = True
+
+    # selected shapes are painted in the order of the shapes
+    assert _grab(canvas) == _render_in_order(canvas, pixmap)
+
+
+@pytest.mark.gui
+@pytest.mark.parametrize("selected", [[], [0], [2]])
+def test_Canvas_paint_hover_keeps_layer(qtbot, selected):
+    canvas, pixmap, shapes = _make_canvas(qtbot)
+    canvas.selectedShapes = [shapes[i] for i in selected]
+    for shape in canvas.selectedShapes:
+        shape.selected = True
+    _grab(canvas)
+    layer = canvas._layer
+
+    for hovered in [1, 0, None]:
+        canvas.hShape = None if hovered is None else shapes[hovered]
+        canvas.hVertex = None
+        if hovered == 0:
+            canvas.hVertex = 1
+            shapes[0].highlightVertex(1, Shape.MOVE_VERTEX)
+        assert _grab(canvas) == _render_in_order(canvas, pixmap)
+        shapes[0].highlightClear()
+    assert canvas._layer is layer
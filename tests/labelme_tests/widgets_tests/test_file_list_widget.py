@@ -0,0 +1,36 @@
+# -*- encoding: utf-8 -*-
+
+import pytest
+
+from labelme.widgets.file_list_widget import FileListWidget
+
+
+@pytest.mark.gui
+def test_FileListWidget_removeFiles(qtbot):
+    widget = FileListWidget()
+    qtbot.addWidget(widget)
+    paths = ["%02d.jpg" % i for i in range(10)]
+    widget.setFiles(paths)
+
+    removed = []
+
+    def rowsRemoved(parent, first, last):
+        removed.append((first, last))
+        # rows are consistent when views are notified
+        for row, path in enumerate(widget.paths()):
+            assert widget.rowOf(path) == row
+
+    widget.model().rowsRemoved.connect(rowsRemoved)
+    widget.removeFiles(["01.jpg", "02.jpg", "03.jpg", "07.jpg", "09.jpg", "x.jpg"])
+
+    # contiguous rows are removed at once
+    assert removed == [(9, 9), (7, 7), (1, 3)]
+    assert widget.paths() == ["00.jpg", "04.jpg", "05.jpg", "06.jpg", "08.jpg"]
+    for row, path in enumerate(widget.paths()):
+        assert widget.rowOf(path) == row
+    assert widget.rowOf("01.jpg") == -1
+
+    widget.removeFiles([])
+    widget.removeFiles(["x.jpg"])
+    assert len(removed) == 3
+    assert len(widget) == 5
@@ -18,3 +18,29 @@ def test_LabelListWidget(qtbot):
     widget.show()
     qtbot.addWidget(widget)
     qtbot.waitExposed(widget)
+
+
+@pytest.mark.gui
+def test_LabelListWidget_findItemByShape(qtbot):
+    widget = LabelListWidget()
+    qtbot.addWidget(widget)
+
+    shapes = [object() for _ in range(3)]
+    for i, shape in enumerate(shapes):
+        widget.addItem(LabelListWidgetItem(text=str(i), shape=shape))
+    for shape in shapes:
+        assert widget.findItemByShape(shape).shape() is shape
+
+    # drag and drop inserts a clone and removes the dragged row
+    item = widget.findItemByShape(shapes[2])
+    widget.model().insertRow(0, item.clone())
+    widget.model().removeRows(3, 1)
+    assert widget.findItemByShape(shapes[2]) is widget[0]
+
+    widget.removeItem(widget.findItemByShape(shapes[0]))
+    with pytest.raises(ValueError):
+        widget.findItemByShape(shapes[0])
+
+    widget.clear()
+    with pytest.raises(ValueError):
+        widget.findItemByShape(shapes[1])